@@ -0,0 +1,139 @@
+"""Focus-follow auto-dim: inactive windows dimmed, the focused one opaque"""
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+# Shell windows, menus and tooltips that must never be dimmed
+EXCLUDED_CLASSES = {'progman', 'workerw', 'shell_traywnd', 'shell_secondarytraywnd', '#32768', 'tooltips_class32'}
+
+
+class AutoDimmer:
+    """Keeps a model of which windows are dimmed and updates it from window events
+
+    Only enable() enumerates windows. After that a focus change writes to at
+    most two windows: the new foreground window is made opaque if it was
+    dimmed, and the previous one is dimmed. Windows that appear later are
+    dimmed when their show event arrives. dim(hwnd, alpha) and undim(hwnd)
+    must not block; the app passes ones that queue onto the apply pipeline.
+    Undimming gives a window back whatever it had before, not full opacity.
+    """
+
+    def __init__(self, backend, dim, undim, alpha=160):
+        self.backend = backend
+        self.dim = dim
+        self.undim = undim
+        self.alpha = alpha
+        self.enabled = False
+        self.focused = None
+        self.dimmed = set()
+        # hwnd -> whether the window may be dimmed, looked up once per window
+        self.eligible = {}
+        self.lock = threading.Lock()
+        self.writes = 0
+
+    def _is_eligible(self, hwnd):
+        """Whether a window may be dimmed (lock held)
+
+        Like the windows Reset All Windows used to enumerate, only titled
+        application windows qualify; popups, menus and owned windows do not.
+        """
+        eligible = self.eligible.get(hwnd)
+        if eligible is None:
+            try:
+                eligible = (self.backend.window_class(hwnd).lower() not in EXCLUDED_CLASSES
+                            and self.backend.is_app_window(hwnd))
+            except Exception:
+                eligible = False
+            if len(self.eligible) > 65536:
+                self.eligible.clear()
+            self.eligible[hwnd] = eligible
+        return eligible
+
+    def enable(self, alpha=None):
+        """Dim every window except the focused one, returns the windows to dim
+
+        The caller dims the returned windows in one batch.
+        """
+        with self.lock:
+            if alpha is not None:
+                self.alpha = alpha
+            self.enabled = True
+            self.focused = self.backend.foreground_window() or None
+            writes = []
+            for hwnd in self.backend.enumerate_windows():
+                if self._is_eligible(hwnd) and hwnd != self.focused:
+                    self.dimmed.add(hwnd)
+                    writes.append(hwnd)
+            self.writes += len(writes)
+            return writes
+
+    def disable(self):
+        """Stop dimming, returns the windows to undim"""
+        with self.lock:
+            self.enabled = False
+            writes = list(self.dimmed)
+            self.dimmed.clear()
+            self.focused = None
+            self.writes += len(writes)
+            return writes
+
+    def set_dim_alpha(self, alpha):
+        """Change the dim level, returns the windows to re-dim"""
+        with self.lock:
+            if alpha == self.alpha:
+                return []
+            self.alpha = alpha
+            writes = list(self.dimmed)
+            self.writes += len(writes)
+            return writes
+
+    def on_foreground(self, hwnd):
+        """Focus moved to hwnd: undim it and dim the window that had focus"""
+        undim = dim = None
+        with self.lock:
+            if not self.enabled or hwnd == self.focused:
+                return
+            previous, self.focused = self.focused, hwnd
+            if hwnd in self.dimmed:
+                self.dimmed.discard(hwnd)
+                undim = hwnd
+            if previous is not None and previous not in self.dimmed and self._is_eligible(previous):
+                self.dimmed.add(previous)
+                dim = previous
+            alpha = self.alpha
+            self.writes += (undim is not None) + (dim is not None)
+        if undim is not None:
+            self.undim(undim)
+        if dim is not None:
+            self.dim(dim, alpha)
+
+    def on_show(self, hwnd):
+        """A window appeared: dim it unless it is the focused one"""
+        with self.lock:
+            if not self.enabled or hwnd == self.focused or hwnd in self.dimmed or not self._is_eligible(hwnd):
+                return
+            # New windows usually show just before they take focus
+            if hwnd == self.backend.foreground_window():
+                return
+            self.dimmed.add(hwnd)
+            self.writes += 1
+            alpha = self.alpha
+        self.dim(hwnd, alpha)
+
+    def forget(self, hwnd):
+        """Drop a destroyed window from the model"""
+        with self.lock:
+            self.dimmed.discard(hwnd)
+            self.eligible.pop(hwnd, None)
+            if hwnd == self.focused:
+                self.focused = None
+
+    def clear(self):
+        """Forget which windows are dimmed, e.g. after they were all restored"""
+        with self.lock:
+            self.dimmed.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'enabled': self.enabled, 'dimmed': len(self.dimmed), 'writes': self.writes}
@@ -0,0 +1,716 @@
+"""Platform backends: the window operations Transparent Windows needs
+
+Window handles are plain integers (an HWND on Windows, an XID on X11). The
+original state a backend returns from read_state() is opaque to the app: it
+is stored in the modified-window registry and handed back to restore().
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
+
+try:
+    from win32 import win32gui, winxpgui, win32api, win32process
+    import win32.lib.win32con as win32con
+    WIN32_AVAILABLE = True
+except ImportError:
+    WIN32_AVAILABLE = False
+
+
+class BackendUnavailable(RuntimeError):
+    """Raised when a backend cannot be used on this system"""
+
+
+class WindowBackend:
+    """Interface every backend implements
+
+    blocking_writes tells the app whether a write can stall on an unresponsive
+    target application, in which case writes go through the apply pipeline.
+    """
+
+    name = None
+    blocking_writes = True
+
+    def foreground_window(self):
+        """Return the focused top-level window, or 0"""
+        raise NotImplementedError
+
+    def is_window(self, hwnd):
+        raise NotImplementedError
+
+    def enumerate_windows(self):
+        """Return the visible top-level windows, topmost first"""
+        raise NotImplementedError
+
+    def window_rect(self, hwnd):
+        """Return (left, top, right, bottom) in screen coordinates"""
+        raise NotImplementedError
+
+    def cursor_pos(self):
+        """Return the mouse position as (x, y)"""
+        raise NotImplementedError
+
+    def key_down(self, name):
+        """Whether a modifier ('ctrl', 'shift', 'alt' or 'win') is physically held, None if unknown
+
+        Read from the system's key state rather than from hook events, so it
+        is right even after the hook missed a key-up.
+        """
+        return None
+
+    def monitors(self):
+        """Return the monitor rectangles, numbered left to right"""
+        raise NotImplementedError
+
+    def window_title(self, hwnd):
+        raise NotImplementedError
+
+    def window_class(self, hwnd):
+        raise NotImplementedError
+
+    def window_pid(self, hwnd):
+        raise NotImplementedError
+
+    def is_app_window(self, hwnd):
+        """Whether a window is a titled application window rather than a menu, tooltip or owned popup"""
+        return bool(self.window_title(hwnd))
+
+    def process_name(self, pid):
+        """Return the executable name of a process, or ''"""
+        raise NotImplementedError
+
+    def read_state(self, hwnd):
+        """Return (original, alpha): the state to restore later and the current alpha
+
+        alpha is None while the window has no alpha of its own.
+        """
+        raise NotImplementedError
+
+    def read_state_many(self, hwnds):
+        """Read many windows at once, returns {hwnd: (original, alpha)} for those that still exist"""
+        states = {}
+        for hwnd in hwnds:
+            try:
+                states[hwnd] = self.read_state(hwnd)
+            except Exception as e:
+                log.debug("Could not read %x: %s", hwnd, e)
+        return states
+
+    def set_alpha(self, hwnd, alpha, original=None):
+        """Set a window's alpha (1-255)
+
+        original is the state read_state() just returned, or None if this
+        backend already wrote an alpha to the window.
+        """
+        raise NotImplementedError
+
+    def restore(self, hwnd, original):
+        """Put a window back to the state read_state() returned"""
+        raise NotImplementedError
+
+    def set_alpha_many(self, windows):
+        """Set alpha on many (hwnd, alpha, original) at once, returns how many were set"""
+        count = 0
+        for hwnd, alpha, original in windows:
+            try:
+                self.set_alpha(hwnd, alpha, original)
+                count += 1
+            except Exception as e:
+                log.debug("Could not set alpha of %x: %s", hwnd, e)
+        return count
+
+    def restore_many(self, windows):
+        """Restore many (hwnd, original) at once, returns how many still existed"""
+        count = 0
+        for hwnd, original in windows:
+            if not self.is_window(hwnd):
+                continue
+            try:
+                self.restore(hwnd, original)
+                count += 1
+            except Exception as e:
+                log.debug("Could not restore %x: %s", hwnd, e)
+        return count
+
+    def watch_events(self, handler):
+        """Return a watcher (start/stop) calling handler(event, hwnd), or None if unsupported"""
+        return None
+
+    def close(self):
+        pass
+
+
+class Win32Backend(WindowBackend):
+    """Layered windows via pywin32
+
+    A window is made layered (WS_EX_LAYERED) the first time we set its alpha.
+    Both calls are sent to the window's thread, so they block while the
+    application is hung.
+    """
+
+    name = 'win32'
+    blocking_writes = True
+
+    def foreground_window(self):
+        return win32gui.GetForegroundWindow()
+
+    def is_window(self, hwnd):
+        return bool(win32gui.IsWindow(hwnd))
+
+    def enumerate_windows(self):
+        windows = []
+
+        def callback(hwnd, _):
+            if win32gui.IsWindowVisible(hwnd):
+                windows.append(hwnd)
+            return True
+
+        win32gui.EnumWindows(callback, None)
+        return windows
+
+    def window_rect(self, hwnd):
+        return tuple(win32gui.GetWindowRect(hwnd))
+
+    def cursor_pos(self):
+        return tuple(win32api.GetCursorPos())
+
+    def key_down(self, name):
+        codes = {
+            'ctrl': (win32con.VK_CONTROL,),
+            'shift': (win32con.VK_SHIFT,),
+            'alt': (win32con.VK_MENU,),
+            'win': (win32con.VK_LWIN, win32con.VK_RWIN),
+        }.get(name)
+        if codes is None:
+            return None
+        return any(win32api.GetAsyncKeyState(code) & 0x8000 for code in codes)
+
+    def monitors(self):
+        return sorted(tuple(rect) for _, _, rect in win32api.EnumDisplayMonitors())
+
+    def window_title(self, hwnd):
+        return win32gui.GetWindowText(hwnd)
+
+    def window_class(self, hwnd):
+        return win32gui.GetClassName(hwnd)
+
+    def window_pid(self, hwnd):
+        _, pid = win32process.GetWindowThreadProcessId(hwnd)
+        return pid
+
+    def is_app_window(self, hwnd):
+        # Dialogs and dropdowns are owned; menus, tooltips and tool palettes
+        # are tool windows or never take focus
+        if win32gui.GetWindow(hwnd, win32con.GW_OWNER):
+            return False
+        if win32gui.GetWindowLong(hwnd, win32con.GWL_EXSTYLE) & (win32con.WS_EX_TOOLWINDOW | win32con.WS_EX_NOACTIVATE):
+            return False
+        return bool(win32gui.GetWindowText(hwnd))
+
+    def process_name(self, pid):
+        from winevents import process_image_name
+        return process_image_name(pid)
+
+    def read_state(self, hwnd):
+        """Original state is (ex_style, layered_attributes or None)"""
+        ex_style = win32gui.GetWindowLong(hwnd, win32con.GWL_EXSTYLE)
+        layered_attributes = None
+        alpha = None
+        if ex_style & win32con.WS_EX_LAYERED:
+            layered_attributes = win32gui.GetLayeredWindowAttributes(hwnd)
+            colorkey, window_alpha, flags = layered_attributes
+            if flags == win32con.LWA_ALPHA:
+                alpha = window_alpha
+        return (ex_style, layered_attributes), alpha
+
+    def set_alpha(self, hwnd, alpha, original=None):
+        if original is not None and not original[0] & win32con.WS_EX_LAYERED:
+            win32gui.SetWindowLong(hwnd, win32con.GWL_EXSTYLE, original[0] | win32con.WS_EX_LAYERED)
+        winxpgui.SetLayeredWindowAttributes(hwnd, win32api.RGB(0,0,0), alpha, win32con.LWA_ALPHA)
+
+    def restore(self, hwnd, original):
+        ex_style, layered_attributes = original
+        if layered_attributes is not None:
+            colorkey, alpha, flags = layered_attributes
+            winxpgui.SetLayeredWindowAttributes(hwnd, colorkey, alpha, flags)
+        else:
+            # Turn layered compositing back off for windows that never had it
+            current_style = win32gui.GetWindowLong(hwnd, win32con.GWL_EXSTYLE)
+            win32gui.SetWindowLong(hwnd, win32con.GWL_EXSTYLE, current_style & ~win32con.WS_EX_LAYERED)
+
+    def watch_events(self, handler):
+        from winevents import WinEventWatcher
+        return WinEventWatcher(handler)
+
+
+# Left and right keysyms of each modifier, from X11/keysymdef.h
+X11_MODIFIER_KEYSYMS = {
+    'ctrl': (0xffe3, 0xffe4),
+    'shift': (0xffe1, 0xffe2),
+    'alt': (0xffe9, 0xffea),
+    'win': (0xffeb, 0xffec),
+}
+
+# Predefined atoms from X11/Xatom.h
+XA_ATOM = 4
+XA_CARDINAL = 6
+XA_STRING = 31
+XA_WINDOW = 33
+AnyPropertyType = 0
+PropModeReplace = 0
+
+
+class XClassHint(ctypes.Structure):
+    _fields_ = [('res_name', ctypes.c_char_p), ('res_class', ctypes.c_char_p)]
+
+
+class XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('display', ctypes.c_void_p),
+        ('resourceid', ctypes.c_ulong),
+        ('serial', ctypes.c_ulong),
+        ('error_code', ctypes.c_ubyte),
+        ('request_code', ctypes.c_ubyte),
+        ('minor_code', ctypes.c_ubyte),
+    ]
+
+
+XErrorHandler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(XErrorEvent))
+
+class XineramaScreenInfo(ctypes.Structure):
+    _fields_ = [
+        ('screen_number', ctypes.c_int),
+        ('x_org', ctypes.c_short),
+        ('y_org', ctypes.c_short),
+        ('width', ctypes.c_short),
+        ('height', ctypes.c_short),
+    ]
+
+
+class XcbCookie(ctypes.Structure):
+    _fields_ = [('sequence', ctypes.c_uint)]
+
+
+class XcbGetPropertyReply(ctypes.Structure):
+    _fields_ = [
+        ('response_type', ctypes.c_uint8),
+        ('format', ctypes.c_uint8),
+        ('sequence', ctypes.c_uint16),
+        ('length', ctypes.c_uint32),
+        ('type', ctypes.c_uint32),
+        ('bytes_after', ctypes.c_uint32),
+        ('value_len', ctypes.c_uint32),
+        ('pad0', ctypes.c_uint8 * 12),
+    ]
+
+
+_xlib = None
+_xcb = None
+_x11_backends = {}
+_previous_error_handler = None
+
+
+@XErrorHandler
+def _x_error_handler(display, event):
+    # Xlib's default handler exits the process, so errors must be caught here.
+    # A window can always disappear between two requests; that is expected.
+    backend = _x11_backends.get(display)
+    if backend is not None:
+        backend.failed.add(event.contents.resourceid)
+        return 0
+    if _previous_error_handler:
+        return _previous_error_handler(display, event)
+    return 0
+
+
+def load_xlib():
+    """Load libX11 through ctypes and declare the functions the backend uses"""
+    global _xlib
+    if _xlib is not None:
+        return _xlib
+
+    path = ctypes.util.find_library('X11')
+    if not path:
+        raise BackendUnavailable("libX11 not found")
+    lib = ctypes.CDLL(path)
+
+    Display = ctypes.c_void_p
+    Window = Atom = ctypes.c_ulong
+    lib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    lib.XOpenDisplay.restype = Display
+    lib.XCloseDisplay.argtypes = [Display]
+    lib.XDefaultRootWindow.argtypes = [Display]
+    lib.XDefaultRootWindow.restype = Window
+    lib.XInternAtom.argtypes = [Display, ctypes.c_char_p, ctypes.c_int]
+    lib.XInternAtom.restype = Atom
+    lib.XGetWindowProperty.argtypes = [
+        Display, Window, Atom, ctypes.c_long, ctypes.c_long, ctypes.c_int, Atom,
+        ctypes.POINTER(Atom), ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_ulong),
+        ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_void_p)]
+    lib.XChangeProperty.argtypes = [Display, Window, Atom, Atom, ctypes.c_int, ctypes.c_int,
+                                    ctypes.c_void_p, ctypes.c_int]
+    lib.XDeleteProperty.argtypes = [Display, Window, Atom]
+    lib.XGetClassHint.argtypes = [Display, Window, ctypes.POINTER(XClassHint)]
+    lib.XGetGeometry.argtypes = [Display, Window] + [ctypes.c_void_p] * 7
+    lib.XTranslateCoordinates.argtypes = [Display, Window, Window, ctypes.c_int, ctypes.c_int] + \
+        [ctypes.c_void_p] * 3
+    lib.XQueryPointer.argtypes = [Display, Window] + [ctypes.c_void_p] * 7
+    lib.XQueryKeymap.argtypes = [Display, ctypes.c_char * 32]
+    lib.XKeysymToKeycode.argtypes = [Display, ctypes.c_ulong]
+    lib.XKeysymToKeycode.restype = ctypes.c_ubyte
+    lib.XFree.argtypes = [ctypes.c_void_p]
+    lib.XFlush.argtypes = [Display]
+    lib.XSync.argtypes = [Display, ctypes.c_int]
+    lib.XSetErrorHandler.argtypes = [XErrorHandler]
+    lib.XSetErrorHandler.restype = ctypes.c_void_p
+
+    _xlib = lib
+    claim_error_handler()
+    return lib
+
+
+def load_xcb():
+    """Load libxcb and libX11-xcb through ctypes, or return None if either is missing
+
+    Xlib waits for each reply before sending the next request; XCB requests
+    on the same connection can all be sent before the first reply is read.
+    """
+    global _xcb
+    if _xcb is not None:
+        return _xcb or None
+
+    paths = [ctypes.util.find_library(name) for name in ('xcb', 'X11-xcb', 'c')]
+    if not all(paths):
+        _xcb = False
+        return None
+    xcb, bridge, libc = (ctypes.CDLL(path) for path in paths)
+
+    Reply = ctypes.POINTER(XcbGetPropertyReply)
+    bridge.XGetXCBConnection.argtypes = [ctypes.c_void_p]
+    bridge.XGetXCBConnection.restype = ctypes.c_void_p
+    xcb.xcb_get_property.argtypes = [ctypes.c_void_p, ctypes.c_uint8] + [ctypes.c_uint32] * 5
+    xcb.xcb_get_property.restype = XcbCookie
+    xcb.xcb_get_property_reply.argtypes = [ctypes.c_void_p, XcbCookie, ctypes.POINTER(ctypes.c_void_p)]
+    xcb.xcb_get_property_reply.restype = Reply
+    xcb.xcb_get_property_value.argtypes = [Reply]
+    xcb.xcb_get_property_value.restype = ctypes.c_void_p
+    libc.free.argtypes = [ctypes.c_void_p]
+    xcb.XGetXCBConnection = bridge.XGetXCBConnection
+    xcb.free = libc.free
+
+    _xcb = xcb
+    return xcb
+
+
+def claim_error_handler():
+    """Make ours the process-wide Xlib error handler, chaining to the one it replaces
+
+    Tk installs its own handler when it opens a display, so this is repeated
+    before every request that can fail.
+    """
+    global _previous_error_handler
+    ours = ctypes.cast(_x_error_handler, ctypes.c_void_p).value
+    previous = _xlib.XSetErrorHandler(_x_error_handler)
+    if previous and previous != ours:
+        _previous_error_handler = XErrorHandler(previous)
+
+
+class X11Backend(WindowBackend):
+    """_NET_WM_WINDOW_OPACITY on one persistent Xlib connection
+
+    A compositor (picom, mutter, kwin, ...) has to be running for the property
+    to have a visible effect. Property writes are handled by the X server, not
+    the target client, so a hung application never blocks them.
+
+    Every write is confirmed with XSync, so a window that vanished raises
+    instead of failing after the call returned; bulk changes are sent
+    together and confirmed with one XSync. Bulk reads are sent together as
+    well, through XCB on the same connection when libxcb is available. The
+    connection is shared by all threads and serialized with a lock.
+    """
+
+    name = 'x11'
+    blocking_writes = False
+    OPAQUE = 0xffffffff
+
+    def __init__(self, display_name=None):
+        self.lib = load_xlib()
+        self.display = self.lib.XOpenDisplay(display_name.encode() if display_name else None)
+        if not self.display:
+            raise BackendUnavailable(f"cannot open X display {display_name or os.environ.get('DISPLAY', '')!r}")
+        self.root = self.lib.XDefaultRootWindow(self.display)
+        self.lock = threading.RLock()
+        self.atoms = {}
+        # Resources named in X errors since the last sync
+        self.failed = set()
+        _x11_backends[self.display] = self
+
+    def atom(self, name):
+        atom = self.atoms.get(name)
+        if atom is None:
+            with self.lock:
+                atom = self.atoms[name] = self.lib.XInternAtom(self.display, name.encode(), False)
+        return atom
+
+    def get_property(self, window, name, req_type=AnyPropertyType, length=65536):
+        """Return (format, data) of a window property, or (0, None) if it is not set
+
+        data is a list of ints for 32-bit properties and bytes otherwise.
+        Raises OSError if the window does not exist.
+        """
+        actual_type = ctypes.c_ulong()
+        actual_format = ctypes.c_int()
+        nitems = ctypes.c_ulong()
+        bytes_after = ctypes.c_ulong()
+        data = ctypes.c_void_p()
+        with self.lock:
+            claim_error_handler()
+            status = self.lib.XGetWindowProperty(
+                self.display, window, self.atom(name), 0, length, False, req_type,
+                ctypes.byref(actual_type), ctypes.byref(actual_format), ctypes.byref(nitems),
+                ctypes.byref(bytes_after), ctypes.byref(data))
+            if status != 0:
+                self.failed.discard(window)
+                raise OSError(f"Invalid window {window:x}")
+        if not data.value:
+            return 0, None
+        try:
+            if not actual_type.value:
+                return 0, None
+            if actual_format.value == 32:
+                # Xlib hands 32-bit items back as C longs
+                return 32, list(ctypes.cast(data, ctypes.POINTER(ctypes.c_ulong))[:nitems.value])
+            size = nitems.value * actual_format.value // 8
+            return actual_format.value, ctypes.string_at(data, size)
+        finally:
+            self.lib.XFree(data)
+
+    def foreground_window(self):
+        _, data = self.get_property(self.root, '_NET_ACTIVE_WINDOW', XA_WINDOW)
+        return data[0] if data else 0
+
+    def is_window(self, hwnd):
+        values = [ctypes.c_ulong(), ctypes.c_int(), ctypes.c_int()] + [ctypes.c_uint() for _ in range(4)]
+        with self.lock:
+            claim_error_handler()
+            ok = self.lib.XGetGeometry(self.display, hwnd, *[ctypes.byref(value) for value in values])
+            self.failed.discard(hwnd)
+        return bool(ok)
+
+    def enumerate_windows(self):
+        # The stacking list is ordered bottom to top
+        _, data = self.get_property(self.root, '_NET_CLIENT_LIST_STACKING', XA_WINDOW)
+        return list(reversed(data)) if data else []
+
+    def window_rect(self, hwnd):
+        root, child = ctypes.c_ulong(), ctypes.c_ulong()
+        x, y = ctypes.c_int(), ctypes.c_int()
+        width, height, border, depth = ctypes.c_uint(), ctypes.c_uint(), ctypes.c_uint(), ctypes.c_uint()
+        with self.lock:
+            claim_error_handler()
+            ok = self.lib.XGetGeometry(self.display, hwnd, ctypes.byref(root), ctypes.byref(x), ctypes.byref(y),
+                                       ctypes.byref(width), ctypes.byref(height), ctypes.byref(border),
+                                       ctypes.byref(depth))
+            if ok:
+                # The geometry is relative to the window manager's frame
+                ok = self.lib.XTranslateCoordinates(self.display, hwnd, self.root, 0, 0, ctypes.byref(x),
+                                                    ctypes.byref(y), ctypes.byref(child))
+            if not ok:
+                self.failed.discard(hwnd)
+                raise OSError(f"Invalid window {hwnd:x}")
+        return x.value, y.value, x.value + width.value, y.value + height.value
+
+    def cursor_pos(self):
+        root, child = ctypes.c_ulong(), ctypes.c_ulong()
+        x, y, win_x, win_y = ctypes.c_int(), ctypes.c_int(), ctypes.c_int(), ctypes.c_int()
+        mask = ctypes.c_uint()
+        with self.lock:
+            self.lib.XQueryPointer(self.display, self.root, ctypes.byref(root), ctypes.byref(child),
+                                   ctypes.byref(x), ctypes.byref(y), ctypes.byref(win_x), ctypes.byref(win_y),
+                                   ctypes.byref(mask))
+        return x.value, y.value
+
+    def key_down(self, name):
+        keysyms = X11_MODIFIER_KEYSYMS.get(name)
+        if keysyms is None:
+            return None
+        keys = (ctypes.c_char * 32)()
+        with self.lock:
+            self.lib.XQueryKeymap(self.display, keys)
+            codes = [self.lib.XKeysymToKeycode(self.display, keysym) for keysym in keysyms]
+        # One bit per keycode
+        return any(code and keys[code // 8][0] & (1 << code % 8) for code in codes)
+
+    def monitors(self):
+        """Xinerama screens if available, otherwise the whole root window"""
+        path = ctypes.util.find_library('Xinerama')
+        if path:
+            xinerama = ctypes.CDLL(path)
+            xinerama.XineramaQueryScreens.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_int)]
+            xinerama.XineramaQueryScreens.restype = ctypes.POINTER(XineramaScreenInfo)
+            count = ctypes.c_int()
+            with self.lock:
+                screens = xinerama.XineramaQueryScreens(self.display, ctypes.byref(count))
+            if screens:
+                try:
+                    return sorted((screen.x_org, screen.y_org, screen.x_org + screen.width,
+                                   screen.y_org + screen.height) for screen in screens[:count.value])
+                finally:
+                    self.lib.XFree(screens)
+        return [self.window_rect(self.root)]
+
+    def window_title(self, hwnd):
+        _, data = self.get_property(hwnd, '_NET_WM_NAME', self.atom('UTF8_STRING'))
+        if data:
+            return data.decode('utf-8', 'replace')
+        _, data = self.get_property(hwnd, 'WM_NAME', XA_STRING)
+        return data.decode('latin-1') if data else ''
+
+    def window_class(self, hwnd):
+        hint = XClassHint()
+        with self.lock:
+            claim_error_handler()
+            if not self.lib.XGetClassHint(self.display, hwnd, ctypes.byref(hint)):
+                self.failed.discard(hwnd)
+                return ''
+        try:
+            return (hint.res_class or b'').decode('utf-8', 'replace')
+        finally:
+            # c_char_p fields copy the strings, free the originals by address
+            fields = ctypes.cast(ctypes.byref(hint), ctypes.POINTER(ctypes.c_void_p))
+            for i in range(2):
+                if fields[i]:
+                    self.lib.XFree(fields[i])
+
+    def window_pid(self, hwnd):
+        _, data = self.get_property(hwnd, '_NET_WM_PID', XA_CARDINAL)
+        return data[0] if data else 0
+
+    def is_app_window(self, hwnd):
+        # Dialogs and other transient windows belong to an owner window
+        _, owner = self.get_property(hwnd, 'WM_TRANSIENT_FOR', XA_WINDOW)
+        if owner:
+            return False
+        _, types = self.get_property(hwnd, '_NET_WM_WINDOW_TYPE', XA_ATOM)
+        if types and types[0] != self.atom('_NET_WM_WINDOW_TYPE_NORMAL'):
+            return False
+        return bool(self.window_title(hwnd))
+
+    def process_name(self, pid):
+        try:
+            with open(f"/proc/{pid}/comm") as f:
+                return f.read().strip()
+        except OSError:
+            return ''
+
+    def read_state(self, hwnd):
+        """Original state is the _NET_WM_WINDOW_OPACITY value, or None if unset"""
+        _, data = self.get_property(hwnd, '_NET_WM_WINDOW_OPACITY', XA_CARDINAL)
+        if not data:
+            return None, None
+        return data[0], round(data[0] * 255 / self.OPAQUE)
+
+    def read_state_many(self, hwnds):
+        """Send every window's property request before waiting for the first reply"""
+        hwnds = list(hwnds)
+        xcb = load_xcb()
+        if xcb is None or len(hwnds) < 2:
+            return super().read_state_many(hwnds)
+        opacity = self.atom('_NET_WM_WINDOW_OPACITY')
+        states = {}
+        with self.lock:
+            # Xlib hands its own queued requests to XCB first, so ordering is kept
+            connection = xcb.XGetXCBConnection(self.display)
+            cookies = [xcb.xcb_get_property(connection, 0, hwnd, opacity, XA_CARDINAL, 0, 1) for hwnd in hwnds]
+            for hwnd, cookie in zip(hwnds, cookies):
+                error = ctypes.c_void_p()
+                reply = xcb.xcb_get_property_reply(connection, cookie, ctypes.byref(error))
+                if error.value:
+                    # The window is gone
+                    xcb.free(error)
+                if not reply:
+                    continue
+                try:
+                    if reply.contents.format == 32 and reply.contents.value_len:
+                        value = ctypes.cast(xcb.xcb_get_property_value(reply), ctypes.POINTER(ctypes.c_uint32))[0]
+                        states[hwnd] = value, round(value * 255 / self.OPAQUE)
+                    else:
+                        states[hwnd] = None, None
+                finally:
+                    xcb.free(reply)
+        return states
+
+    def _write_opacity(self, hwnd, value):
+        """Queue a property write (lock held), nothing is sent until a flush"""
+        claim_error_handler()
+        if value is None:
+            self.lib.XDeleteProperty(self.display, hwnd, self.atom('_NET_WM_WINDOW_OPACITY'))
+        else:
+            data = ctypes.c_ulong(value)
+            self.lib.XChangeProperty(self.display, hwnd, self.atom('_NET_WM_WINDOW_OPACITY'), XA_CARDINAL,
+                                     32, PropModeReplace, ctypes.byref(data), 1)
+
+    def _sync(self, hwnds):
+        """Send queued requests, wait for them and return those that failed (lock held)"""
+        self.lib.XSync(self.display, False)
+        failed = self.failed.intersection(hwnds)
+        self.failed.clear()
+        return failed
+
+    def set_alpha(self, hwnd, alpha, original=None):
+        with self.lock:
+            self._write_opacity(hwnd, alpha * self.OPAQUE // 255)
+            failed = self._sync([hwnd])
+        if failed:
+            raise OSError(f"Invalid window {hwnd:x}")
+
+    def restore(self, hwnd, original):
+        with self.lock:
+            self._write_opacity(hwnd, original)
+            failed = self._sync([hwnd])
+        if failed:
+            raise OSError(f"Invalid window {hwnd:x}")
+
+    def set_alpha_many(self, windows):
+        windows = list(windows)
+        with self.lock:
+            for hwnd, alpha, original in windows:
+                self._write_opacity(hwnd, alpha * self.OPAQUE // 255)
+            failed = self._sync([hwnd for hwnd, _, _ in windows])
+        return len(windows) - len(failed)
+
+    def restore_many(self, windows):
+        windows = list(windows)
+        with self.lock:
+            for hwnd, original in windows:
+                self._write_opacity(hwnd, original)
+            failed = self._sync([hwnd for hwnd, _ in windows])
+        return len(windows) - len(failed)
+
+    def close(self):
+        with self.lock:
+            if self.display:
+                _x11_backends.pop(self.display, None)
+                self.lib.XCloseDisplay(self.display)
+                self.display = None
+
+
+BACKENDS = {
+    'win32': Win32Backend,
+    'x11': X11Backend,
+}
+
+
+def create_backend(name=None):
+    """Return a backend by name, or the one for this platform"""
+    if name is None:
+        name = 'win32' if os.name == 'nt' else 'x11'
+    if name not in BACKENDS:
+        raise BackendUnavailable(f"unknown backend {name!r} (available: {', '.join(BACKENDS)})")
+    if name == 'win32' and not WIN32_AVAILABLE:
+        raise BackendUnavailable("pywin32 is not installed")
+    return BACKENDS[name]()
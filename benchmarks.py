@@ -0,0 +1,1305 @@
+"""Benchmarks for the Transparent Windows hot paths
+
+These run on any platform: Win32 calls and key presses are simulated
+(see simulator.py). They only measure; behaviour is covered by the
+test_*.py modules (python -m pytest).
+
+Usage: python benchmarks.py [name ...] [--json results.json] [--baseline old.json]
+"""
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import sys
+import threading
+import time
+
+import backends
+import curves
+from hotkeys import Binding, HotkeyEngine, Keymap, KeymapError, parse_chord
+from journal import OpacityJournal, load_journal
+from rules import OpacityRule, RuleMatcher
+from settings import FileWatcher, ShortcutMatcher, atomic_write_json
+from simulator import FakeKeyboard, FakeWin32
+import transparency
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    """Register a benchmark under its name without the bench_ prefix"""
+    BENCHMARKS[func.__name__[len('bench_'):]] = func
+    return func
+
+
+def summarize(samples, scale=1000.0):
+    """Return min/median/p95/max of a list of seconds, in milliseconds"""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        'count': len(ordered),
+        'min_ms': round(ordered[0] * scale, 4),
+        'median_ms': round(statistics.median(ordered) * scale, 4),
+        'p95_ms': round(p95 * scale, 4),
+        'max_ms': round(ordered[-1] * scale, 4),
+    }
+
+
+def polling_listener(pressed, on_trigger, running):
+    """Replica of the old 50 ms keyboard_listener loop over a fake key state"""
+    last_trigger_time = 0
+    while running.is_set():
+        if {'ctrl', 'shift', 'alt'} <= pressed:
+            current_time = time.time()
+            for key in '0123456789':
+                if key in pressed:
+                    if current_time - last_trigger_time < 0.3:
+                        continue
+                    on_trigger(int(key))
+                    last_trigger_time = current_time
+                    # block_key / sleep / unblock_key
+                    time.sleep(0.1)
+                    break
+        time.sleep(0.05)
+
+
+@benchmark
+def bench_hotkey_latency(presses=20):
+    """Trigger latency of the old polling loop vs the event-driven engine"""
+    modifiers = ['ctrl', 'shift', 'alt']
+
+    # Polling loop: a press is only noticed on the next 50 ms tick
+    pressed = set()
+    press_time = [0.0]
+    polled = []
+    triggered = threading.Event()
+
+    def on_poll_trigger(num):
+        polled.append(time.perf_counter() - press_time[0])
+        triggered.set()
+
+    running = threading.Event()
+    running.set()
+    poller = threading.Thread(target=polling_listener, args=(pressed, on_poll_trigger, running), daemon=True)
+    poller.start()
+    for _ in range(presses):
+        time.sleep(0.3 + random.random() * 0.05)
+        triggered.clear()
+        pressed.update(modifiers)
+        press_time[0] = time.perf_counter()
+        pressed.add('5')
+        triggered.wait(1)
+        pressed.clear()
+    running.clear()
+    poller.join()
+
+    # Event engine: the trigger runs inside the key-down callback
+    hooked = []
+    matcher = ShortcutMatcher.from_settings({'modifier1': 'ctrl', 'modifier2': 'shift', 'modifier3': 'alt'})
+    engine = HotkeyEngine(matcher, lambda num: hooked.append(time.perf_counter() - press_time[0]))
+    for _ in range(presses * 50):
+        for mod in modifiers:
+            engine.handle_event(mod, 'down')
+        press_time[0] = time.perf_counter()
+        engine.handle_event('5', 'down')
+        engine.handle_event('5', 'up')
+        for mod in modifiers:
+            engine.handle_event(mod, 'up')
+
+    return {'polling': summarize(polled), 'event': summarize(hooked)}
+
+
+def enumerate_and_reset(fake):
+    """Replica of the old reset_all_windows loop over every visible window"""
+    def enum_window_callback(hwnd, windows):
+        if fake.IsWindowVisible(hwnd) and fake.GetWindowText(hwnd):
+            windows.append(hwnd)
+        return True
+
+    windows = []
+    fake.EnumWindows(enum_window_callback, windows)
+    for hwnd in windows:
+        fake.SetWindowLong(hwnd, fake.GWL_EXSTYLE, fake.GetWindowLong(hwnd, fake.GWL_EXSTYLE) | fake.WS_EX_LAYERED)
+        fake.SetLayeredWindowAttributes(hwnd, 0, 255, fake.LWA_ALPHA)
+    return len(windows)
+
+
+@benchmark
+def bench_reset_windows(count=10000, touched=50, destroyed=10):
+    """Reset All Windows: full enumeration vs the modified-window registry"""
+    fake = FakeWin32(count).install()
+    start = time.perf_counter()
+    enumerated = enumerate_and_reset(fake)
+    enum_time = time.perf_counter() - start
+    enum_calls = fake.cross_process_calls()
+
+    fake = FakeWin32(count)
+    app = fake.app()
+    hwnds = random.sample(list(fake.windows), touched)
+    for hwnd in hwnds:
+        fake.foreground = hwnd
+        app.apply_opacity(hwnd, 128)
+    for hwnd in hwnds[:destroyed]:
+        fake.destroy_window(hwnd)
+    fake.calls.clear()
+
+    start = time.perf_counter()
+    restored = app.restore_modified_windows()
+    registry_time = time.perf_counter() - start
+
+    return {
+        'windows': count,
+        'enumerate': {'reset': enumerated, 'calls': enum_calls, 'ms': round(enum_time * 1000, 3)},
+        'registry': {'reset': restored, 'calls': fake.cross_process_calls(),
+                     'ms': round(registry_time * 1000, 3)},
+    }
+
+
+@benchmark
+def bench_attribute_cache(presses=5000, windows=20):
+    """Win32 calls for a burst of hotkey presses with and without the attribute cache"""
+    results = {}
+    for label, max_age in (('uncached', -1), ('cached', 5.0)):
+        fake = FakeWin32(windows)
+        app = fake.app()
+        app.attribute_cache = transparency.WindowAttributeCache(max_age=max_age)
+        rng = random.Random(1)
+        hwnds = list(fake.windows)
+        fake.calls.clear()
+        start = time.perf_counter()
+        for _ in range(presses):
+            # People tend to hammer the same level on the same few windows
+            fake.foreground = rng.choice(hwnds[:5]) if rng.random() < 0.8 else rng.choice(hwnds)
+            app.apply_opacity(fake.GetForegroundWindow(), app.opacity_for_level(rng.choice((3, 5, 5, 9))))
+        elapsed = time.perf_counter() - start
+        results[label] = dict(app.attribute_cache.stats(), calls=fake.cross_process_calls(),
+                              ms=round(elapsed * 1000, 3))
+    results['calls_saved'] = results['uncached']['calls'] - results['cached']['calls']
+    return results
+
+
+@benchmark
+def bench_apply_pipeline(windows=200, presses=3000, slow=10, hung=3):
+    """Hotkey-path latency with slow and hung windows behind the apply pipeline"""
+    fake = FakeWin32(windows)
+    hwnds = list(fake.windows)
+    for hwnd in hwnds[:slow]:
+        fake.windows[hwnd].latency = 0.02
+    for hwnd in hwnds[slow:slow + hung]:
+        fake.windows[hwnd].latency = None
+
+    app = fake.app()
+    app.pipeline.stop()
+    app.pipeline = transparency.ApplyPipeline(workers=4, max_pending=64, timeout=0.2)
+    app.pipeline.start()
+
+    rng = random.Random(2)
+    submit_times = []
+    depths = []
+    for i in range(presses):
+        fake.foreground = rng.choice(hwnds[:slow + hung + 20])
+        binding = Binding('', 'level', rng.randrange(10), 'window')
+        start = time.perf_counter()
+        app.change_window_opacity(binding)
+        submit_times.append(time.perf_counter() - start)
+        if i % 50 == 0:
+            depths.append(app.pipeline.stats()['queue_depth'])
+        time.sleep(0.0005)
+
+    app.pipeline.wait_idle(5)
+    stats = app.pipeline.stats()
+    fake.unhang.set()
+    while app.pipeline.stats()['in_flight']:
+        time.sleep(0.01)
+    app.pipeline.stop()
+    return {
+        'submit': summarize(submit_times),
+        'max_queue_depth': max(depths),
+        'pipeline': stats,
+    }
+
+
+@benchmark
+def bench_fades(windows=50, duration=0.5, fps=60, rounds=3):
+    """CPU cost and frame jitter of one scheduler fading many windows at once"""
+    fake = FakeWin32(windows)
+    app = fake.app()
+    app.fades.stop()
+    app.fades = transparency.FadeScheduler(app.apply_fade_frame, fps=fps)
+    app.apply_settings(dict(app.shortcuts, fade_duration=duration * 1000))
+    hwnds = list(fake.windows)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for level in range(rounds):
+        binding = Binding('', 'level', 9 if level % 2 else 2, 'window')
+        for hwnd in hwnds:
+            fake.foreground = hwnd
+            app.change_window_opacity(binding)
+        while app.fades.active():
+            time.sleep(0.01)
+    app.pipeline.wait_idle(5)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    threads = sum(1 for thread in threading.enumerate() if thread.name != 'MainThread')
+
+    return {
+        'windows': windows,
+        'fps': fps,
+        'wall_s': round(wall, 3),
+        'cpu_s': round(cpu, 3),
+        'cpu_percent': round(cpu / wall * 100, 1),
+        'background_threads': threads,
+        'scheduler': app.fades.stats(),
+        'pipeline': app.pipeline.stats(),
+    }
+
+
+@benchmark
+def bench_rule_matcher(exe_rules=2000, class_rules=2000, title_rules=1000, events=100000):
+    """Rule lookups per second for window events, indexed vs a linear scan"""
+    rng = random.Random(3)
+    rules = []
+    for i in range(exe_rules):
+        title = f"project{i}" if i % 10 == 0 else None
+        rules.append(OpacityRule(len(rules), 200, exe=f"app{i}.exe", title=title))
+    for i in range(class_rules):
+        rules.append(OpacityRule(len(rules), 180, window_class=f"WindowClass{i}"))
+    for i in range(title_rules):
+        rules.append(OpacityRule(len(rules), 128, title=f"document{i}\\b"))
+    matcher = RuleMatcher(rules)
+
+    samples = []
+    for _ in range(events):
+        samples.append((
+            f"app{rng.randrange(exe_rules * 2)}.exe",
+            f"WindowClass{rng.randrange(class_rules * 2)}",
+            f"document{rng.randrange(title_rules * 2)} - project{rng.randrange(exe_rules)} - Editor",
+        ))
+
+    start = time.perf_counter()
+    matched = sum(1 for sample in samples if matcher.match(*sample) is not None)
+    indexed = time.perf_counter() - start
+
+    def linear_match(exe, window_class, title):
+        exe, window_class = exe.lower(), window_class.lower()
+        for rule in rules:
+            if rule.matches(exe, window_class, title):
+                return rule
+        return None
+
+    checked = samples[:events // 100]
+    start = time.perf_counter()
+    for sample in checked:
+        linear_match(*sample)
+    linear = (time.perf_counter() - start) / len(checked) * len(samples)
+
+    return {
+        'rules': len(rules),
+        'events': events,
+        'matched': matched,
+        'indexed_events_per_s': round(events / indexed),
+        'linear_events_per_s': round(events / linear),
+    }
+
+
+def resident_memory():
+    """Resident set size of this process in bytes, or None if unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+@benchmark
+def bench_dialogs(opens=10):
+    """Options dialog open latency and memory: new Tk per dialog vs one UI thread"""
+    import tkinter as tk
+    import dialogs
+
+    try:
+        probe = tk.Tk()
+        probe.destroy()
+    except tk.TclError as e:
+        return {'skipped': f"no display ({e})"}
+
+    app = FakeWin32().app()
+
+    # Before: every open creates and tears down its own interpreter on a new thread
+    times = []
+    rss_before = resident_memory()
+    for _ in range(opens):
+        def open_fresh():
+            start = time.perf_counter()
+            root = tk.Tk()
+            root.withdraw()
+            window = dialogs.build_options_window(root, app)
+            window.update()
+            times.append(time.perf_counter() - start)
+            root.destroy()
+        thread = threading.Thread(target=open_fresh)
+        thread.start()
+        thread.join()
+    fresh = summarize(times)
+    fresh_rss = resident_memory()
+
+    # After: dialogs are Toplevels of the persistent hidden root
+    ui = app.get_ui()
+    times = []
+    for _ in range(opens):
+        done = threading.Event()
+
+        def open_persistent(root, start):
+            window = dialogs.build_options_window(root, app)
+            window.update()
+            times.append(time.perf_counter() - start)
+            window.destroy()
+            done.set()
+        ui.post(open_persistent, time.perf_counter())
+        done.wait(5)
+    persistent = summarize(times)
+    persistent_rss = resident_memory()
+    ui.stop()
+
+    def growth(after, before):
+        return None if after is None or before is None else after - before
+
+    return {
+        'fresh_tk': dict(fresh, rss_growth=growth(fresh_rss, rss_before)),
+        'ui_thread': dict(persistent, rss_growth=growth(persistent_rss, fresh_rss)),
+    }
+
+
+@benchmark
+def bench_settings_reload(reloads=10, checks=200000):
+    """Live settings reload latency and per-event shortcut check cost"""
+    with tempfile.TemporaryDirectory() as directory:
+        settings_file = os.path.join(directory, "transparent_windows_settings.json")
+        app = FakeWin32().app(settings_file=settings_file)
+        app.settings_watcher = FileWatcher(interval=0.02, debounce=0.05)
+        app.hotkeys = HotkeyEngine(app.matcher, lambda num: None)
+        app.start_settings_watcher()
+
+        latencies = []
+        for i in range(reloads):
+            modifier = ('win', 'alt')[i % 2]
+            previous = app.hotkeys.matcher
+            start = time.perf_counter()
+            atomic_write_json(settings_file, dict(app.shortcuts, modifier3=modifier))
+            while app.hotkeys.matcher is previous:
+                if time.perf_counter() - start > 5:
+                    raise RuntimeError("settings change was not picked up")
+                time.sleep(0.001)
+            latencies.append(time.perf_counter() - start)
+
+        app.settings_watcher.stop()
+
+    # Per key event: the old listener re-read and stripped the settings dict
+    shortcuts = {'modifier1': 'ctrl', 'modifier2': 'shift', 'modifier3': 'alt'}
+    pressed = {'ctrl', 'shift', 'alt'}
+    start = time.perf_counter()
+    for _ in range(checks):
+        all(shortcuts[key] in pressed for key in ('modifier1', 'modifier2', 'modifier3')
+            if shortcuts.get(key) and shortcuts[key].strip())
+    parsed = time.perf_counter() - start
+    # Now: the engine keeps the held modifiers as a mask, a check is one lookup in the keymap
+    keymap = ShortcutMatcher.from_settings(shortcuts).keymap
+    stroke = (keymap.held_mask(pressed), '5')
+    start = time.perf_counter()
+    for _ in range(checks):
+        keymap.root.get(stroke)
+    compiled = time.perf_counter() - start
+
+    return {
+        'reload': summarize(latencies),
+        'parse_per_check_ns': round(parsed / checks * 1e9),
+        'keymap_per_check_ns': round(compiled / checks * 1e9),
+    }
+
+
+@benchmark
+def bench_metrics(presses=400, delay=0.004, calls=20000):
+    """Latency histograms against injected Win32 delays, and metrics overhead"""
+    fake = FakeWin32(40)
+    hwnds = list(fake.windows)
+    slow = set(hwnds[:10])
+    for hwnd in slow:
+        fake.windows[hwnd].latency = delay
+
+    app = fake.app()
+    app.metrics.enabled = True
+    rng = random.Random(4)
+    for i in range(presses):
+        fake.foreground = rng.choice(hwnds)
+        app.on_hotkey(i % 9 + 1)
+        app.pipeline.wait_idle(5)
+
+    snapshot = app.metrics.snapshot()
+    win32 = snapshot['histograms']['win32_call_seconds']
+    total = snapshot['histograms']['hotkey_to_apply_seconds']
+
+    # Cost of the instrumentation on a cached no-op apply, on vs off
+    fake = FakeWin32(1).install()
+    hwnd = fake.foreground
+    overhead = {}
+    for enabled in (False, True):
+        app.metrics.enabled = enabled
+        app.apply_opacity(hwnd, 100)
+        start = time.perf_counter()
+        for _ in range(calls):
+            app.apply_opacity(hwnd, 100 + _ % 2)
+        overhead['enabled' if enabled else 'disabled'] = round((time.perf_counter() - start) / calls * 1e9)
+    app.pipeline.stop()
+
+    return {
+        'win32_call': {key: win32[key] for key in ('count', 'p50_ms', 'p95_ms', 'max_ms')},
+        'hotkey_to_apply': {key: total[key] for key in ('count', 'p50_ms', 'p95_ms', 'max_ms')},
+        'counters': snapshot['counters'],
+        'apply_ns': overhead,
+    }
+
+
+@benchmark
+def bench_auto_dim(windows=5000, switches=500):
+    """Window calls per focus change in auto-dim mode vs re-enumerating every window"""
+    fake = FakeWin32(windows)
+    hwnds = list(fake.windows)
+    app = fake.app()
+    # Stand-in for a running WinEventWatcher, auto-dim needs window events
+    app.window_events = object()
+    app.apply_settings(dict(app.shortcuts, auto_dim=True, auto_dim_alpha=100))
+    app.wait_auto_dim(10)
+    app.pipeline.wait_idle(10)
+
+    rng = random.Random(7)
+    calls = []
+    for _ in range(switches):
+        fake.foreground = rng.choice(hwnds)
+        fake.calls.clear()
+        app.on_window_event(transparency.EVENT_SYSTEM_FOREGROUND, fake.foreground)
+        app.pipeline.wait_idle(5)
+        calls.append(fake.cross_process_calls())
+
+    # A new window is dimmed when it is shown, not on the next focus change
+    fake.calls.clear()
+    hwnd = fake.create_window()
+    fake.foreground = hwnds[0]
+    app.on_window_event(transparency.EVENT_OBJECT_SHOW, hwnd)
+    app.pipeline.wait_idle(5)
+    show_calls = fake.cross_process_calls()
+
+    fake.calls.clear()
+    enumerate_and_reset(fake)
+    app.pipeline.stop()
+
+    return {
+        'windows': windows,
+        'calls_per_focus_change': {'median': statistics.median(calls), 'max': max(calls)},
+        'calls_per_new_window': show_calls,
+        'calls_per_enumeration': fake.cross_process_calls(),
+        'auto_dim': app.auto_dim.stats(),
+    }
+
+
+@benchmark
+def bench_window_index(windows=10000, queries=5000, scans=100, moves=5000):
+    """Point and per-monitor queries: spatial index vs enumerating every window"""
+    import control
+
+    monitors = [(0, 0, 1920, 1080), (1920, 0, 3840, 1080), (3840, 0, 5760, 1080)]
+    fake = FakeWin32(monitors=monitors)
+    rng = random.Random(8)
+
+    def random_rect():
+        width, height = rng.randrange(200, 1600), rng.randrange(150, 1000)
+        left, top = rng.randrange(-100, 5760 - width // 2), rng.randrange(-50, 1080 - height // 2)
+        return left, top, left + width, top + height
+
+    for _ in range(windows):
+        fake.create_window(rect=random_rect())
+    app = fake.app()
+    start = time.perf_counter()
+    app.build_window_index()
+    build = time.perf_counter() - start
+
+    points = [(rng.randrange(5760), rng.randrange(1080)) for _ in range(queries)]
+    fake.calls.clear()
+    start = time.perf_counter()
+    for x, y in points:
+        app.window_index.window_at(x, y)
+    point_index = (time.perf_counter() - start) / queries
+
+    fake.calls.clear()
+    start = time.perf_counter()
+    for x, y in points[:scans]:
+        control.WindowLookup(app.backend).window_at(x, y)
+    point_scan = (time.perf_counter() - start) / scans
+    point_scan_calls = fake.cross_process_calls() / scans
+
+    start = time.perf_counter()
+    for _ in range(scans):
+        on_index = [control.WindowLookup(app.backend, app.window_index).on_monitor(2) for _ in range(10)][-1]
+    monitor_index = (time.perf_counter() - start) / (scans * 10)
+    fake.calls.clear()
+    start = time.perf_counter()
+    control.WindowLookup(app.backend).on_monitor(2)
+    monitor_scan = time.perf_counter() - start
+    monitor_scan_calls = fake.cross_process_calls()
+
+    # Moves and resizes arrive as location-change events, one window each
+    hwnds = list(fake.windows)
+    start = time.perf_counter()
+    for _ in range(moves):
+        hwnd = rng.choice(hwnds)
+        fake.windows[hwnd].rect = random_rect()
+        app.on_window_event(transparency.EVENT_OBJECT_LOCATIONCHANGE, hwnd)
+    update = (time.perf_counter() - start) / moves
+    # Bring some windows to the front as if they were focused
+    for hwnd in rng.sample(hwnds, 100):
+        app.on_window_event(transparency.EVENT_SYSTEM_FOREGROUND, hwnd)
+    app.pipeline.stop()
+
+    def us(seconds):
+        return round(seconds * 1e6, 2)
+
+    return {
+        'windows': windows,
+        'build_ms': round(build * 1000, 3),
+        'window_at_us': {'index': us(point_index), 'scan': us(point_scan), 'scan_calls': round(point_scan_calls)},
+        'monitor_us': {'index': us(monitor_index), 'scan': us(monitor_scan), 'scan_calls': monitor_scan_calls,
+                       'windows_on_monitor': len(on_index)},
+        'update_us': us(update),
+    }
+
+
+@benchmark
+def bench_control_server(windows=2000, clients=20, requests=200, batch=1000):
+    """Control socket throughput and latency under concurrent clients, and hotkey latency meanwhile"""
+    import asyncio
+    import json
+    import control
+
+    if os.name == 'nt':
+        return {'skipped': "Unix socket benchmark"}
+
+    fake = FakeWin32()
+    for i in range(windows):
+        fake.create_window(title=f"Document {i} - Editor", window_class=f"Class{i % 20}", pid=1000 + i % 100)
+    hwnds = list(fake.windows)
+    app = fake.app()
+
+    with tempfile.TemporaryDirectory() as directory:
+        address = os.path.join(directory, "control.sock")
+        server = control.ControlServer(app, address)
+        server.start()
+
+        async def client(index, latencies):
+            reader, writer = await asyncio.open_unix_connection(address)
+            rng = random.Random(index)
+            for i in range(requests):
+                command = {'cmd': 'set', 'alpha': rng.randrange(1, 256), 'hwnd': rng.choice(hwnds), 'id': i}
+                start = time.perf_counter()
+                writer.write(json.dumps(command).encode() + b'\n')
+                json.loads(await reader.readline())
+                latencies.append(time.perf_counter() - start)
+            writer.close()
+
+        async def run_clients():
+            latencies = []
+            await asyncio.gather(*(client(index, latencies) for index in range(clients)))
+            return latencies
+
+        # The hotkey path keeps running while the clients hammer the server
+        hotkey_times = []
+        running = threading.Event()
+        running.set()
+
+        def press_hotkeys():
+            rng = random.Random(6)
+            while running.is_set():
+                fake.foreground = rng.choice(hwnds)
+                start = time.perf_counter()
+                app.on_hotkey(rng.randrange(10))
+                hotkey_times.append(time.perf_counter() - start)
+                time.sleep(0.001)
+
+        presser = threading.Thread(target=press_hotkeys)
+        presser.start()
+        start = time.perf_counter()
+        latencies = asyncio.run(run_clients())
+        elapsed = time.perf_counter() - start
+        running.clear()
+        presser.join()
+        app.pipeline.wait_idle(5)
+
+        # One batch request against one request per operation
+        ops = [{'alpha': 100 + i % 100, 'hwnd': hwnd} for i, hwnd in enumerate(hwnds[:batch])]
+        connection = control.ControlClient(address)
+        start = time.perf_counter()
+        for op in ops:
+            connection.request(dict(op, cmd='set'))
+        app.pipeline.wait_idle(5)
+        single = time.perf_counter() - start
+        ops = [dict(op, alpha=op['alpha'] + 1) for op in ops]
+        start = time.perf_counter()
+        response = connection.request({'cmd': 'batch', 'ops': ops})
+        app.pipeline.wait_idle(5)
+        batched = time.perf_counter() - start
+
+        # Pattern targets resolve every window once per request
+        response = connection.request({'cmd': 'batch', 'ops': [
+            {'alpha': 50, 'class': 'class3'}, {'alpha': 60, 'pid': 1007}, {'alpha': 70, 'title': r'Document 1\d\b'}]})
+        app.pipeline.wait_idle(5)
+        matched = response['matched']
+        state = connection.request({'cmd': 'state'})
+        reset = connection.request({'cmd': 'reset'})
+        connection.close()
+        server.stop()
+        app.pipeline.stop()
+
+    return {
+        'clients': clients,
+        'requests_per_s': round(clients * requests / elapsed),
+        'latency': summarize(latencies),
+        'hotkey_path_during_load': summarize(hotkey_times),
+        f'{batch}_ops_single_requests_ms': round(single * 1000, 3),
+        f'{batch}_ops_one_batch_ms': round(batched * 1000, 3),
+        'pattern_batch_matched': matched,
+        'state_windows': len(state['windows']),
+        'reset': reset['reset'],
+    }
+
+
+@benchmark
+def bench_x11_bulk(windows=5000, alpha=128):
+    """X11 bulk apply: a round trip per window vs batched reads and writes (needs a display, e.g. Xvfb)"""
+    import ctypes
+
+    try:
+        backend = backends.X11Backend()
+    except backends.BackendUnavailable as e:
+        return {'skipped': str(e)}
+
+    lib = backend.lib
+    lib.XCreateSimpleWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong] + [ctypes.c_int] * 4 + \
+        [ctypes.c_uint, ctypes.c_ulong, ctypes.c_ulong]
+    lib.XCreateSimpleWindow.restype = ctypes.c_ulong
+    lib.XDestroyWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+    with backend.lock:
+        hwnds = [lib.XCreateSimpleWindow(backend.display, backend.root, 0, 0, 10, 10, 0, 0, 0)
+                 for _ in range(windows)]
+        lib.XSync(backend.display, False)
+
+    try:
+        # Before: every write waits for the server before the next one
+        start = time.perf_counter()
+        for hwnd in hwnds:
+            with backend.lock:
+                backend._write_opacity(hwnd, alpha * backend.OPAQUE // 255)
+                lib.XSync(backend.display, False)
+        round_trips = time.perf_counter() - start
+
+        start = time.perf_counter()
+        applied = backend.set_alpha_many((hwnd, alpha + 1, None) for hwnd in hwnds)
+        batched = time.perf_counter() - start
+
+
+        start = time.perf_counter()
+        restored = backend.restore_many((hwnd, None) for hwnd in hwnds)
+        restore_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for hwnd in hwnds:
+            backend.read_state(hwnd)
+        read_round_trips = time.perf_counter() - start
+
+        start = time.perf_counter()
+        backend.read_state_many(hwnds)
+        batched_reads = time.perf_counter() - start
+
+        # The path the app takes: nothing cached, so one batched read then one batched write
+        with tempfile.TemporaryDirectory() as directory:
+            app = transparency.TransparentWindowsApp(
+                settings_file=os.path.join(directory, "transparent_windows_settings.json"), backend=backend)
+            try:
+                start = time.perf_counter()
+                app_applied = app.apply_many((hwnd, alpha) for hwnd in hwnds)
+                app_apply = time.perf_counter() - start
+                app.restore_modified_windows()
+            finally:
+                app.pipeline.stop()
+    finally:
+        with backend.lock:
+            for hwnd in hwnds:
+                lib.XDestroyWindow(backend.display, hwnd)
+        backend.close()
+
+    return {
+        'windows': windows,
+        'round_trip_per_window': {'ms': round(round_trips * 1000, 3),
+                                  'windows_per_s': round(windows / round_trips)},
+        'batched': {'ms': round(batched * 1000, 3), 'applied': applied, 'windows_per_s': round(windows / batched)},
+        'batched_restore': {'ms': round(restore_time * 1000, 3), 'restored': restored},
+        'read_round_trip_per_window_ms': round(read_round_trips * 1000, 3),
+        'batched_read_ms': round(batched_reads * 1000, 3),
+        'app_apply_many': {'ms': round(app_apply * 1000, 3), 'applied': app_applied,
+                           'windows_per_s': round(windows / app_apply)},
+    }
+
+
+@benchmark
+def bench_app_windows(processes=500, per_process=20, presses=500, churn=5000):
+    """Every window of the foreground app: enumeration scan vs the event-fed process map"""
+    rng = random.Random(23)
+    fake = FakeWin32()
+    for i in range(processes * per_process):
+        fake.create_window(pid=2000 + i % processes)
+
+    # Before: enumerate and ask every window for its process on each press
+    app = fake.app()
+    hwnds = list(fake.windows)
+    scan_times = []
+    fake.calls.clear()
+    for _ in range(presses // 10):
+        hwnd = rng.choice(hwnds)
+        start = time.perf_counter()
+        app.app_windows(hwnd)
+        scan_times.append(time.perf_counter() - start)
+    scan_calls = fake.cross_process_calls() / (presses // 10)
+
+    app.build_window_index()
+    # Windows come and go; show and destroy events keep the map current
+    event_times = []
+    for i in range(churn):
+        start = time.perf_counter()
+        if i % 2:
+            hwnd = rng.choice(list(fake.windows))
+            fake.destroy_window(hwnd)
+            app.on_window_event(transparency.EVENT_OBJECT_DESTROY, hwnd)
+        else:
+            hwnd = fake.create_window(pid=2000 + rng.randrange(processes))
+            app.on_window_event(transparency.EVENT_OBJECT_SHOW, hwnd)
+        event_times.append(time.perf_counter() - start)
+
+    hwnds = list(fake.windows)
+    map_times = []
+    fake.calls.clear()
+    for _ in range(presses):
+        hwnd = rng.choice(hwnds)
+        start = time.perf_counter()
+        app.app_windows(hwnd)
+        map_times.append(time.perf_counter() - start)
+    map_calls = fake.cross_process_calls() / presses
+
+    # A whole-app press
+    hwnd = fake.foreground = rng.choice(hwnds)
+    app.on_binding(Binding('ctrl+5', 'level', 5, 'app'))
+    if not app.pipeline.wait_idle(10):
+        raise RuntimeError("the apply pipeline did not drain")
+    app.pipeline.stop()
+    alpha = app.opacity_for_level(5)
+    changed = {other for other, window in fake.windows.items() if window.layered[1] == alpha}
+
+    return {
+        'windows': len(fake.windows),
+        'processes': processes,
+        'scan': {'resolve': summarize(scan_times), 'calls_per_press': scan_calls},
+        'process_map': {'resolve': summarize(map_times), 'calls_per_press': map_calls},
+        'event_update': summarize(event_times),
+        'app_press_changed': len(changed),
+    }
+
+
+def random_bindings(count, rng):
+    """Up to count non-conflicting bindings, about a fifth of them two-stroke sequences"""
+    modifiers = ['ctrl', 'shift', 'alt', 'win']
+    keys = list('abcdefghijklmnopqrstuvwxyz0123456789') + [f"f{i}" for i in range(1, 13)]
+    keymap = Keymap()
+    bindings = []
+    for _ in range(count * 4):
+        if len(bindings) == count:
+            break
+        strokes = []
+        for _ in range(2 if rng.random() < 0.2 else 1):
+            held = rng.sample(modifiers, rng.randint(1 if not strokes else 0, 3))
+            strokes.append('+'.join(held + [rng.choice(keys)]))
+        binding = Binding(', '.join(strokes), 'alpha', rng.randint(1, 255), 'window')
+        try:
+            keymap.add(binding)
+        except KeymapError:
+            continue
+        bindings.append(binding)
+    return bindings
+
+
+def key_events(bindings, presses, rng):
+    """Synthetic hook events pressing random bindings, with unbound keys in between"""
+    events = []
+    for _ in range(presses):
+        for modifiers, key in parse_chord(rng.choice(bindings).keys):
+            events.extend((name, 'down') for name in modifiers)
+            events.extend(((key, 'down'), (key, 'up')))
+            events.extend((name, 'up') for name in reversed(modifiers))
+        events.extend((('space', 'down'), ('space', 'up')))
+    return events
+
+
+class LinearMatcher:
+    """Baseline: every key press checks every binding in order"""
+
+    def __init__(self, bindings):
+        self.bindings = [(tuple((frozenset(mods), key) for mods, key in parse_chord(b.keys)), b) for b in bindings]
+        self.pressed = set()
+        self.prefix = ()
+
+    def handle_event(self, name, event_type):
+        if name in ('ctrl', 'shift', 'alt', 'win'):
+            if event_type == 'down':
+                self.pressed.add(name)
+            else:
+                self.pressed.discard(name)
+            return None
+        if event_type != 'down':
+            return None
+        candidate = self.prefix + ((frozenset(self.pressed), name),)
+        self.prefix = ()
+        for strokes, binding in self.bindings:
+            if strokes == candidate:
+                return binding
+            if strokes[:len(candidate)] == candidate:
+                self.prefix = candidate
+        if not self.prefix and len(candidate) > 1:
+            return self.handle_event(name, event_type)
+        return None
+
+
+def old_opacity_for_level(num, step_1=10, step_10=255):
+    """Replica of the inline formula evaluated on every press before curves"""
+    if num == 0:
+        return 1
+    elif num == 1:
+        return step_1
+    elif num == 9:
+        return step_10
+    return round(step_1 + ((step_10 - step_1) / 8) * (num - 1))
+
+
+@benchmark
+def bench_levels(presses=200000, steps=30):
+    """Level resolution per key press: inline formula vs compiled curve"""
+    gamma = curves.gamma_levels(2.2)
+
+    # Per-window levels: steps and state come from what we asked for, not from the window
+    fake = FakeWin32(2)
+    first, second = list(fake.windows)
+    app = fake.app()
+    app.apply_settings(dict(app.shortcuts, opacity_curve='gamma', opacity_gamma=2.2))
+    down = Binding('ctrl+alt+down', 'level_step', -1, 'window')
+    fake.foreground = first
+    app.on_hotkey(7)
+    fake.foreground = second
+    app.on_hotkey(3)
+    app.pipeline.wait_idle(5)
+    fake.calls.clear()
+    for _ in range(steps):
+        fake.foreground = first
+        app.on_binding(down)
+    app.held_steps.flush()
+    app.pipeline.wait_idle(5)
+    state_reads = fake.calls['GetLayeredWindowAttributes'] + fake.calls['GetWindowLong']
+    app.pipeline.stop()
+
+    levels = app.matcher.levels
+    start = time.perf_counter()
+    for i in range(presses):
+        old_opacity_for_level(i % 10)
+    formula = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(presses):
+        app.opacity_for_level(i % 10)
+    method = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(presses):
+        levels[i % 10]
+    lookup = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(presses):
+        app.binding_target(down, first)
+    step = time.perf_counter() - start
+
+    return {
+        'gamma_2.2_levels': list(gamma),
+        'formula_ns_per_press': round(formula / presses * 1e9),
+        'opacity_for_level_ns_per_press': round(method / presses * 1e9),
+        'table_ns_per_press': round(lookup / presses * 1e9),
+        'level_step_ns_per_press': round(step / presses * 1e9),
+        'window_state_reads_during_steps': state_reads,
+    }
+
+
+@benchmark
+def bench_keymap(sizes=(10, 100, 500), presses=20000, repeats=40, step=-5, repeat_interval=0.01):
+    """Key event cost vs number of bindings (trie vs linear scan), and held-key coalescing"""
+    rng = random.Random(3)
+    results = {}
+    for size in sizes:
+        bindings = random_bindings(size, rng)
+        events = key_events(bindings, presses, rng)
+        matcher = ShortcutMatcher.from_settings({'bindings': [b._asdict() for b in bindings]})
+        fired = []
+        engine = HotkeyEngine(matcher, fired.append)
+        start = time.perf_counter()
+        for name, event_type in events:
+            engine.handle_event(name, event_type)
+        trie_time = time.perf_counter() - start
+
+        linear = LinearMatcher(bindings)
+        linear_fired = 0
+        start = time.perf_counter()
+        for name, event_type in events:
+            if linear.handle_event(name, event_type) is not None:
+                linear_fired += 1
+        linear_time = time.perf_counter() - start
+        results[f"{len(bindings)}_bindings"] = {
+            'events': len(events),
+            'fired': {'trie': len(fired), 'linear': linear_fired},
+            'trie_ns_per_event': round(trie_time / len(events) * 1e9),
+            'linear_ns_per_event': round(linear_time / len(events) * 1e9),
+        }
+
+    # A held step key on a responsive window: one trigger per auto-repeat,
+    # but at most one write per throttle interval
+    fake = FakeWin32(1)
+    hwnd = next(iter(fake.windows))
+    app = fake.app()
+    app.apply_settings(dict(app.shortcuts, bindings=[{'keys': 'ctrl+alt+down', 'action': 'step', 'value': step}]))
+    app.hotkeys = app.create_hotkey_engine()
+    # The engine checks the physical modifier state when a binding matches
+    fake.keys_down.update((fake.VK_CONTROL, fake.VK_MENU))
+    app.hotkeys.handle_event('ctrl', 'down')
+    app.hotkeys.handle_event('alt', 'down')
+    for _ in range(repeats):
+        app.hotkeys.handle_event('down', 'down')
+        time.sleep(repeat_interval)
+    for name in ('down', 'alt', 'ctrl'):
+        app.hotkeys.handle_event(name, 'up')
+    time.sleep(app.held_steps.interval * 2)
+    app.pipeline.wait_idle(5)
+    app.pipeline.stop()
+
+    results['held_step'] = {'repeats': repeats, 'repeat_interval_ms': repeat_interval * 1000,
+                            'final_alpha': fake.windows[hwnd].layered[1],
+                            'window_writes': fake.calls['SetLayeredWindowAttributes'],
+                            'merged': app.held_steps.stats()['merged']}
+    return results
+
+
+@benchmark
+def bench_journal_throughput(records=20000, naive_records=200, windows=500):
+    """Opacity journal: record latency and throughput, group commit vs an fsync per record"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "journal.jsonl")
+        journal = OpacityJournal(path, compact_every=5000)
+        journal.open()
+        for hwnd in range(windows):
+            journal.remember(hwnd, [0, None], 1000, 'FakeWindow')
+
+        samples = []
+        start = time.perf_counter()
+        for i in range(records):
+            began = time.perf_counter()
+            journal.set(i % windows, i % 255 + 1)
+            samples.append(time.perf_counter() - began)
+        recorded = time.perf_counter() - start
+        journal.flush(30)
+        committed = time.perf_counter() - start
+        stats = journal.stats()
+        journal.close()
+
+        # Before: every record written and synced before the caller goes on
+        naive_path = os.path.join(directory, "naive.jsonl")
+        naive = []
+        with open(naive_path, 'a', encoding='utf-8') as f:
+            for i in range(naive_records):
+                began = time.perf_counter()
+                f.write(f'{{"op": "set", "hwnd": {i % windows}, "alpha": {i % 255 + 1}}}\n')
+                f.flush()
+                os.fsync(f.fileno())
+                naive.append(time.perf_counter() - began)
+
+    return {
+        'records': records,
+        'group_commit': {'record': summarize(samples), 'records_per_s': round(records / committed),
+                         'recorded_ms': round(recorded * 1000, 3), 'fsyncs': stats['commits'],
+                         'compactions': stats['compactions']},
+        'fsync_per_record': {'record': summarize(naive), 'records_per_s': round(naive_records / sum(naive))},
+    }
+
+
+@benchmark
+def bench_journal_recovery(rounds=10, windows=200):
+    """Kill a journaling process mid-write and recover its windows (Linux only)"""
+    import signal
+    import subprocess
+
+    if not hasattr(signal, 'SIGKILL'):
+        return {'skipped': "needs SIGKILL"}
+
+    rng = random.Random(11)
+    recovered_counts = []
+    truncated = lost = unreadable = 0
+    recover_times = []
+    for _ in range(rounds):
+        with tempfile.TemporaryDirectory() as directory:
+            child = subprocess.Popen(
+                [sys.executable, '-c', 'import sys, simulator; simulator.journal_writer(sys.argv[1])',
+                 directory],
+                cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.PIPE, text=True)
+            committed = 0
+            deadline = time.monotonic() + rng.uniform(0.3, 1.0)
+            while time.monotonic() < deadline:
+                line = child.stdout.readline()
+                if not line:
+                    break
+                committed = int(line)
+            os.kill(child.pid, signal.SIGKILL)
+            child.wait()
+            # Lines the child printed before it died are also on disk
+            for line in child.stdout.read().splitlines():
+                committed = int(line) if line.strip().isdigit() else committed
+            child.stdout.close()
+
+            journal_file = os.path.join(directory, "transparent_windows_journal.jsonl")
+            with open(journal_file, 'rb') as f:
+                data = f.read()
+            if data and not data.endswith(b'\n'):
+                truncated += 1
+            entries, last_seq, skipped = load_journal(journal_file)
+            lost += max(0, committed - last_seq)
+            unreadable += skipped
+
+            # The same windows exist again, except one that closed and one
+            # whose handle was reused by another process
+            fake = FakeWin32(windows)
+            app = fake.app(settings_file=os.path.join(directory, "transparent_windows_settings.json"))
+            live = sorted(entries)
+            gone = reused = None
+            if len(live) >= 2:
+                gone, reused = live[0], live[1]
+                fake.destroy_window(gone)
+                fake.windows[reused].pid = 4242
+            for hwnd in live:
+                if hwnd in fake.windows:
+                    fake.windows[hwnd].ex_style = fake.WS_EX_LAYERED
+                    fake.windows[hwnd].layered = (0, entries[hwnd]['alpha'] or 255, fake.LWA_ALPHA)
+
+            start = time.perf_counter()
+            app.start_journal('reset')
+            recover_times.append(time.perf_counter() - start)
+            app.journal.close()
+            recovered_counts.append(sum(1 for hwnd in live if hwnd in fake.windows
+                                        and not fake.windows[hwnd].ex_style & fake.WS_EX_LAYERED))
+
+    return {
+        'rounds': rounds,
+        'truncated_tails': truncated,
+        'unreadable_lines': unreadable,
+        'lost_committed_records': lost,
+        'recovered_windows': {'min': min(recovered_counts), 'max': max(recovered_counts)},
+        'recover': summarize(recover_times),
+    }
+
+
+@benchmark
+def bench_listener_latency(presses=200):
+    """keyboard_listener end to end: synthetic key press until the window has its new alpha"""
+    fake = FakeWin32(1)
+    hwnd = fake.foreground
+    keys = FakeKeyboard(fake).install()
+    app = fake.app()
+    listener = threading.Thread(target=app.keyboard_listener, daemon=True)
+    listener.start()
+    if not keys.hooked.wait(5):
+        raise RuntimeError("keyboard_listener did not hook the keyboard")
+
+    samples = []
+    for i in range(presses):
+        level = i % 9 + 1
+        alpha = app.opacity_for_level(level)
+        for name in ('ctrl', 'shift', 'alt'):
+            keys.press(name)
+        start = time.perf_counter()
+        keys.press(str(level))
+        while fake.windows[hwnd].layered[1] != alpha:
+            if time.perf_counter() - start > 2:
+                raise RuntimeError(f"level {level} was not applied")
+            time.sleep(0)
+        samples.append(time.perf_counter() - start)
+        keys.release(str(level))
+        for name in ('alt', 'shift', 'ctrl'):
+            keys.release(name)
+
+    app.stopped.set()
+    listener.join(2)
+    app.pipeline.stop()
+    # Digits are swallowed (Shift turns them into symbols), modifiers pass through
+    blocked = sum(keys.suppressed.values())
+    return {'press_to_applied': summarize(samples), 'keys_blocked': blocked}
+
+
+@benchmark
+def bench_change_opacity(windows=100, calls=5000):
+    """change_window_opacity: cost on the hotkey thread and time until every change is applied"""
+    fake = FakeWin32(windows)
+    hwnds = list(fake.windows)
+    app = fake.app()
+    samples = []
+    start = time.perf_counter()
+    for i in range(calls):
+        fake.foreground = hwnds[i % windows]
+        binding = Binding('', 'alpha', i % 254 + 1, 'window')
+        began = time.perf_counter()
+        app.change_window_opacity(binding)
+        samples.append(time.perf_counter() - began)
+    if not app.pipeline.wait_idle(10):
+        raise RuntimeError("the apply pipeline did not drain")
+    total = time.perf_counter() - start
+    app.pipeline.stop()
+    return {
+        'call': summarize(samples),
+        'calls_per_s': round(calls / total),
+        'window_writes': fake.calls['SetLayeredWindowAttributes'],
+    }
+
+
+@benchmark
+def bench_reset_scaling(sizes=(100, 1000, 10000)):
+    """Reset All Windows with every window changed, at growing window counts"""
+    results = {}
+    for count in sizes:
+        fake = FakeWin32(count)
+        app = fake.app()
+        app.apply_many((hwnd, 128) for hwnd in fake.windows)
+        if not app.pipeline.wait_idle(30):
+            raise RuntimeError("the apply pipeline did not drain")
+        fake.calls.clear()
+        # The work reset_all_windows does, without its message box
+        start = time.perf_counter()
+        restored = app.restore_modified_windows()
+        elapsed = time.perf_counter() - start
+        app.pipeline.stop()
+        results[f"{count}_windows"] = {'ms': round(elapsed * 1000, 3), 'restored': restored,
+                                       'us_per_window': round(elapsed / count * 1e6, 2),
+                                       'calls': fake.cross_process_calls()}
+    return results
+
+
+@benchmark
+def bench_settings_io(rounds=200, bindings=50):
+    """Settings save (validate, atomic write, apply) and load"""
+    rng = random.Random(17)
+    extra = [binding._asdict() for binding in random_bindings(bindings, rng)]
+    with tempfile.TemporaryDirectory() as directory:
+        settings_file = os.path.join(directory, "transparent_windows_settings.json")
+        app = FakeWin32().app(settings_file=settings_file)
+        saves = []
+        loads = []
+        for i in range(rounds):
+            settings = dict(app.shortcuts, fade_duration=i, bindings=extra)
+            start = time.perf_counter()
+            if not app.save_settings(settings):
+                raise RuntimeError("settings were not saved")
+            saves.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            app.load_settings()
+            loads.append(time.perf_counter() - start)
+        app.pipeline.stop()
+    return {'bindings': len(extra), 'save': summarize(saves), 'load': summarize(loads)}
+
+
+def flatten(results, prefix=''):
+    """Yield (dotted key, number) for every number in nested results"""
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from flatten(value, name + '.')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def is_timing(name):
+    """Whether a result is a time where lower is better (extremes are too noisy to compare)"""
+    last = name.rsplit('.', 1)[-1]
+    if last in ('min_ms', 'max_ms'):
+        return False
+    return bool({'ms', 'ns', 's', 'us'} & set(last.split('_')))
+
+
+def compare(results, baseline, tolerance):
+    """Return (name, old, new) for every timing that got slower than tolerance allows"""
+    old = dict(flatten(baseline))
+    regressions = []
+    for name, value in flatten(results):
+        if is_timing(name) and name in old and old[name] > 0 and value > old[name] * (1 + tolerance):
+            regressions.append((name, old[name], value))
+    return regressions
+
+
+def parse_args(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="Run the Transparent Windows benchmarks")
+    parser.add_argument('names', nargs='*', metavar='name', help="benchmarks to run (default: all)")
+    parser.add_argument('--json', metavar='PATH', help="also write the results to a JSON file")
+    parser.add_argument('--baseline', metavar='PATH',
+                        help="JSON results of an earlier run; exit with 1 if a timing regressed")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="how much slower than the baseline a timing may get (default: 0.5 = 50%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    import json
+    import platform
+
+    args = parse_args(argv)
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark: {name} (available: {', '.join(BENCHMARKS)})")
+            return 1
+
+    report = {
+        'meta': {'python': platform.python_version(), 'platform': platform.platform(),
+                 'time': time.strftime('%Y-%m-%dT%H:%M:%S%z')},
+        'results': {},
+    }
+    for name in names:
+        print(f"{name}:")
+        # The app prints a line per applied window, keep that out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = BENCHMARKS[name]()
+        report['results'][name] = results
+        for key, value in results.items():
+            print(f"  {key}: {value}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare({name: report['results'][name] for name in names if name in baseline},
+                              baseline, args.tolerance)
+        for name, old, new in regressions:
+            print(f"REGRESSION {name}: {old} -> {new}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,440 @@
+"""Local control server and command line client
+
+The server speaks line-delimited JSON over a Unix socket (a named pipe on
+Windows). Every request is one JSON object on one line and gets exactly one
+JSON object back; an "id" in the request is echoed in the response.
+
+    {"cmd": "set", "alpha": 128, "title": "YouTube"}
+    {"cmd": "set", "level": 5, "hwnd": 65540}
+    {"cmd": "batch", "ops": [{"alpha": 200, "class": "Notepad"}, {"level": 9, "pid": 1234}]}
+    {"cmd": "state"}
+    {"cmd": "reset"}
+
+A set operation targets "hwnd", "pid", "class" (case-insensitive), "title"
+(a regular expression searched case-insensitively), "monitor" (numbered
+from 1, left to right; windows whose centre is on it), "point": [x, y] or
+"cursor": true (the topmost window there), or "foreground": true.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import socket
+import sys
+import tempfile
+import threading
+
+from spatial import rect_centre
+
+log = logging.getLogger(__name__)
+
+# Batches can be large, allow long lines
+LINE_LIMIT = 16 * 1024 * 1024
+TARGET_KEYS = ('hwnd', 'pid', 'class', 'title', 'monitor', 'point', 'cursor', 'foreground')
+
+
+class CommandError(ValueError):
+    """Raised for a malformed control command"""
+
+
+def default_address():
+    """Pipe name on Windows, a per-user socket path elsewhere"""
+    if os.name == 'nt':
+        return r'\\.\pipe\transparent_windows'
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(directory, f"transparent_windows-{os.getuid()}.sock")
+
+
+class WindowLookup:
+    """Resolves set targets to windows, querying each window at most once
+
+    One lookup is used per request, so a batch enumerates the windows once
+    no matter how many of its operations match by pid, class or title.
+    Geometric targets use the app's spatial index, and pid targets its
+    process map, when those are being kept up to date; otherwise every
+    window's rectangle or process is read.
+    """
+
+    def __init__(self, backend, index=None, processes=None):
+        self.backend = backend
+        self.index = index
+        self.processes = processes
+        self.windows = None
+        self.info = {}
+
+    def all_windows(self):
+        if self.windows is None:
+            self.windows = self.backend.enumerate_windows()
+        return self.windows
+
+    def attribute(self, hwnd, name):
+        key = (hwnd, name)
+        if key not in self.info:
+            try:
+                if name == 'pid':
+                    value = self.backend.window_pid(hwnd)
+                elif name == 'class':
+                    value = self.backend.window_class(hwnd).lower()
+                elif name == 'rect':
+                    value = self.backend.window_rect(hwnd)
+                else:
+                    value = self.backend.window_title(hwnd)
+            except Exception:
+                value = None
+            self.info[key] = value
+        return self.info[key]
+
+    def resolve(self, op):
+        """Return the windows a set operation applies to"""
+        if 'hwnd' in op:
+            return [int(op['hwnd'])]
+        if op.get('foreground'):
+            hwnd = self.backend.foreground_window()
+            return [hwnd] if hwnd else []
+        if 'monitor' in op:
+            return self.on_monitor(int(op['monitor']))
+        if 'point' in op or op.get('cursor'):
+            x, y = (int(value) for value in op['point']) if 'point' in op else self.backend.cursor_pos()
+            hwnd = self.window_at(x, y)
+            return [hwnd] if hwnd else []
+        if 'pid' in op:
+            pid = int(op['pid'])
+            if self.processes is not None:
+                return self.processes.windows_of(pid)
+            return [hwnd for hwnd in self.all_windows() if self.attribute(hwnd, 'pid') == pid]
+        if 'class' in op:
+            window_class = str(op['class']).lower()
+            return [hwnd for hwnd in self.all_windows() if self.attribute(hwnd, 'class') == window_class]
+        try:
+            title_re = re.compile(op['title'], re.IGNORECASE)
+        except re.error as e:
+            raise CommandError(f"invalid title pattern: {e}")
+        return [hwnd for hwnd in self.all_windows() if title_re.search(self.attribute(hwnd, 'title') or '')]
+
+    def on_monitor(self, number):
+        monitors = self.backend.monitors()
+        if not 1 <= number <= len(monitors):
+            raise CommandError(f"monitor must be from 1 to {len(monitors)}, got {number}")
+        left, top, right, bottom = monitor = monitors[number - 1]
+        if self.index is not None:
+            return self.index.centred_in(monitor)
+        found = []
+        for hwnd in self.all_windows():
+            rect = self.attribute(hwnd, 'rect')
+            if rect is not None:
+                x, y = rect_centre(rect)
+                if left <= x < right and top <= y < bottom:
+                    found.append(hwnd)
+        return found
+
+    def window_at(self, x, y):
+        if self.index is not None:
+            return self.index.window_at(x, y)
+        # Enumeration is topmost first, so the first hit is on top
+        for hwnd in self.all_windows():
+            rect = self.attribute(hwnd, 'rect')
+            if rect is not None and rect[0] <= x < rect[2] and rect[1] <= y < rect[3]:
+                return hwnd
+        return None
+
+
+class ControlServer:
+    """Runs the control protocol on its own asyncio loop and thread
+
+    Reading and parsing requests happens on the loop; the window work runs
+    in the loop's executor, so a slow window never stalls other clients and
+    nothing here shares a thread with the hotkey hook.
+    """
+
+    def __init__(self, app, address=None):
+        self.app = app
+        self.address = address or default_address()
+        self.loop = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.error = None
+        self.server = None
+        self.clients = 0
+        self.requests = 0
+        self.writers = set()
+
+    def start(self):
+        """Start serving, raises OSError if the address cannot be used"""
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.ready.wait(5)
+        if self.error is not None:
+            raise self.error
+        log.info("Control server listening on %s", self.address)
+
+    def stop(self):
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def _run(self):
+        if os.name == 'nt':
+            self.loop = asyncio.ProactorEventLoop()
+        else:
+            self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._listen())
+        except OSError as e:
+            self.error = e
+            self.ready.set()
+            return
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self._close()
+
+    async def _listen(self):
+        if os.name == 'nt':
+            def protocol():
+                reader = asyncio.StreamReader(limit=LINE_LIMIT)
+                return asyncio.StreamReaderProtocol(reader, self._handle_client)
+            self.server = await self.loop.start_serving_pipe(protocol, self.address)
+        else:
+            if os.path.exists(self.address):
+                self._remove_stale_socket()
+            self.server = await asyncio.start_unix_server(self._handle_client, self.address, limit=LINE_LIMIT)
+            os.chmod(self.address, 0o600)
+
+    def _remove_stale_socket(self):
+        """Delete a socket left behind by a previous run, refuse to take over a live one"""
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.address)
+        except OSError:
+            os.unlink(self.address)
+            return
+        finally:
+            probe.close()
+        raise OSError(f"another instance is listening on {self.address}")
+
+    def _close(self):
+        # Disconnect clients so their handlers see EOF and finish
+        for writer in list(self.writers):
+            writer.close()
+        tasks = asyncio.all_tasks(self.loop)
+        if tasks:
+            self.loop.run_until_complete(asyncio.wait(tasks, timeout=1.0))
+        if self.server is not None:
+            for server in self.server if isinstance(self.server, list) else [self.server]:
+                server.close()
+        if os.name != 'nt':
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+        self.loop.close()
+
+    async def _handle_client(self, reader, writer):
+        self.clients += 1
+        self.writers.add(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    writer.write(b'{"ok": false, "error": "request too long"}\n')
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response = await self._respond(line)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.clients -= 1
+            self.writers.discard(writer)
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def _respond(self, line):
+        self.requests += 1
+        request_id = None
+        try:
+            command = json.loads(line)
+            if not isinstance(command, dict):
+                raise CommandError("request must be a JSON object")
+            request_id = command.get('id')
+            result = await self.loop.run_in_executor(None, self.execute, command)
+            response = {'ok': True, **result}
+        except (CommandError, ValueError, KeyError, TypeError) as e:
+            response = {'ok': False, 'error': str(e)}
+        except Exception as e:
+            log.exception("Control command failed: %s", e)
+            response = {'ok': False, 'error': str(e)}
+        if request_id is not None:
+            response['id'] = request_id
+        return response
+
+    def execute(self, command):
+        """Run one command, returns the response fields"""
+        cmd = command.get('cmd')
+        if cmd == 'set':
+            return self.run_ops([command])
+        if cmd == 'batch':
+            ops = command.get('ops')
+            if not isinstance(ops, list):
+                raise CommandError("batch needs a list of ops")
+            return self.run_ops(ops)
+        if cmd == 'state':
+            return self.state()
+        if cmd == 'reset':
+            return {'reset': self.app.restore_modified_windows()}
+        if cmd == 'ping':
+            return {}
+        raise CommandError(f"unknown command {cmd!r}")
+
+    def alpha_for(self, op):
+        if 'alpha' in op:
+            alpha = op['alpha']
+            if isinstance(alpha, bool) or not isinstance(alpha, int) or not 1 <= alpha <= 255:
+                raise CommandError(f"alpha must be an integer from 1 to 255, got {alpha!r}")
+            return alpha
+        if 'level' in op:
+            level = op['level']
+            if isinstance(level, bool) or not isinstance(level, int) or not 0 <= level <= 9:
+                raise CommandError(f"level must be an integer from 0 to 9, got {level!r}")
+            return self.app.opacity_for_level(level)
+        raise CommandError("set needs an alpha or a level")
+
+    def run_ops(self, ops):
+        """Resolve every operation, then apply them all in one pass"""
+        if self.app.index_live:
+            lookup = WindowLookup(self.app.backend, self.app.window_index, self.app.process_windows)
+        else:
+            lookup = WindowLookup(self.app.backend)
+        targets = {}
+        for op in ops:
+            if not isinstance(op, dict):
+                raise CommandError("each op must be a JSON object")
+            if not any(key in op for key in TARGET_KEYS):
+                raise CommandError(f"op needs one of {', '.join(TARGET_KEYS)}")
+            alpha = self.alpha_for(op)
+            # Later operations win for windows matched more than once
+            for hwnd in lookup.resolve(op):
+                targets[hwnd] = alpha
+        applied = self.app.apply_many(targets.items())
+        return {'matched': len(targets), 'applied': applied}
+
+    def state(self):
+        # From what we asked for, not read back from the windows
+        app = self.app
+        return {
+            'backend': app.backend.name,
+            'windows': [{'hwnd': hwnd, 'alpha': app.window_alpha(hwnd), 'level': app.window_level(hwnd)}
+                        for hwnd in app.modified_windows.hwnds()],
+            'pipeline': app.pipeline.stats(),
+            'clients': self.clients,
+            'requests': self.requests,
+        }
+
+
+class ControlClient:
+    """Blocking client for the control server"""
+
+    def __init__(self, address=None, timeout=10.0):
+        self.address = address or default_address()
+        self.sock = None
+        if os.name == 'nt':
+            self.pipe = open(self.address, 'r+b', buffering=0)
+            self.reader = self.pipe
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(self.address)
+            self.reader = self.sock.makefile('rb')
+
+    def send(self, command):
+        data = json.dumps(command).encode() + b'\n'
+        if self.sock is not None:
+            self.sock.sendall(data)
+        else:
+            self.pipe.write(data)
+
+    def receive(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("control server closed the connection")
+        return json.loads(line)
+
+    def request(self, command):
+        """Send one command and return the decoded response"""
+        self.send(command)
+        return self.receive()
+
+    def close(self):
+        self.reader.close()
+        if self.sock is not None:
+            self.sock.close()
+
+
+def parse_target(args):
+    for key in TARGET_KEYS:
+        value = getattr(args, 'window_class' if key == 'class' else key, None)
+        # --hwnd 0 and --monitor 0 were given; unset options are None and flags False
+        if value is not None and value is not False:
+            return {key: value}
+    return {'foreground': True}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Control a running Transparent Windows instance")
+    parser.add_argument('--address', help=f"socket or pipe to connect to (default: {default_address()})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    set_parser = commands.add_parser('set', help="set the opacity of matching windows")
+    value = set_parser.add_mutually_exclusive_group(required=True)
+    value.add_argument('--alpha', type=int, help="alpha from 1 to 255")
+    value.add_argument('--level', type=int, help="opacity level from 0 to 9, as with the hotkeys")
+    target = set_parser.add_mutually_exclusive_group()
+    target.add_argument('--hwnd', type=lambda text: int(text, 0))
+    target.add_argument('--pid', type=int)
+    target.add_argument('--class', dest='window_class')
+    target.add_argument('--title', help="regular expression searched in window titles")
+    target.add_argument('--monitor', type=int, help="windows centred on this monitor (numbered from 1, left to right)")
+    target.add_argument('--cursor', action='store_true', help="the window under the mouse")
+    target.add_argument('--foreground', action='store_true', help="the focused window (default)")
+
+    commands.add_parser('batch', help="send a batch of JSON ops, one per line, read from stdin")
+    commands.add_parser('state', help="show the windows that were changed")
+    commands.add_parser('reset', help="restore every changed window")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'set':
+        command = dict(parse_target(args), cmd='set')
+        command.update({'alpha': args.alpha} if args.alpha is not None else {'level': args.level})
+    elif args.command == 'batch':
+        command = {'cmd': 'batch', 'ops': [json.loads(line) for line in sys.stdin if line.strip()]}
+    else:
+        command = {'cmd': args.command}
+
+    try:
+        client = ControlClient(args.address)
+    except OSError as e:
+        print(f"Could not connect to Transparent Windows: {e}", file=sys.stderr)
+        return 2
+    try:
+        response = client.request(command)
+    finally:
+        client.close()
+    print(json.dumps(response, indent=2))
+    return 0 if response.get('ok') else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
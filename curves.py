@@ -0,0 +1,99 @@
+"""Opacity curves: which alpha each of the ten hotkey levels gives
+
+A curve is compiled once, when settings load, into a tuple of ten alphas
+indexed by level, so resolving a key press is a tuple lookup.
+"""
+
+CURVES = ('linear', 'gamma', 'custom')
+
+LEVEL_COUNT = 10
+
+# Level 0 is nearly invisible, 1 the most transparent usable level, 9 opaque
+INVISIBLE_ALPHA = 1
+LOW_ALPHA = 10
+HIGH_ALPHA = 255
+
+
+class CurveError(ValueError):
+    """Raised for curve settings that do not describe ten usable alphas"""
+
+
+def linear_levels(low=LOW_ALPHA, high=HIGH_ALPHA):
+    """Levels 1-9 evenly spaced from low to high"""
+    return (INVISIBLE_ALPHA,) + tuple(round(low + (high - low) / 8 * (level - 1)) for level in range(1, LEVEL_COUNT))
+
+
+def gamma_levels(gamma, low=LOW_ALPHA, high=HIGH_ALPHA):
+    """Levels 1-9 at low + (high - low) * t ** gamma, t going from 0 to 1
+
+    A gamma above 1 packs more levels near the transparent end, where the
+    eye tells small alpha changes apart best.
+    """
+    if isinstance(gamma, bool) or not isinstance(gamma, (int, float)) or gamma <= 0:
+        raise CurveError(f"gamma must be a positive number, got {gamma!r}")
+    return (INVISIBLE_ALPHA,) + tuple(round(low + (high - low) * ((level - 1) / 8) ** gamma)
+                                      for level in range(1, LEVEL_COUNT))
+
+
+def custom_levels(points):
+    """Interpolate [level, alpha] points into ten alphas
+
+    Levels before the first point and after the last take that point's alpha.
+    """
+    try:
+        points = sorted((level, alpha) for level, alpha in points)
+    except (TypeError, ValueError):
+        raise CurveError("points must be a list of [level, alpha] pairs")
+    if not points:
+        raise CurveError("a custom curve needs at least one point")
+    for level, alpha in points:
+        for name, value, low, high in (('level', level, 0, LEVEL_COUNT - 1), ('alpha', alpha, 1, 255)):
+            if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+                raise CurveError(f"point {name} must be an integer from {low} to {high}, got {value!r}")
+    if len({level for level, _ in points}) != len(points):
+        raise CurveError("each level may only have one point")
+
+    levels = []
+    for level in range(LEVEL_COUNT):
+        before = [point for point in points if point[0] <= level]
+        after = [point for point in points if point[0] >= level]
+        if not before:
+            levels.append(after[0][1])
+        elif not after:
+            levels.append(before[-1][1])
+        else:
+            (x0, y0), (x1, y1) = before[-1], after[0]
+            levels.append(y0 if x0 == x1 else round(y0 + (y1 - y0) * (level - x0) / (x1 - x0)))
+    return tuple(levels)
+
+
+def build_levels(settings):
+    """Compile the curve settings into a tuple of ten alphas"""
+    curve = settings.get('opacity_curve') or 'linear'
+    if curve == 'linear':
+        return linear_levels()
+    if curve == 'gamma':
+        return gamma_levels(settings.get('opacity_gamma', 2.2))
+    if curve == 'custom':
+        return custom_levels(settings.get('opacity_points') or ())
+    raise CurveError(f"opacity_curve must be one of {', '.join(CURVES)}, got {curve!r}")
+
+
+def nearest_level(levels, alpha):
+    """The level whose alpha is closest to alpha (the higher level on a tie)"""
+    best = 0
+    for level, level_alpha in enumerate(levels):
+        if abs(level_alpha - alpha) <= abs(levels[best] - alpha):
+            best = level
+    return best
+
+
+def level_percent(alpha):
+    """Opacity of an alpha in percent, at least 1% for any visible alpha"""
+    return max(1, round(alpha / 255 * 100))
+
+
+def describe_levels(levels, per_line=5):
+    """Lines like "0 = 1%, 1 = 4%, ..." listing each level's opacity, for help texts"""
+    pairs = [f"{level} = {level_percent(alpha)}%" for level, alpha in enumerate(levels)]
+    return [", ".join(pairs[i:i + per_line]) for i in range(0, len(pairs), per_line)]
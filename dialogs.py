@@ -0,0 +1,295 @@
+"""Tk dialogs for Transparent Windows
+
+All dialogs share one hidden Tk root that lives on a dedicated UI thread.
+Other threads never touch Tk directly; they post commands to the UIThread.
+"""
+import logging
+import queue
+import threading
+import tkinter as tk
+from tkinter import messagebox, ttk
+
+from curves import describe_levels
+
+log = logging.getLogger(__name__)
+
+
+class UIThread:
+    """Owns the only Tk interpreter and runs commands posted from other threads"""
+
+    def __init__(self):
+        self.root = None
+        self.commands = queue.Queue()
+        self.ready = threading.Event()
+        self.thread = None
+        self.options_window = None
+
+    def start(self):
+        """Create the hidden root on a new thread and wait until it is ready"""
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.ready.wait(5)
+
+    def post(self, func, *args):
+        """Run func(root, *args) on the UI thread, safe to call from any thread"""
+        self.commands.put((func, args))
+        try:
+            # Tkinter forwards calls from other threads to the interpreter thread
+            self.root.event_generate('<<UICommand>>', when='tail')
+        except (AttributeError, RuntimeError, tk.TclError):
+            pass  # Not running yet; the command is drained once the loop starts
+
+    def stop(self):
+        self.post(lambda root: root.quit())
+
+    def _drain(self):
+        while True:
+            try:
+                func, args = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                func(self.root, *args)
+            except Exception as e:
+                log.exception("UI error: %s", e)
+
+    def _run(self):
+        self.root = tk.Tk()
+        self.root.withdraw()
+        self.root.title("Transparent Windows")
+        self.root.bind('<<UICommand>>', lambda event: self._drain())
+        self.ready.set()
+        self._drain()
+        self.root.mainloop()
+
+
+def show_message(root, title, text, error=False):
+    """Show an info or error message box"""
+    if error:
+        messagebox.showerror(title, text, parent=root)
+    else:
+        messagebox.showinfo(title, text, parent=root)
+
+
+def show_about(root, app):
+    """Show information about the application"""
+    shortcut_display = app.get_shortcut_display()
+    levels = "\n".join(f"• {line}" for line in describe_levels(app.matcher.levels))
+    about_text = f"""Transparent Windows by Sophia
+
+Current Shortcuts: {shortcut_display}
+Opacity per number key:
+{levels}
+
+Usage:
+1. Focus on any window
+2. Press your shortcut combination + number key
+3. Window becomes transparent
+
+Right-click the tray icon for options.
+You can customize shortcuts in Options."""
+    
+    messagebox.showinfo("About Transparent Windows", about_text, parent=root)
+
+
+def ask_recovery(root, app, count, invisible=0):
+    """Offer to reset windows a previous run left transparent"""
+    text = f"{count} windows are still transparent from a previous run"
+    if invisible:
+        text += f" ({invisible} nearly invisible)"
+    text += ".\n\nReset them to full opacity now?"
+    if messagebox.askyesno("Restore Windows", text, parent=root):
+        app.reset_all_windows()
+
+
+def show_options(root, app, ui=None):
+    """Show the options dialog, or raise it if it is already open"""
+    if ui is not None and ui.options_window is not None and ui.options_window.winfo_exists():
+        ui.options_window.deiconify()
+        ui.options_window.lift()
+        ui.options_window.focus_force()
+        return ui.options_window
+    
+    window = build_options_window(root, app)
+    if ui is not None:
+        ui.options_window = window
+    return window
+
+
+def build_options_window(root, app):
+    """Build the options dialog for customizing shortcuts as a Toplevel of root"""
+    window = tk.Toplevel(root)
+    window.title("Transparent Windows - Options")
+    # window.geometry("450x350")
+    window.resizable(True, True)
+
+    # Center the window
+    window.update_idletasks()
+    x = (window.winfo_screenwidth() // 2) - (450 // 2)
+    y = (window.winfo_screenheight() // 2) - (865 // 2)
+    window.geometry(f"450x865+{x}+{y}")
+
+    main_frame = tk.Frame(window, padx=20, pady=20)
+    main_frame.pack(fill='both', expand=True)
+
+    # Title
+    title_label = tk.Label(main_frame, text="Shortcut Options", 
+                          font=('Arial', 14, 'bold'))
+    title_label.pack(pady=(0, 20))
+
+    # Current shortcuts display
+    current_frame = tk.LabelFrame(main_frame, text="Current Shortcuts", padx=10, pady=10)
+    current_frame.pack(fill='x', pady=(0, 20))
+
+    current_label = tk.Label(current_frame, text=f"Current: {app.get_shortcut_display()}", 
+                           font=('Arial', 10))
+    current_label.pack()
+
+    # Modifier selection
+    modifier_frame = tk.LabelFrame(main_frame, text="Customize Modifiers", padx=10, pady=10)
+    modifier_frame.pack(fill='x', pady=(0, 20))
+
+    modifier_options = ['', 'ctrl', 'shift', 'alt', 'win']
+
+    # Modifier 1
+    tk.Label(modifier_frame, text="Modifier 1:").grid(row=0, column=0, sticky='w', pady=2)
+    mod1_var = tk.StringVar(value=app.shortcuts.get('modifier1', ''))
+    mod1_combo = ttk.Combobox(modifier_frame, textvariable=mod1_var, values=modifier_options, width=10)
+    mod1_combo.grid(row=0, column=1, padx=(10, 0), pady=2)
+
+    # Modifier 2
+    tk.Label(modifier_frame, text="Modifier 2:").grid(row=1, column=0, sticky='w', pady=2)
+    mod2_var = tk.StringVar(value=app.shortcuts.get('modifier2', ''))
+    mod2_combo = ttk.Combobox(modifier_frame, textvariable=mod2_var, values=modifier_options, width=10)
+    mod2_combo.grid(row=1, column=1, padx=(10, 0), pady=2)
+
+    # Modifier 3
+    tk.Label(modifier_frame, text="Modifier 3:").grid(row=2, column=0, sticky='w', pady=2)
+    mod3_var = tk.StringVar(value=app.shortcuts.get('modifier3', ''))
+    mod3_combo = ttk.Combobox(modifier_frame, textvariable=mod3_var, values=modifier_options, width=10)
+    mod3_combo.grid(row=2, column=1, padx=(10, 0), pady=2)
+
+    # Block input option
+    block_frame = tk.LabelFrame(main_frame, text="Hotkeys", padx=10, pady=10)
+    block_frame.pack(fill='x', pady=(0, 20))
+
+    block_var = tk.BooleanVar(value=app.shortcuts.get('block_input', True))
+    block_check = tk.Checkbutton(block_frame, 
+                               text="Block default key behavior when using shortcuts\n(Prevents typing numbers when shortcuts are pressed)",
+                               variable=block_var, wraplength=350)
+    block_check.pack(anchor='w')
+
+    target_var = tk.StringVar(value=app.shortcuts.get('hotkey_target', 'foreground'))
+    tk.Radiobutton(block_frame, text="Change the focused window", variable=target_var,
+                   value='foreground').pack(anchor='w')
+    tk.Radiobutton(block_frame, text="Change the window under the mouse", variable=target_var,
+                   value='cursor').pack(anchor='w')
+    scope_var = tk.BooleanVar(value=app.shortcuts.get('hotkey_scope', 'window') == 'app')
+    tk.Checkbutton(block_frame, text="Change every window of the same app", variable=scope_var).pack(anchor='w')
+
+    # Fade option
+    fade_frame = tk.LabelFrame(main_frame, text="Animation", padx=10, pady=10)
+    fade_frame.pack(fill='x', pady=(0, 20))
+
+    tk.Label(fade_frame, text="Fade duration (ms, 0 = off):").grid(row=0, column=0, sticky='w', pady=2)
+    fade_var = tk.IntVar(value=app.shortcuts.get('fade_duration', 0))
+    fade_spin = tk.Spinbox(fade_frame, from_=0, to=2000, increment=50, textvariable=fade_var, width=8)
+    fade_spin.grid(row=0, column=1, padx=(10, 0), pady=2)
+
+    # Auto-dim option
+    dim_frame = tk.LabelFrame(main_frame, text="Auto-Dim", padx=10, pady=10)
+    dim_frame.pack(fill='x', pady=(0, 20))
+
+    dim_var = tk.BooleanVar(value=app.shortcuts.get('auto_dim', False))
+    tk.Checkbutton(dim_frame, text="Dim every window except the focused one",
+                   variable=dim_var).grid(row=0, column=0, columnspan=2, sticky='w')
+    tk.Label(dim_frame, text="Dimmed opacity (1-255):").grid(row=1, column=0, sticky='w', pady=2)
+    dim_alpha_var = tk.IntVar(value=app.shortcuts.get('auto_dim_alpha', 160))
+    dim_spin = tk.Spinbox(dim_frame, from_=1, to=255, increment=5, textvariable=dim_alpha_var, width=8)
+    dim_spin.grid(row=1, column=1, padx=(10, 0), pady=2)
+
+    # Preset buttons
+    preset_frame = tk.LabelFrame(main_frame, text="Quick Presets", padx=10, pady=10)
+    preset_frame.pack(fill='x', pady=(0, 20))
+
+    def apply_preset(preset):
+        if preset == "safe":
+            mod1_var.set('ctrl')
+            mod2_var.set('shift')
+            mod3_var.set('alt')
+        elif preset == "simple":
+            mod1_var.set('ctrl')
+            mod2_var.set('alt')
+            mod3_var.set('')
+        elif preset == "minimal":
+            mod1_var.set('shift')
+            mod2_var.set('')
+            mod3_var.set('')
+
+    preset_btn_frame = tk.Frame(preset_frame)
+    preset_btn_frame.pack()
+
+    tk.Button(preset_btn_frame, text="Safe (Ctrl+Shift+Alt)", 
+             command=lambda: apply_preset("safe")).pack(side='left', padx=5)
+    tk.Button(preset_btn_frame, text="Simple (Ctrl+Alt)", 
+             command=lambda: apply_preset("simple")).pack(side='left', padx=5)
+    tk.Button(preset_btn_frame, text="Minimal (Shift)", 
+             command=lambda: apply_preset("minimal")).pack(side='left', padx=5)
+
+    # Buttons
+    button_frame = tk.Frame(main_frame)
+    button_frame.pack(pady=10)
+
+    def save_and_close():
+        try:
+            fade_duration = max(0, fade_var.get())
+        except tk.TclError:
+            fade_duration = 0
+        try:
+            dim_alpha = min(255, max(1, dim_alpha_var.get()))
+        except tk.TclError:
+            dim_alpha = app.shortcuts.get('auto_dim_alpha', 160)
+
+        # Save new settings
+        new_shortcuts = dict(app.shortcuts)
+        new_shortcuts.update({
+            'modifier1': mod1_var.get(),
+            'modifier2': mod2_var.get(),
+            'modifier3': mod3_var.get(),
+            'block_input': block_var.get(),
+            'fade_duration': fade_duration,
+            'auto_dim': dim_var.get(),
+            'auto_dim_alpha': dim_alpha,
+            'hotkey_target': target_var.get(),
+            'hotkey_scope': 'app' if scope_var.get() else 'window'
+        })
+
+        if app.save_settings(new_shortcuts):
+            messagebox.showinfo("Settings Saved", 
+                              f"New shortcuts: {app.get_shortcut_display()}\n\nChanges take effect immediately.",
+                              parent=window)
+        else:
+            messagebox.showerror("Error", "Failed to save settings.", parent=window)
+
+        window.destroy()
+
+    def reset_defaults():
+        result = messagebox.askyesno("Reset to Defaults", 
+                                   "Reset to default shortcuts (Ctrl+Shift+Alt+0-9)?", parent=window)
+        if result:
+            if app.save_settings(app.default_shortcuts.copy()):
+                messagebox.showinfo("Reset Complete", "Settings reset to defaults.", parent=window)
+                window.destroy()
+
+    tk.Button(button_frame, text="Save", command=save_and_close, width=10).pack(side='left', padx=5)
+    tk.Button(button_frame, text="Reset Defaults", command=reset_defaults, width=12).pack(side='left', padx=5)
+    tk.Button(button_frame, text="Cancel", command=window.destroy, width=10).pack(side='left', padx=5)
+
+    # Instructions
+    instructions = tk.Label(main_frame, 
+                          text="Leave modifier fields empty to disable them.\nExample: Only 'Modifier 1' = Ctrl+0-9",
+                          font=('Arial', 8), fg='gray')
+    instructions.pack(pady=(10, 0))
+
+    
+    return window
@@ -0,0 +1,146 @@
+"""Animated opacity fades driven by a single scheduler thread"""
+import logging
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+class Fade:
+    __slots__ = ('start_alpha', 'target', 'started', 'duration', 'last_alpha')
+
+    def __init__(self, start_alpha, target, started, duration):
+        self.start_alpha = start_alpha
+        self.target = target
+        self.started = started
+        self.duration = duration
+        self.last_alpha = start_alpha
+
+    def alpha_at(self, now):
+        """Return the alpha for a point in time and whether the fade is done"""
+        progress = (now - self.started) / self.duration if self.duration > 0 else 1.0
+        if progress >= 1.0:
+            return self.target, True
+        return round(self.start_alpha + (self.target - self.start_alpha) * progress), False
+
+
+class FadeScheduler:
+    """Runs every in-flight fade from one thread at a fixed frame rate
+
+    apply(hwnd, alpha, final) is called for each frame that changes a window's
+    alpha and must not block (it should hand off to the apply pipeline).
+    Frames are computed from the clock rather than counted, so when the
+    thread falls behind it skips the missed frames instead of replaying them.
+    The thread sleeps on a condition while no fade is running.
+    """
+
+    def __init__(self, apply, fps=60, clock=time.monotonic):
+        self.apply = apply
+        self.frame_interval = 1.0 / fps
+        self.clock = clock
+        self.fades = {}
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        self.frames = 0
+        self.dropped_frames = 0
+        # Seconds each frame started after its scheduled time
+        self.lateness = deque(maxlen=1000)
+
+    def fade(self, hwnd, start_alpha, target, duration):
+        """Fade a window to target over duration seconds
+
+        If the window is already fading, the new fade starts from wherever the
+        running one has got to instead of start_alpha.
+        """
+        with self.cond:
+            now = self.clock()
+            current = self.fades.get(hwnd)
+            if current is not None:
+                start_alpha = current.last_alpha
+            self.fades[hwnd] = Fade(start_alpha, target, now, duration)
+            self._ensure_thread()
+            self.cond.notify()
+
+    def cancel(self, hwnd):
+        """Stop a window's fade where it is"""
+        with self.cond:
+            return self.fades.pop(hwnd, None) is not None
+
+    def current_alpha(self, hwnd):
+        """Return the alpha last applied by a running fade, or None"""
+        with self.cond:
+            fade = self.fades.get(hwnd)
+            return fade.last_alpha if fade is not None else None
+
+    def active(self):
+        with self.cond:
+            return len(self.fades)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.fades.clear()
+            self.cond.notify_all()
+
+    def stats(self):
+        """Return frame counters and lateness figures in milliseconds"""
+        with self.cond:
+            lateness = sorted(self.lateness)
+            return {
+                'active': len(self.fades),
+                'frames': self.frames,
+                'dropped_frames': self.dropped_frames,
+                'median_late_ms': round(lateness[len(lateness) // 2] * 1000, 3) if lateness else 0,
+                'max_late_ms': round(lateness[-1] * 1000, 3) if lateness else 0,
+            }
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.running = True
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        next_frame = self.clock()
+        while True:
+            with self.cond:
+                while self.running and not self.fades:
+                    self.cond.wait()
+                    next_frame = self.clock()
+                if not self.running:
+                    return
+
+                now = self.clock()
+                late = now - next_frame
+                if late >= self.frame_interval:
+                    # Behind schedule: skip the frames we missed
+                    missed = int(late / self.frame_interval)
+                    self.dropped_frames += missed
+                    next_frame += missed * self.frame_interval
+                    late = now - next_frame
+                self.lateness.append(max(0.0, late))
+                self.frames += 1
+
+                updates = []
+                for hwnd, fade in list(self.fades.items()):
+                    alpha, done = fade.alpha_at(now)
+                    if done:
+                        del self.fades[hwnd]
+                    if alpha != fade.last_alpha or done:
+                        fade.last_alpha = alpha
+                        updates.append((hwnd, alpha, done))
+
+            for hwnd, alpha, done in updates:
+                try:
+                    self.apply(hwnd, alpha, done)
+                except Exception as e:
+                    log.error("Fade error: %s", e)
+
+            next_frame += self.frame_interval
+            with self.cond:
+                delay = next_frame - self.clock()
+                if delay > 0 and self.running:
+                    self.cond.wait(delay)
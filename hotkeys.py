@@ -0,0 +1,420 @@
+"""Event-driven hotkey handling for Transparent Windows"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+log = logging.getLogger(__name__)
+
+DIGIT_KEYS = '0123456789'
+
+# Names reported by the keyboard module that mean the same modifier
+MODIFIER_ALIASES = {
+    'control': 'ctrl',
+    'windows': 'win',
+    'command': 'win',
+    'alt gr': 'alt',
+}
+
+# Always modifiers, so Ctrl+Shift+5 never fires a Ctrl+5 binding
+STANDARD_MODIFIERS = ('ctrl', 'shift', 'alt', 'win')
+
+ACTIONS = ('level', 'alpha', 'step', 'level_step')
+BINDING_TARGETS = ('window', 'app')
+
+
+def normalize_key(name):
+    """Map a key event name onto the modifier names used in settings"""
+    if not name:
+        return ''
+    name = name.lower().strip()
+    for prefix in ('left ', 'right '):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+    return MODIFIER_ALIASES.get(name, name)
+
+
+class KeymapError(ValueError):
+    """Raised for a key binding that cannot be compiled"""
+
+
+class Binding(namedtuple('Binding', 'keys action value target')):
+    """One key binding
+
+    keys is a chord such as "ctrl+alt+t, 5": strokes separated by commas,
+    each stroke being modifiers and a key joined by "+". action is 'level'
+    (value 0-9, as with the digit shortcuts), 'alpha' (value 1-255), 'step'
+    (value added to the current alpha) or 'level_step' (value added to the
+    window's current level). target is 'window' for the
+    hotkey target window or 'app' for every window of its process.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a binding from its settings form"""
+        try:
+            return cls(str(data['keys']), data.get('action', 'level'), data['value'], data.get('target', 'window'))
+        except (KeyError, TypeError, AttributeError):
+            raise KeymapError(f"invalid binding {data!r}")
+
+    @property
+    def repeats(self):
+        """Whether holding the keys keeps firing; only relative steps do"""
+        return self.action in ('step', 'level_step')
+
+
+def parse_chord(text):
+    """Parse "ctrl+alt+t, 5" into [(modifiers, key), ...]"""
+    strokes = []
+    for part in text.split(','):
+        names = [normalize_key(name) for name in part.split('+')]
+        if '' in names:
+            raise KeymapError(f"invalid key chord {text!r}")
+        strokes.append((names[:-1], names[-1]))
+    return strokes
+
+
+def check_binding(binding):
+    if binding.action not in ACTIONS:
+        raise KeymapError(f"action must be one of {', '.join(ACTIONS)}, got {binding.action!r}")
+    if binding.target not in BINDING_TARGETS:
+        raise KeymapError(f"target must be one of {', '.join(BINDING_TARGETS)}, got {binding.target!r}")
+    value = binding.value
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise KeymapError(f"value of {binding.keys!r} must be an integer")
+    low, high = {'level': (0, 9), 'alpha': (1, 255), 'step': (-254, 254), 'level_step': (-9, 9)}[binding.action]
+    if binding.repeats and value == 0:
+        raise KeymapError(f"{binding.action} value of {binding.keys!r} must not be 0")
+    if not low <= value <= high:
+        raise KeymapError(f"{binding.action} value of {binding.keys!r} must be between {low} and {high}")
+
+
+class Keymap:
+    """Key bindings compiled into a trie of strokes
+
+    A stroke is (modifier mask, key). Every key used as a modifier has one
+    bit, so the engine keeps the held modifiers as an int and each key event
+    is a single dict lookup in the current trie node, however many bindings
+    there are. A node maps a stroke to a Binding, or to the next node of a
+    multi-stroke sequence. A later binding for the same keys replaces an
+    earlier one.
+    """
+
+    def __init__(self, bindings=()):
+        self.modifier_bits = {name: 1 << i for i, name in enumerate(STANDARD_MODIFIERS)}
+        self.root = {}
+        # Every key that ends a stroke
+        self.keys = set()
+        self.bindings = 0
+        for binding in bindings:
+            self.add(binding)
+
+    def __len__(self):
+        return self.bindings
+
+    def mask(self, modifiers):
+        """Bitmask of the given modifier names, giving new ones a bit"""
+        mask = 0
+        for name in modifiers:
+            if name not in self.modifier_bits:
+                if name in self.keys:
+                    raise KeymapError(f"{name!r} is used both as a key and as a modifier")
+                self.modifier_bits[name] = 1 << len(self.modifier_bits)
+            mask |= self.modifier_bits[name]
+        return mask
+
+    def held_mask(self, pressed):
+        """Bitmask of the modifiers among a set of pressed key names"""
+        mask = 0
+        for name in pressed:
+            mask |= self.modifier_bits.get(name, 0)
+        return mask
+
+    def add(self, binding):
+        check_binding(binding)
+        strokes = parse_chord(binding.keys)
+        node = self.root
+        for i, (modifiers, key) in enumerate(strokes):
+            if key in self.modifier_bits:
+                raise KeymapError(f"{binding.keys!r} ends a stroke with the modifier {key!r}")
+            stroke = (self.mask(modifiers), key)
+            self.keys.add(key)
+            found = node.get(stroke)
+            if i == len(strokes) - 1:
+                if isinstance(found, dict):
+                    raise KeymapError(f"{binding.keys!r} is the start of a longer binding")
+                if found is None:
+                    self.bindings += 1
+                node[stroke] = binding
+            elif found is None:
+                node[stroke] = node = {}
+            elif isinstance(found, dict):
+                node = found
+            else:
+                raise KeymapError(f"{binding.keys!r} starts with the binding {found.keys!r}")
+
+
+class HotkeyEngine:
+    """Tracks key state from hook events and fires the bindings of a Keymap
+
+    The engine does no polling: it only runs when a key event arrives, and
+    decides in the same call whether the key should be swallowed. Each event
+    is a constant amount of work: a modifier updates the held mask, any other
+    key advances one step through the keymap trie. A sequence that is not
+    continued within sequence_timeout starts over.
+
+    Auto-repeat of a held key fires nothing, except for step bindings, which
+    fire on every repeat; the app adds those up into one target alpha per
+    window and writes it through a RepeatThrottle, so a held key never
+    builds up a stream of window calls.
+
+    Shortcut settings come from a precompiled ShortcutMatcher whose .keymap
+    holds the bindings; assigning a new one to .matcher takes effect from the
+    next key event.
+
+    A key-up can be missed, e.g. across Ctrl+Alt+Del, Win+L or a secure
+    desktop, which would leave a modifier held forever. is_pressed(name),
+    if given, reports the physical key state (None if it cannot tell): it
+    is checked for the held modifiers whenever a binding matches, so a
+    stale modifier never turns ordinary typing into a hotkey. It must not
+    come from the hook events themselves; keyboard.is_pressed does, and
+    misses the same key-up.
+    """
+
+    def __init__(self, matcher, on_trigger, scan_codes=None, sequence_timeout=1.5, is_pressed=None):
+        self.matcher = matcher
+        self.on_trigger = on_trigger
+        self.is_pressed = is_pressed
+        # Scan code -> key, so Shift+1 is still seen as "1" and not "!"
+        self.scan_codes = scan_codes or {}
+        self.sequence_timeout = sequence_timeout
+        self.pressed = set()
+        self.keymap = None
+        self.mask = 0
+        self.node = None
+        self.node_time = 0.0
+        # Held non-modifier key -> the binding it fired, or None
+        self.held = {}
+        self.suppressed = set()
+        self.lock = threading.Lock()
+
+    def reset(self):
+        """Forget all pressed keys (e.g. after the session was locked)"""
+        with self.lock:
+            self.pressed.clear()
+            self.held.clear()
+            self.suppressed.clear()
+            self.mask = 0
+            self.node = None
+
+    def key_for(self, name, scan_code=None):
+        """Return the key name an event refers to"""
+        if scan_code is not None and scan_code in self.scan_codes:
+            return self.scan_codes[scan_code]
+        return normalize_key(name)
+
+    def handle_event(self, name, event_type, scan_code=None):
+        """Process one key event, returns False if the event should be suppressed"""
+        key = self.key_for(name, scan_code)
+        matcher = self.matcher
+        keymap = matcher.keymap
+        trigger = None
+
+        with self.lock:
+            if keymap is not self.keymap:
+                # New settings: modifier bits may have moved
+                self.keymap = keymap
+                self.mask = keymap.held_mask(self.pressed)
+                self.node = None
+
+            bit = keymap.modifier_bits.get(key)
+            if bit is not None:
+                if event_type == 'down':
+                    self.pressed.add(key)
+                    self.mask |= bit
+                else:
+                    self.pressed.discard(key)
+                    self.mask &= ~bit
+                return True
+
+            if event_type != 'down':
+                self.held.pop(key, None)
+                if key in self.suppressed:
+                    self.suppressed.discard(key)
+                    return False
+                return True
+
+            if key in self.held:
+                # Auto-repeat of a key that is already held down
+                binding = self.held[key]
+                if binding is None or not binding.repeats:
+                    return key not in self.suppressed
+                trigger = binding
+            else:
+                root = keymap.root
+                node = self.node or root
+                now = time.monotonic()
+                if node is not root and now - self.node_time > self.sequence_timeout:
+                    node = root
+                found = self._lookup(node, key)
+                if found is not None and self.mask and self._drop_released(keymap):
+                    found = self._lookup(node, key)
+                self.node = None
+                if found is None:
+                    self.held[key] = None
+                    return True
+                if isinstance(found, dict):
+                    self.node, self.node_time = found, now
+                    self.held[key] = None
+                else:
+                    self.held[key] = trigger = found
+                if matcher.block_input:
+                    self.suppressed.add(key)
+                if trigger is None:
+                    return not matcher.block_input
+
+        try:
+            self.on_trigger(trigger)
+        except Exception as e:
+            log.exception("Hotkey handler error: %s", e)
+
+        return not matcher.block_input
+
+    def _lookup(self, node, key):
+        """Find the binding or next node for key with the held modifiers (lock held)"""
+        stroke = (self.mask, key)
+        found = node.get(stroke)
+        if found is None and node is not self.keymap.root:
+            # The sequence was abandoned, but this key may start another
+            found = self.keymap.root.get(stroke)
+        return found
+
+    def _drop_released(self, keymap):
+        """Forget held modifiers whose key-up was missed, returns whether there were any (lock held)"""
+        if self.is_pressed is None:
+            return False
+        released = []
+        for name in self.pressed:
+            try:
+                if self.is_pressed(name) is False:
+                    released.append(name)
+            except Exception:
+                pass
+        if not released:
+            return False
+        log.debug("Modifiers released without a key-up event: %s", ", ".join(released))
+        self.pressed.difference_update(released)
+        self.mask = keymap.held_mask(self.pressed)
+        return True
+
+    def on_key(self, event):
+        """Callback for keyboard.hook"""
+        return self.handle_event(event.name, event.event_type, event.scan_code)
+
+
+class RepeatThrottle:
+    """Merges the auto-repeats of held step keys into one write per window per interval
+
+    The first step for a window runs at once. Steps that follow within
+    interval only replace the window's pending action, which runs when the
+    interval ends, and so on until the key is released. A held key thus
+    writes at most once per interval, however fast the keyboard repeats
+    and however quickly the window takes the writes. One thread ends every
+    window's intervals and sleeps on a condition while none is running.
+    """
+
+    def __init__(self, interval=0.05, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        # hwnd -> pending action, or None while throttled with nothing pending
+        self.pending = {}
+        # hwnd -> when its interval ends, for every throttled window
+        self.due = {}
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.merged = 0
+
+    def submit(self, hwnd, action):
+        """Run action() now, or in place of any action still pending for hwnd"""
+        with self.cond:
+            if hwnd in self.pending:
+                if self.pending[hwnd] is not None:
+                    self.merged += 1
+                self.pending[hwnd] = action
+                return
+            self.pending[hwnd] = None
+            self.due[hwnd] = self.clock() + self.interval
+            self._ensure_thread()
+            self.cond.notify()
+        self._call(action)
+
+    def cancel(self, hwnd):
+        """Drop a window's pending action, e.g. when a level or alpha replaces it"""
+        with self.cond:
+            if self.pending.get(hwnd) is not None:
+                self.pending[hwnd] = None
+
+    def flush(self):
+        """Run every pending action now"""
+        with self.cond:
+            actions = [(hwnd, action) for hwnd, action in self.pending.items() if action is not None]
+            for hwnd, _ in actions:
+                self.pending[hwnd] = None
+        for hwnd, action in actions:
+            self._call(action)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.pending.clear()
+            self.due.clear()
+            self.cond.notify_all()
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.running = True
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and not self.due:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                now = self.clock()
+                first = min(self.due.values())
+                if first > now:
+                    self.cond.wait(first - now)
+                    continue
+
+                actions = []
+                for hwnd, due in list(self.due.items()):
+                    if due > now:
+                        continue
+                    action = self.pending.pop(hwnd)
+                    if action is None:
+                        # Nothing came in during the interval: stop throttling
+                        del self.due[hwnd]
+                    else:
+                        self.pending[hwnd] = None
+                        self.due[hwnd] = now + self.interval
+                        actions.append(action)
+
+            for action in actions:
+                self._call(action)
+
+    @staticmethod
+    def _call(action):
+        try:
+            action()
+        except Exception as e:
+            log.exception("Hotkey action error: %s", e)
+
+    def stats(self):
+        with self.cond:
+            return {'throttled_windows': len(self.pending), 'merged': self.merged}
@@ -0,0 +1,225 @@
+"""Logging setup and lightweight hot-path metrics"""
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from bisect import bisect_left
+
+log = logging.getLogger(__name__)
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per log line"""
+
+    def format(self, record):
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def setup_logging(level=logging.INFO, json_lines=False, stream=None):
+    """Route all logging through a queue so callers never wait on console I/O
+
+    A background QueueListener does the actual writing; stop_logging() flushes it.
+    """
+    global _listener
+    stop_logging()
+
+    handler = logging.StreamHandler(stream)
+    if json_lines:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(message)s", "%H:%M:%S"))
+
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(records)]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Write out any queued log records and stop the background writer"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class Histogram:
+    """Latency histogram with fixed exponential buckets from 10 us to ~10 s"""
+
+    BOUNDS = tuple(1e-5 * 2 ** i for i in range(21))
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (0-100)"""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.BOUNDS[i] if i < len(self.BOUNDS) else self.max
+        return self.max
+
+    def snapshot(self):
+        def ms(value):
+            return None if value is None else round(value * 1000, 3)
+
+        return {
+            'count': self.count,
+            'mean_ms': ms(self.total / self.count) if self.count else None,
+            'min_ms': ms(self.min),
+            'p50_ms': ms(self.percentile(50)),
+            'p95_ms': ms(self.percentile(95)),
+            'p99_ms': ms(self.percentile(99)),
+            'max_ms': ms(self.max),
+            'buckets': {f"le_{ms(bound)}ms": count
+                        for bound, count in zip(self.BOUNDS + (float('inf'),), self.counts) if count},
+        }
+
+
+class Metrics:
+    """Counters, latency histograms and gauges for the hot paths
+
+    Disabled by default. Call sites check .enabled before reading the clock,
+    so a disabled instance costs one attribute lookup per event.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def gauge(self, name, func):
+        """Register func() to be sampled into every snapshot"""
+        self.gauges[name] = func
+
+    def snapshot(self):
+        with self.lock:
+            snapshot = {
+                'time': round(time.time(), 3),
+                'uptime_s': round(time.time() - self.started, 1),
+                'counters': dict(self.counters),
+                'histograms': {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+            }
+        gauges = {}
+        for name, func in self.gauges.items():
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                gauges[name] = f"error: {e}"
+        snapshot['gauges'] = gauges
+        return snapshot
+
+
+class MetricsExporter:
+    """Publishes metrics snapshots for --metrics
+
+    A target that is a port number serves the latest snapshot as JSON over
+    HTTP on 127.0.0.1; anything else is a file path rewritten every interval.
+    """
+
+    def __init__(self, metrics, target, interval=10.0):
+        self.metrics = metrics
+        self.target = str(target)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.server = None
+
+    def start(self):
+        if self.target.isdigit():
+            self._serve(int(self.target))
+        else:
+            threading.Thread(target=self._write_periodically, daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.server:
+            self.server.shutdown()
+
+    def write_snapshot(self):
+        from settings import atomic_write_json
+        atomic_write_json(self.target, self.metrics.snapshot())
+
+    def _write_periodically(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                log.warning("Could not write metrics to %s: %s", self.target, e)
+        try:
+            self.write_snapshot()
+        except Exception as e:
+            log.warning("Could not write metrics to %s: %s", self.target, e)
+
+    def _serve(self, port):
+        # Imported here to keep http.server off the startup path
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(metrics.snapshot(), indent=2).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                log.debug("metrics request: " + format, *args)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        log.info("Serving metrics on http://127.0.0.1:%d/", port)
@@ -0,0 +1,218 @@
+"""Crash-safe journal of the windows whose opacity we changed"""
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+def load_journal(path):
+    """Replay a journal, returns ({hwnd: entry}, last_seq, skipped_lines)
+
+    An entry holds the window's original state, pid, class and last alpha.
+    A line cut short by a crash mid-write is skipped, as are corrupt lines.
+    """
+    entries = {}
+    last_seq = 0
+    skipped = 0
+    try:
+        f = open(path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return entries, last_seq, skipped
+
+    with f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                op = record['op']
+            except (ValueError, KeyError, TypeError):
+                skipped += 1
+                continue
+            last_seq = max(last_seq, record.get('seq', 0))
+            hwnd = record.get('hwnd')
+            if op == 'remember':
+                entries[hwnd] = {key: record.get(key) for key in ('original', 'pid', 'class', 'alpha')}
+            elif op == 'set' and hwnd in entries:
+                entries[hwnd]['alpha'] = record['alpha']
+            elif op == 'forget':
+                entries.pop(hwnd, None)
+            elif op == 'clear':
+                entries.clear()
+    return entries, last_seq, skipped
+
+
+class OpacityJournal:
+    """Append-only log of opacity changes with group-committed fsync
+
+    Recording a change only appends to an in-memory list; a writer thread
+    collects everything recorded within commit_interval and writes it with
+    a single fsync, so callers never wait on the disk. Once compact_every
+    records have been written the file is replaced (atomically) by one
+    record per window that is still changed.
+    """
+
+    def __init__(self, path, commit_interval=0.05, compact_every=2000):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.compact_every = compact_every
+        self.live = {}
+        self.pending = []
+        self.seq = 0
+        self.committed_seq = 0
+        self.written_since_compact = 0
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.file = None
+
+        self.records = 0
+        self.commits = 0
+        self.compactions = 0
+
+    def open(self, entries=None):
+        """Start a fresh journal holding entries ({hwnd: entry}) and start the writer"""
+        with self.cond:
+            self.live = {hwnd: dict(entry) for hwnd, entry in (entries or {}).items()}
+            lines = self._snapshot()
+        self._write_compacted(lines)
+        with self.cond:
+            self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def remember(self, hwnd, original, pid=None, window_class=None):
+        """Record a window's original state before we first change it"""
+        self._append({'op': 'remember', 'hwnd': hwnd, 'original': original, 'pid': pid, 'class': window_class})
+
+    def set(self, hwnd, alpha):
+        self._append({'op': 'set', 'hwnd': hwnd, 'alpha': alpha})
+
+    def forget(self, hwnd):
+        """Record that a window was restored or destroyed"""
+        self._append({'op': 'forget', 'hwnd': hwnd})
+
+    def clear(self):
+        self._append({'op': 'clear'})
+
+    def _append(self, record):
+        op = record['op']
+        hwnd = record.get('hwnd')
+        with self.cond:
+            if op == 'remember':
+                self.live[hwnd] = {'original': record['original'], 'pid': record['pid'],
+                                   'class': record['class'], 'alpha': None}
+            elif op == 'clear':
+                self.live.clear()
+            elif hwnd not in self.live:
+                # Nothing on record for this window, nothing to write
+                return
+            elif op == 'set':
+                self.live[hwnd]['alpha'] = record['alpha']
+            else:
+                del self.live[hwnd]
+            self.seq += 1
+            record['seq'] = self.seq
+            self.pending.append(json.dumps(record))
+            self.records += 1
+            self.cond.notify()
+
+    def flush(self, timeout=5.0):
+        """Wait until everything recorded so far is on disk"""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            target = self.seq
+            self.cond.notify()
+            while self.committed_seq < target and self.running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+            return self.committed_seq >= target
+
+    def close(self):
+        """Write out pending records and stop the writer"""
+        self.flush()
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(2)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def stats(self):
+        with self.cond:
+            return {
+                'windows': len(self.live),
+                'records': self.records,
+                'commits': self.commits,
+                'compactions': self.compactions,
+                'pending': len(self.pending),
+            }
+
+    def _snapshot(self):
+        """One record per live window (lock held)
+
+        Starts with a clear record, so the sequence number survives
+        compaction even when no window is changed.
+        """
+        lines = [json.dumps({'op': 'clear', 'seq': self.seq})]
+        lines.extend(json.dumps({'op': 'remember', 'seq': self.seq, 'hwnd': hwnd, **entry})
+                     for hwnd, entry in self.live.items())
+        return lines
+
+    def _write_compacted(self, lines):
+        """Atomically replace the file with lines and reopen it for appending"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        directory = os.path.dirname(os.path.abspath(self.path))
+        temp_path = os.path.join(directory, f".{os.path.basename(self.path)}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(line + '\n' for line in lines))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and not self.pending:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+            # Let more records arrive so they share one fsync
+            time.sleep(self.commit_interval)
+
+            with self.cond:
+                batch = self.pending
+                self.pending = []
+                seq = self.seq
+                snapshot = None
+                if self.written_since_compact + len(batch) >= self.compact_every:
+                    # The snapshot already includes the batch
+                    snapshot = self._snapshot()
+
+            try:
+                if snapshot is not None:
+                    self._write_compacted(snapshot)
+                else:
+                    self.file.write(''.join(line + '\n' for line in batch))
+                    self.file.flush()
+                    os.fsync(self.file.fileno())
+            except (OSError, ValueError) as e:
+                log.error("Could not write opacity journal: %s", e)
+
+            with self.cond:
+                if snapshot is not None:
+                    self.written_since_compact = 0
+                    self.compactions += 1
+                else:
+                    self.written_since_compact += len(batch)
+                self.committed_seq = max(self.committed_seq, seq)
+                self.commits += 1
+                self.cond.notify_all()
@@ -0,0 +1,183 @@
+"""Non-blocking apply pipeline for window operations"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ApplyPipeline:
+    """Runs per-window operations on a small pool of worker threads
+
+    submit() never blocks: it queues the operation and returns. Pending work
+    is coalesced per hwnd, so if a window receives several operations before
+    a worker gets to it only the latest one runs. Operations on one window
+    never run concurrently.
+
+    A Win32 call into a hung application can block indefinitely and a Python
+    thread cannot be cancelled, so an operation that exceeds the timeout marks
+    its window as hung: further operations for it are dropped until the call
+    returns, and a replacement worker is started so the rest of the desktop
+    keeps being served.
+    """
+
+    def __init__(self, workers=2, max_pending=256, timeout=1.0, max_hung=8, clock=time.monotonic):
+        self.max_workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_hung = max_hung
+        self.clock = clock
+
+        self.pending = OrderedDict()
+        self.in_flight = {}
+        self.hung = set()
+        self.cond = threading.Condition()
+        self.running = False
+        self.worker_count = 0
+        self.stuck_count = 0
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+
+    def start(self):
+        """Start the worker threads"""
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+            for _ in range(self.max_workers):
+                self._spawn_worker()
+
+    def stop(self):
+        """Ask the workers to exit once they are idle"""
+        with self.cond:
+            self.running = False
+            self.pending.clear()
+            self.cond.notify_all()
+
+    def submit(self, hwnd, operation, block=False):
+        """Queue operation() to run for a window, returns False if it was dropped
+
+        With block=True a full queue is waited on instead of dropping the
+        operation. Never use that from the hotkey path.
+        """
+        with self.cond:
+            self._check_timeouts()
+            self.submitted += 1
+
+            while block and self.running and len(self.pending) >= self.max_pending and hwnd not in self.pending:
+                self.cond.wait(0.05)
+                self._check_timeouts()
+
+            if hwnd in self.hung:
+                self.dropped += 1
+                return False
+            if hwnd in self.pending:
+                self.pending[hwnd] = operation
+                self.coalesced += 1
+                return True
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+
+            self.pending[hwnd] = operation
+            self.cond.notify()
+            return True
+
+    def wait_idle(self, timeout=None):
+        """Wait until nothing is queued or running (hung windows excepted)"""
+        deadline = None if timeout is None else self.clock() + timeout
+        with self.cond:
+            while self.pending or len(self.in_flight) > len(self.hung):
+                self._check_timeouts()
+                remaining = 0.05
+                if deadline is not None:
+                    remaining = min(remaining, deadline - self.clock())
+                    if remaining <= 0:
+                        return False
+                self.cond.wait(remaining)
+            return True
+
+    def stats(self):
+        """Return queue depth and counters"""
+        with self.cond:
+            self._check_timeouts()
+            return {
+                'queue_depth': len(self.pending),
+                'in_flight': len(self.in_flight),
+                'hung': len(self.hung),
+                'workers': self.worker_count,
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'completed': self.completed,
+                'failed': self.failed,
+                'timeouts': self.timeouts,
+            }
+
+    def _spawn_worker(self):
+        self.worker_count += 1
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def _check_timeouts(self):
+        """Mark windows whose operation has run too long as hung (lock held)"""
+        if not self.in_flight:
+            return
+        now = self.clock()
+        for hwnd, started in self.in_flight.items():
+            if hwnd in self.hung or now - started <= self.timeout:
+                continue
+            self.hung.add(hwnd)
+            self.timeouts += 1
+            self.stuck_count += 1
+            dropped = self.pending.pop(hwnd, None)
+            if dropped is not None:
+                self.dropped += 1
+            if self.running and self.stuck_count <= self.max_hung:
+                self._spawn_worker()
+
+    def _next_operation(self):
+        """Pop the oldest pending operation whose window is not busy (lock held)"""
+        for hwnd in self.pending:
+            if hwnd not in self.in_flight:
+                return hwnd, self.pending.pop(hwnd)
+        return None, None
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while True:
+                    if not self.running:
+                        self.worker_count -= 1
+                        return
+                    hwnd, operation = self._next_operation()
+                    if operation is not None:
+                        break
+                    # Only wake up periodically while something could time out
+                    self.cond.wait(self.timeout if self.in_flight else None)
+                    self._check_timeouts()
+                self.in_flight[hwnd] = self.clock()
+
+            try:
+                operation()
+                failed = False
+            except Exception:
+                failed = True
+
+            with self.cond:
+                self.in_flight.pop(hwnd, None)
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+                if hwnd in self.hung:
+                    self.hung.discard(hwnd)
+                    self.stuck_count -= 1
+                    # A replacement took over while we were stuck, retire
+                    if self.worker_count - self.stuck_count > self.max_workers:
+                        self.worker_count -= 1
+                        self.cond.notify_all()
+                        return
+                self.cond.notify_all()
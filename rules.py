@@ -0,0 +1,255 @@
+"""Per-application opacity rules"""
+import json
+import logging
+import os
+import re
+
+log = logging.getLogger(__name__)
+
+
+REGEX_META = set('.^$*+?{}[]\\|()')
+
+
+def required_literal(pattern):
+    """Return the longest literal run every match of a regex must contain
+
+    Deliberately conservative: patterns with alternation give up, and only
+    text outside groups, classes and escapes is considered. Returns '' when
+    nothing can be guaranteed.
+    """
+    if '|' in pattern:
+        return ''
+    runs = []
+    run = []
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            runs.append(''.join(run))
+            run = []
+            i += 2
+            continue
+        if char == '[':
+            runs.append(''.join(run))
+            run = []
+            i += 1
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+            i += 1
+            continue
+        if char in '?*{' and run:
+            # The previous character is optional (or repeated an unknown number of times)
+            run.pop()
+        if char == '{':
+            runs.append(''.join(run))
+            run = []
+            close = pattern.find('}', i)
+            i = close + 1 if close != -1 else len(pattern)
+            continue
+        if char in REGEX_META:
+            runs.append(''.join(run))
+            run = []
+            if char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+        elif depth == 0:
+            run.append(char)
+        i += 1
+    runs.append(''.join(run))
+    return max(runs, key=len).lower()
+
+
+class OpacityRule:
+    """Opacity to apply to windows matching an exe name, window class and/or title
+
+    Every criterion that is set must match. The title is a regular expression
+    searched case-insensitively, exe and class compare case-insensitively.
+    """
+
+    __slots__ = ('index', 'exe', 'window_class', 'title', 'title_re', 'alpha')
+
+    def __init__(self, index, alpha, exe=None, window_class=None, title=None):
+        if not exe and not window_class and not title:
+            raise ValueError("rule needs at least one of exe, class or title")
+        if not 1 <= int(alpha) <= 255:
+            raise ValueError(f"alpha must be between 1 and 255, got {alpha}")
+        self.index = index
+        self.alpha = int(alpha)
+        self.exe = exe.lower() if exe else None
+        self.window_class = window_class.lower() if window_class else None
+        self.title = title or None
+        self.title_re = re.compile(title, re.IGNORECASE) if title else None
+
+    def matches(self, exe, window_class, title):
+        if self.exe is not None and self.exe != exe:
+            return False
+        if self.window_class is not None and self.window_class != window_class:
+            return False
+        if self.title_re is not None and not self.title_re.search(title):
+            return False
+        return True
+
+
+class RuleMatcher:
+    """Finds the first rule (in file order) that matches a window
+
+    Rules are indexed instead of scanned: rules with an exe are looked up in a
+    dict by exe, rules with only a class in a dict by class. Title-only rules
+    are indexed by one trigram of a literal their pattern requires, so an
+    event only checks the few rules sharing a trigram with its title. Title
+    patterns without a usable literal are folded into one compiled alternation
+    whose groups are tried in order, so the first group that matches is the
+    earliest rule. Patterns that cannot share that alternation (inline flags,
+    their own groups or backreferences) are checked one by one.
+    """
+
+    GRAM = 3
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        self.by_exe = {}
+        self.by_class = {}
+        self.by_gram = {}
+        title_rules = []
+
+        for rule in self.rules:
+            if rule.exe is not None:
+                self.by_exe.setdefault(rule.exe, []).append(rule)
+            elif rule.window_class is not None:
+                self.by_class.setdefault(rule.window_class, []).append(rule)
+            elif not self._index_title(rule):
+                title_rules.append(rule)
+
+        self.scan_rules = [rule for rule in title_rules if not self._combinable(rule)]
+        combined = [rule for rule in title_rules if rule not in self.scan_rules]
+        self.title_rules = {f"_rule{rule.index}": rule for rule in combined}
+        self.title_re = None
+        if combined:
+            try:
+                self.title_re = re.compile("|".join(self._alternative(rule) for rule in combined),
+                                           re.IGNORECASE | re.DOTALL)
+            except re.error as e:
+                log.warning("Checking title rules one by one: %s", e)
+                self.title_rules = {}
+                self.scan_rules = title_rules
+
+    def __len__(self):
+        return len(self.rules)
+
+    @property
+    def needs_exe(self):
+        """Whether looking up a window's exe name can make a difference"""
+        return bool(self.by_exe)
+
+    @staticmethod
+    def _alternative(rule):
+        """The named group a title-only rule gets in the combined alternation"""
+        return f"(?P<_rule{rule.index}>.*?(?:{rule.title}))"
+
+    @classmethod
+    def _combinable(cls, rule):
+        """Whether a title pattern means the same inside the combined alternation
+
+        Groups would be renumbered (breaking backreferences) or clash by name,
+        and inline flags are only allowed at the start of a whole expression.
+        """
+        if rule.title_re.groups:
+            return False
+        try:
+            re.compile(cls._alternative(rule), re.IGNORECASE | re.DOTALL)
+        except re.error:
+            return False
+        return True
+
+    def _index_title(self, rule):
+        """File a title-only rule under its least shared trigram, if it has one"""
+        literal = required_literal(rule.title)
+        if len(literal) < self.GRAM:
+            return False
+        grams = {literal[i:i + self.GRAM] for i in range(len(literal) - self.GRAM + 1)}
+        gram = min(sorted(grams), key=lambda g: len(self.by_gram.get(g, ())))
+        self.by_gram.setdefault(gram, []).append(rule)
+        return True
+
+    def match(self, exe, window_class, title):
+        """Return the earliest matching rule for a window, or None"""
+        exe = (exe or '').lower()
+        window_class = (window_class or '').lower()
+        title = title or ''
+        best = None
+
+        for candidates in (self.by_exe.get(exe), self.by_class.get(window_class)):
+            if candidates:
+                best = self._first_match(candidates, best, exe, window_class, title)
+
+        if self.by_gram:
+            lowered = title.lower()
+            seen = set()
+            for i in range(len(lowered) - self.GRAM + 1):
+                gram = lowered[i:i + self.GRAM]
+                if gram in seen:
+                    continue
+                seen.add(gram)
+                candidates = self.by_gram.get(gram)
+                if candidates:
+                    best = self._first_match(candidates, best, exe, window_class, title)
+
+        if self.scan_rules:
+            best = self._first_match(self.scan_rules, best, exe, window_class, title)
+
+        if self.title_re is not None and (best is None or best.index > 0):
+            m = self.title_re.match(title)
+            if m is not None:
+                rule = self.title_rules[m.lastgroup]
+                if best is None or rule.index < best.index:
+                    best = rule
+
+        return best
+
+    @staticmethod
+    def _first_match(candidates, best, exe, window_class, title):
+        """Return the earliest rule in candidates (sorted) that beats best"""
+        for rule in candidates:
+            if best is not None and rule.index > best.index:
+                break
+            if rule.matches(exe, window_class, title):
+                return rule
+        return best
+
+
+def load_rules(path):
+    """Load rules from a JSON file, returns a RuleMatcher (empty if missing)
+
+    The file looks like:
+        {"rules": [{"exe": "code.exe", "alpha": 220},
+                   {"class": "Notepad", "alpha": 200},
+                   {"title": "YouTube", "alpha": 128}]}
+    """
+    if not os.path.exists(path):
+        return RuleMatcher()
+
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except Exception as e:
+        log.error("Error loading rules: %s", e)
+        return RuleMatcher()
+
+    rules = []
+    for entry in data.get('rules', []):
+        try:
+            rules.append(OpacityRule(len(rules), entry['alpha'], exe=entry.get('exe'),
+                                     window_class=entry.get('class'), title=entry.get('title')))
+        except (KeyError, TypeError, ValueError, re.error) as e:
+            log.warning("Skipping invalid rule %s: %s", entry, e)
+    try:
+        return RuleMatcher(rules)
+    except re.error as e:
+        log.error("Skipping title rules that cannot be compiled: %s", e)
+        return RuleMatcher([rule for rule in rules if rule.exe or rule.window_class])
@@ -0,0 +1,221 @@
+"""Settings schema, atomic storage and live reload"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from curves import CurveError, build_levels
+from hotkeys import DIGIT_KEYS, Binding, Keymap, KeymapError, normalize_key
+
+log = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+# Expected type(s) of every known setting
+SCHEMA = {
+    'modifier1': str,
+    'modifier2': str,
+    'modifier3': str,
+    'block_input': bool,
+    'fade_duration': (int, float),
+    'auto_dim': bool,
+    'auto_dim_alpha': int,
+    'hotkey_target': str,
+    'hotkey_scope': str,
+    'bindings': list,
+    'opacity_curve': str,
+    'opacity_gamma': (int, float),
+    'opacity_points': list,
+}
+
+HOTKEY_TARGETS = ('foreground', 'cursor')
+
+# What the digit shortcuts change: the target window or every window of its process
+HOTKEY_SCOPES = ('window', 'app')
+
+MODIFIER_KEYS = ('modifier1', 'modifier2', 'modifier3')
+
+
+class SettingsError(ValueError):
+    """Raised for a settings file that does not match the schema"""
+
+
+def migrate(data):
+    """Upgrade settings written by older versions to the current schema"""
+    version = data.get('version', 0)
+    if not isinstance(version, int) or version > SCHEMA_VERSION:
+        raise SettingsError(f"unsupported settings version {version!r}")
+    if version == 0:
+        # Unversioned files only ever held the shortcut keys
+        data = dict(data, version=1)
+    return data
+
+
+def validate(data, defaults):
+    """Check settings against the schema, returns them merged over defaults"""
+    if not isinstance(data, dict):
+        raise SettingsError("settings must be a JSON object")
+    data = migrate(data)
+
+    for key, expected in SCHEMA.items():
+        if key not in data:
+            continue
+        value = data[key]
+        # bool is an int subclass, don't accept True as a duration
+        if not isinstance(value, expected) or (expected is not bool and isinstance(value, bool)):
+            raise SettingsError(f"{key} has invalid value {value!r}")
+
+    if data.get('fade_duration', 0) < 0:
+        raise SettingsError("fade_duration must not be negative")
+    if not 1 <= data.get('auto_dim_alpha', 255) <= 255:
+        raise SettingsError("auto_dim_alpha must be between 1 and 255")
+    if data.get('hotkey_target', 'foreground') not in HOTKEY_TARGETS:
+        raise SettingsError(f"hotkey_target must be one of {', '.join(HOTKEY_TARGETS)}")
+    if data.get('hotkey_scope', 'window') not in HOTKEY_SCOPES:
+        raise SettingsError(f"hotkey_scope must be one of {', '.join(HOTKEY_SCOPES)}")
+
+    settings = dict(defaults)
+    settings.update(data)
+    settings['version'] = SCHEMA_VERSION
+    try:
+        build_keymap(settings)
+    except KeymapError as e:
+        raise SettingsError(f"bindings: {e}")
+    try:
+        build_levels(settings)
+    except CurveError as e:
+        raise SettingsError(f"opacity curve: {e}")
+    return settings
+
+
+def atomic_write_json(path, data):
+    """Write JSON to a temp file next to path, then rename it over path
+
+    Readers (including the settings watcher) see either the old or the new
+    file, never a half-written one.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.tmp-', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def configured_modifiers(settings):
+    return frozenset(normalize_key(settings.get(key) or '') for key in MODIFIER_KEYS) - {''}
+
+
+def build_keymap(settings):
+    """Compile the modifier + digit shortcuts and any extra bindings into a Keymap"""
+    modifiers = sorted(configured_modifiers(settings))
+    scope = settings.get('hotkey_scope') or 'window'
+    bindings = [Binding('+'.join(modifiers + [digit]), 'level', int(digit), scope) for digit in DIGIT_KEYS]
+    bindings.extend(Binding.from_dict(data) for data in settings.get('bindings') or ())
+    return Keymap(bindings)
+
+
+class ShortcutMatcher(namedtuple('ShortcutMatcher', 'block_input fade_duration under_cursor keymap levels')):
+    """Immutable, precompiled form of the settings the hotkey path needs
+
+    Built once per settings change and swapped in with a single assignment,
+    so the listener never parses settings while handling a key.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(bool(settings.get('block_input', True)),
+                   settings.get('fade_duration', 0) / 1000,
+                   settings.get('hotkey_target') == 'cursor',
+                   build_keymap(settings),
+                   build_levels(settings))
+
+
+class FileWatcher:
+    """Polls file modification times and calls back once a change settles
+
+    A stat() per file per interval is all it costs. A change is reported only
+    after the file has stopped changing for the debounce period, so editors
+    that write in several steps trigger a single reload.
+    """
+
+    def __init__(self, interval=1.0, debounce=0.3):
+        self.interval = interval
+        self.debounce = debounce
+        self.watched = {}
+        self.stopped = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def watch(self, path, callback):
+        """Call callback(path) whenever path changes"""
+        with self.lock:
+            self.watched[path] = [callback, self._signature(path), None]
+
+    def ignore_current(self, path):
+        """Treat the file as it is now as already seen (e.g. after we wrote it)"""
+        with self.lock:
+            if path in self.watched:
+                self.watched[path][1] = self._signature(path)
+                self.watched[path][2] = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def poll(self):
+        """Check every watched file once, returns the paths reported as changed"""
+        changed = []
+        now = time.monotonic()
+        with self.lock:
+            for path, entry in self.watched.items():
+                callback, seen, pending = entry
+                signature = self._signature(path)
+                if signature == seen:
+                    entry[2] = None
+                    continue
+                if pending is None or pending[0] != signature:
+                    # Changed (again): start or restart the debounce period
+                    entry[2] = (signature, now)
+                elif now - pending[1] >= self.debounce:
+                    entry[1] = signature
+                    entry[2] = None
+                    changed.append((path, callback))
+
+        for path, callback in changed:
+            try:
+                callback(path)
+            except Exception as e:
+                log.error("Error reloading %s: %s", path, e)
+        return [path for path, _ in changed]
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.poll()
+            with self.lock:
+                debouncing = any(entry[2] is not None for entry in self.watched.values())
+            self.stopped.wait(self.debounce if debouncing else self.interval)
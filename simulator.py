@@ -0,0 +1,309 @@
+"""In-memory simulated window manager and keyboard
+
+FakeWin32 stands in for the Win32 modules the Win32 backend uses: windows
+can be created and destroyed, keep their ex-style bits and layered alpha,
+and every write can be given a latency or made to hang. FakeKeyboard stands
+in for the keyboard module and sends synthetic key events through the app's
+hook. Together they run TransparentWindowsApp on any platform:
+
+    fake = FakeWin32(100)
+    app = fake.app()
+    keys = FakeKeyboard().install()
+"""
+import os
+import random
+import threading
+import time
+from collections import Counter, namedtuple
+
+import backends
+import transparency
+
+class FakeWindow:
+    __slots__ = ('hwnd', 'title', 'window_class', 'pid', 'rect', 'visible', 'owner', 'ex_style', 'layered', 'latency')
+
+    def __init__(self, hwnd, title, window_class='FakeWindow', pid=1000, rect=(0, 0, 800, 600), visible=True,
+                 owner=0, ex_style=0):
+        self.hwnd = hwnd
+        self.rect = rect
+        self.title = title
+        self.window_class = window_class
+        self.pid = pid
+        self.visible = visible
+        self.owner = owner
+        self.ex_style = ex_style
+        self.layered = (0, 255, 0)
+        # Seconds each write takes, None for a hung window
+        self.latency = 0
+
+
+class FakeWin32:
+    """Stand-in for win32gui, winxpgui, win32api, win32process and win32con that counts calls"""
+
+    GWL_EXSTYLE = -20
+    GW_OWNER = 4
+    WS_EX_TOOLWINDOW = 0x00000080
+    WS_EX_LAYERED = 0x00080000
+    WS_EX_NOACTIVATE = 0x08000000
+    VK_SHIFT = 0x10
+    VK_CONTROL = 0x11
+    VK_MENU = 0x12
+    VK_LWIN = 0x5B
+    VK_RWIN = 0x5C
+    LWA_ALPHA = 0x00000002
+
+    def __init__(self, count=0, monitors=((0, 0, 1920, 1080),)):
+        self.windows = {}
+        self.foreground = 0
+        self.cursor = (0, 0)
+        self.monitor_rects = list(monitors)
+        self.calls = Counter()
+        # Virtual-key codes physically held, see FakeKeyboard(window_manager)
+        self.keys_down = set()
+        self.unhang = threading.Event()
+        self.next_hwnd = 0x10000
+        for _ in range(count):
+            self.create_window()
+
+    def create_window(self, title=None, window_class='FakeWindow', pid=1000, rect=(0, 0, 800, 600), visible=True,
+                      owner=0, ex_style=0):
+        hwnd = self.next_hwnd
+        self.next_hwnd += 4
+        title = f"Window {hwnd:x}" if title is None else title
+        self.windows[hwnd] = FakeWindow(hwnd, title, window_class, pid, rect, visible, owner, ex_style)
+        self.foreground = hwnd
+        return hwnd
+
+    def destroy_window(self, hwnd):
+        self.windows.pop(hwnd, None)
+
+    def window(self, hwnd):
+        try:
+            return self.windows[hwnd]
+        except KeyError:
+            raise OSError(f"Invalid window handle {hwnd:x}")
+
+    def delay(self, window):
+        """Simulate a slow or hung target application"""
+        if window.latency is None:
+            self.unhang.wait()
+        elif window.latency:
+            time.sleep(window.latency)
+
+    def install(self):
+        """Patch the Win32 backend to use this fake"""
+        backends.win32gui = backends.winxpgui = backends.win32api = backends.win32process = self
+        backends.win32con = self
+        return self
+
+    def app(self, **kwargs):
+        """Return an app running on the Win32 backend over this fake"""
+        self.install()
+        return transparency.TransparentWindowsApp(backend=backends.Win32Backend(), **kwargs)
+
+    def RGB(self, r, g, b):
+        return r | (g << 8) | (b << 16)
+
+    def GetForegroundWindow(self):
+        self.calls['GetForegroundWindow'] += 1
+        return self.foreground
+
+    def IsWindow(self, hwnd):
+        self.calls['IsWindow'] += 1
+        return hwnd in self.windows
+
+    def IsWindowVisible(self, hwnd):
+        self.calls['IsWindowVisible'] += 1
+        return self.window(hwnd).visible
+
+    def GetWindowText(self, hwnd):
+        self.calls['GetWindowText'] += 1
+        return self.window(hwnd).title
+
+    def GetWindow(self, hwnd, command):
+        self.calls['GetWindow'] += 1
+        return self.window(hwnd).owner if command == self.GW_OWNER else 0
+
+    def GetWindowRect(self, hwnd):
+        self.calls['GetWindowRect'] += 1
+        return self.window(hwnd).rect
+
+    def GetAsyncKeyState(self, code):
+        self.calls['GetAsyncKeyState'] += 1
+        return 0x8000 if code in self.keys_down else 0
+
+    def key_code(self, name):
+        """Virtual-key code of a modifier name, None for other keys"""
+        return {'ctrl': self.VK_CONTROL, 'shift': self.VK_SHIFT, 'alt': self.VK_MENU, 'win': self.VK_LWIN}.get(name)
+
+    def GetCursorPos(self):
+        self.calls['GetCursorPos'] += 1
+        return self.cursor
+
+    def EnumDisplayMonitors(self):
+        self.calls['EnumDisplayMonitors'] += 1
+        return [(i, None, rect) for i, rect in enumerate(self.monitor_rects)]
+
+    def GetClassName(self, hwnd):
+        self.calls['GetClassName'] += 1
+        return self.window(hwnd).window_class
+
+    def GetWindowThreadProcessId(self, hwnd):
+        self.calls['GetWindowThreadProcessId'] += 1
+        return 1, self.window(hwnd).pid
+
+    def EnumWindows(self, callback, extra):
+        self.calls['EnumWindows'] += 1
+        for hwnd in list(self.windows):
+            if not callback(hwnd, extra):
+                break
+
+    def GetWindowLong(self, hwnd, index):
+        self.calls['GetWindowLong'] += 1
+        return self.window(hwnd).ex_style
+
+    def SetWindowLong(self, hwnd, index, value):
+        self.calls['SetWindowLong'] += 1
+        window = self.window(hwnd)
+        self.delay(window)
+        previous, window.ex_style = window.ex_style, value
+        return previous
+
+    def GetLayeredWindowAttributes(self, hwnd):
+        self.calls['GetLayeredWindowAttributes'] += 1
+        return self.window(hwnd).layered
+
+    def SetLayeredWindowAttributes(self, hwnd, colorkey, alpha, flags):
+        self.calls['SetLayeredWindowAttributes'] += 1
+        window = self.window(hwnd)
+        self.delay(window)
+        window.layered = (colorkey, alpha, flags)
+
+    def cross_process_calls(self):
+        return sum(count for name, count in self.calls.items() if name != 'RGB')
+
+
+KeyEvent = namedtuple('KeyEvent', 'name event_type scan_code')
+
+# What the keyboard module reports for a digit while Shift is held
+SHIFTED_NAMES = dict(zip('1234567890', '!@#$%^&*()'))
+
+
+class FakeKeyboard:
+    """Stand-in for the keyboard module: suppressing hooks and synthetic key presses
+
+    Every event goes through the installed hooks; one that no hook
+    suppresses reaches the focused application, which here only counts it.
+    Like the real module, a shifted digit is reported by its symbol with
+    the digit's scan code, and is_pressed() only knows what the hooks saw.
+    Given a FakeWin32, physical modifier state is mirrored into its
+    GetAsyncKeyState, so release_unseen() can lose a key-up the way a
+    secure desktop does.
+    """
+
+    def __init__(self, window_manager=None):
+        self.window_manager = window_manager
+        self.hooks = []
+        self.scan_codes = {}
+        self.pressed = set()
+        self.delivered = Counter()
+        self.suppressed = Counter()
+        self.hooked = threading.Event()
+        self.lock = threading.Lock()
+
+    def install(self):
+        """Patch the app module to use this fake"""
+        transparency.keyboard = self
+        transparency.KEYBOARD_AVAILABLE = True
+        return self
+
+    def key_to_scan_codes(self, name):
+        name = name.lower()
+        with self.lock:
+            if name not in self.scan_codes:
+                self.scan_codes[name] = len(self.scan_codes) + 2
+            return (self.scan_codes[name],)
+
+    def hook(self, callback, suppress=False):
+        with self.lock:
+            self.hooks.append(callback)
+        self.hooked.set()
+        return callback
+
+    def unhook(self, callback):
+        with self.lock:
+            self.hooks.remove(callback)
+            if not self.hooks:
+                self.hooked.clear()
+
+    def is_pressed(self, name):
+        return name in self.pressed
+
+    def set_physical(self, name, down):
+        code = self.window_manager.key_code(name) if self.window_manager is not None else None
+        if code is None:
+            return
+        if down:
+            self.window_manager.keys_down.add(code)
+        else:
+            self.window_manager.keys_down.discard(code)
+
+    def release_unseen(self, name):
+        """Release a key without any hook seeing the key-up"""
+        self.set_physical(name, False)
+
+    def send(self, name, event_type):
+        """Send one key event, returns whether it reached the focused application"""
+        scan_code = self.key_to_scan_codes(name)[0]
+        self.set_physical(name, event_type == 'down')
+        if event_type == 'down':
+            self.pressed.add(name)
+        else:
+            self.pressed.discard(name)
+        if 'shift' in self.pressed:
+            name = SHIFTED_NAMES.get(name, name)
+        event = KeyEvent(name, event_type, scan_code)
+        delivered = True
+        for callback in list(self.hooks):
+            if callback(event) is False:
+                delivered = False
+        (self.delivered if delivered else self.suppressed)[name] += 1
+        return delivered
+
+    def press(self, name):
+        return self.send(name, 'down')
+
+    def release(self, name):
+        return self.send(name, 'up')
+
+    def tap(self, chord):
+        """Press and release a chord such as 'ctrl+shift+alt+5', or a sequence 'ctrl+alt+t, 5'"""
+        for stroke in chord.split(','):
+            names = [name.strip() for name in stroke.split('+')]
+            for name in names:
+                self.press(name)
+            for name in reversed(names):
+                self.release(name)
+
+
+def journal_writer(directory, windows=200):
+    """Run an app that changes opacity as fast as it can until it is killed
+
+    After every commit it prints the journal sequence number known to be on
+    disk. Run it in a child process: python -c 'import simulator;
+    simulator.journal_writer(directory)'.
+    """
+    fake = FakeWin32(windows)
+    app = fake.app(settings_file=os.path.join(directory, "transparent_windows_settings.json"))
+    app.start_journal('keep')
+    app.journal.commit_interval = 0.005
+    app.journal.compact_every = 500
+    rng = random.Random(os.getpid())
+    hwnds = list(fake.windows)
+    while True:
+        for _ in range(50):
+            app.apply_opacity(rng.choice(hwnds), rng.randint(1, 254))
+        if rng.random() < 0.05:
+            app.restore_modified_windows()
+        app.journal.flush()
+        print(app.journal.committed_seq, flush=True)
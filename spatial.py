@@ -0,0 +1,171 @@
+"""Spatial index of top-level window rectangles and stacking order"""
+import threading
+
+
+def rect_centre(rect):
+    left, top, right, bottom = rect
+    return (left + right) // 2, (top + bottom) // 2
+
+
+class WindowIndex:
+    """Uniform grid over screen coordinates, updated one window at a time
+
+    Each window is filed in every grid cell its rectangle overlaps, so a point
+    query only looks at the windows in one cell and a rectangle query at the
+    cells the rectangle covers. Windows covering more than max_cells cells
+    (huge or bogus rectangles) are kept in a short list checked on every
+    query instead. Stacking order is a stamp per window: raising a window
+    gives it a new, highest stamp, so the topmost window at a point is the
+    candidate with the largest stamp.
+
+    Rectangles are (left, top, right, bottom) with right and bottom exclusive.
+    """
+
+    def __init__(self, cell_size=256, max_cells=1024):
+        self.cell_size = cell_size
+        self.max_cells = max_cells
+        self.cells = {}
+        self.rects = {}
+        self.stamps = {}
+        self.oversized = set()
+        self.next_stamp = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __contains__(self, hwnd):
+        return hwnd in self.rects
+
+    def _cells(self, rect):
+        left, top, right, bottom = rect
+        size = self.cell_size
+        return [(x, y)
+                for x in range(left // size, (right - 1) // size + 1)
+                for y in range(top // size, (bottom - 1) // size + 1)]
+
+    def _cell_count(self, rect):
+        left, top, right, bottom = rect
+        size = self.cell_size
+        return ((right - 1) // size - left // size + 1) * ((bottom - 1) // size - top // size + 1)
+
+    def _unfile(self, hwnd, rect):
+        """Remove a window from the cells of its old rectangle (lock held)"""
+        if hwnd in self.oversized:
+            self.oversized.discard(hwnd)
+            return
+        for cell in self._cells(rect):
+            members = self.cells.get(cell)
+            if members is not None:
+                members.discard(hwnd)
+                if not members:
+                    del self.cells[cell]
+
+    def update(self, hwnd, rect):
+        """Insert a window or move it to a new rectangle; empty rectangles remove it"""
+        left, top, right, bottom = rect
+        with self.lock:
+            old = self.rects.get(hwnd)
+            if old == rect:
+                return
+            if old is not None:
+                self._unfile(hwnd, old)
+            if right <= left or bottom <= top:
+                self.rects.pop(hwnd, None)
+                self.stamps.pop(hwnd, None)
+                return
+            self.rects[hwnd] = rect
+            if hwnd not in self.stamps:
+                self.next_stamp += 1
+                self.stamps[hwnd] = self.next_stamp
+            if self._cell_count(rect) > self.max_cells:
+                self.oversized.add(hwnd)
+                return
+            for cell in self._cells(rect):
+                members = self.cells.get(cell)
+                if members is None:
+                    self.cells[cell] = {hwnd}
+                else:
+                    members.add(hwnd)
+
+    def remove(self, hwnd):
+        with self.lock:
+            rect = self.rects.pop(hwnd, None)
+            self.stamps.pop(hwnd, None)
+            if rect is not None:
+                self._unfile(hwnd, rect)
+
+    def raise_window(self, hwnd):
+        """Move a window to the top of the stacking order"""
+        with self.lock:
+            if hwnd in self.rects:
+                self.next_stamp += 1
+                self.stamps[hwnd] = self.next_stamp
+
+    def load(self, windows):
+        """Add (hwnd, rect) pairs given topmost first, e.g. from one enumeration"""
+        windows = list(windows)
+        for hwnd, rect in reversed(windows):
+            self.update(hwnd, rect)
+            self.raise_window(hwnd)
+
+    def clear(self):
+        with self.lock:
+            self.cells.clear()
+            self.rects.clear()
+            self.stamps.clear()
+            self.oversized.clear()
+
+    def rect(self, hwnd):
+        with self.lock:
+            return self.rects.get(hwnd)
+
+    def window_at(self, x, y):
+        """Return the topmost window containing the point, or None"""
+        size = self.cell_size
+        with self.lock:
+            best = None
+            best_stamp = -1
+            candidates = self.cells.get((x // size, y // size), ())
+            for group in (candidates, self.oversized):
+                for hwnd in group:
+                    left, top, right, bottom = self.rects[hwnd]
+                    if left <= x < right and top <= y < bottom and self.stamps[hwnd] > best_stamp:
+                        best, best_stamp = hwnd, self.stamps[hwnd]
+            return best
+
+    def _candidates(self, rect):
+        """Windows filed in any cell rect covers (lock held)"""
+        candidates = set(self.oversized)
+        for cell in self._cells(rect):
+            members = self.cells.get(cell)
+            if members:
+                candidates.update(members)
+        return candidates
+
+    def intersecting(self, rect):
+        """Return the windows overlapping rect, topmost first"""
+        left, top, right, bottom = rect
+        if right <= left or bottom <= top:
+            return []
+        with self.lock:
+            found = []
+            for hwnd in self._candidates(rect):
+                l, t, r, b = self.rects[hwnd]
+                if l < right and left < r and t < bottom and top < b:
+                    found.append(hwnd)
+            found.sort(key=self.stamps.__getitem__, reverse=True)
+            return found
+
+    def centred_in(self, rect):
+        """Return the windows whose centre lies inside rect (e.g. a monitor), topmost first"""
+        left, top, right, bottom = rect
+        with self.lock:
+            found = []
+            # A window's centre is inside its own rectangle, so it overlaps rect
+            for hwnd in self._candidates(rect):
+                x, y = rect_centre(self.rects[hwnd])
+                if left <= x < right and top <= y < bottom:
+                    found.append(hwnd)
+            found.sort(key=self.stamps.__getitem__, reverse=True)
+            return found
@@ -0,0 +1,95 @@
+"""Tests for changing every window of the target's app"""
+import random
+import unittest
+
+import transparency
+from hotkeys import Binding
+from test_transparency import AppTestCase
+from winevents import EVENT_OBJECT_CREATE
+
+APP_LEVEL = Binding('ctrl+5', 'level', 5, 'app')
+
+
+class AppWindowsTest(AppTestCase):
+
+    windows = 0
+
+    def setUp(self):
+        super().setUp()
+        self.target = self.fake.create_window(pid=1)
+        self.sibling = self.fake.create_window(pid=1)
+        self.hidden = self.fake.create_window(pid=1, visible=False)
+        self.other = self.fake.create_window(pid=2)
+
+    def press(self):
+        self.fake.foreground = self.target
+        self.app.on_binding(APP_LEVEL)
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+
+    def changed(self):
+        alpha = self.app.opacity_for_level(5)
+        return {hwnd for hwnd, window in self.fake.windows.items() if window.layered[1] == alpha}
+
+    def test_scan_changes_the_visible_windows_of_the_app(self):
+        self.press()
+        self.assertEqual(self.changed(), {self.target, self.sibling})
+
+    def test_process_map_matches_the_scan(self):
+        self.app.build_window_index()
+        self.app.on_window_event(transparency.EVENT_OBJECT_SHOW, self.target)
+        self.fake.calls.clear()
+        self.press()
+        self.assertEqual(self.changed(), {self.target, self.sibling})
+        self.assertEqual(self.fake.calls['EnumWindows'], 0)
+
+    def test_process_map_follows_show_and_hide(self):
+        self.app.build_window_index()
+        created = self.fake.create_window(pid=1, visible=False)
+        self.app.on_window_event(EVENT_OBJECT_CREATE, created)
+        self.fake.windows[self.sibling].visible = False
+        self.app.on_window_event(transparency.EVENT_OBJECT_HIDE, self.sibling)
+        self.fake.windows[self.hidden].visible = True
+        self.app.on_window_event(transparency.EVENT_OBJECT_SHOW, self.hidden)
+        self.press()
+        self.assertEqual(self.changed(), {self.target, self.hidden})
+
+    def assert_app_windows(self, rng):
+        visible = [hwnd for hwnd, window in self.fake.windows.items() if window.visible]
+        for hwnd in rng.sample(visible, 30):
+            pid = self.fake.windows[hwnd].pid
+            windows = self.app.app_windows(hwnd)
+            # The target first, then the other visible windows of its process
+            self.assertEqual(windows[0], hwnd)
+            self.assertEqual(set(windows), {other for other in visible if self.fake.windows[other].pid == pid})
+
+    def test_process_map_matches_the_scan_through_churn(self):
+        rng = random.Random(23)
+        for _ in range(300):
+            self.fake.create_window(pid=rng.randrange(10, 30))
+        self.assert_app_windows(rng)
+        self.app.build_window_index()
+        for i in range(500):
+            if i % 2:
+                hwnd = rng.choice(list(self.fake.windows))
+                self.fake.destroy_window(hwnd)
+                self.app.on_window_event(transparency.EVENT_OBJECT_DESTROY, hwnd)
+            else:
+                hwnd = self.fake.create_window(pid=rng.randrange(10, 30))
+                self.app.on_window_event(transparency.EVENT_OBJECT_SHOW, hwnd)
+        self.fake.calls.clear()
+        self.assert_app_windows(rng)
+        self.assertEqual(self.fake.calls['EnumWindows'], 0)
+
+    def test_app_scope_setting_applies_to_the_digits(self):
+        self.app.apply_settings(dict(self.app.shortcuts, hotkey_scope='app'))
+        self.fake.foreground = self.target
+        engine = self.app.create_hotkey_engine()
+        self.fake.keys_down.update(self.fake.key_code(name) for name in ('ctrl', 'shift', 'alt'))
+        for name in ('ctrl', 'shift', 'alt', '5'):
+            engine.handle_event(name, 'down')
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        self.assertEqual(self.changed(), {self.target, self.sibling})
+
+
+if __name__ == '__main__':
+    unittest.main()
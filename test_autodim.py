@@ -0,0 +1,175 @@
+"""Tests for focus-follow auto-dim"""
+import json
+import unittest
+
+import transparency
+from test_transparency import AppTestCase
+
+
+class AutoDimTestCase(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Stand-in for a running WinEventWatcher, auto-dim needs window events
+        self.app.window_events = object()
+        self.fake.foreground = self.hwnds[0]
+
+    def enable(self, alpha=100):
+        self.apply(auto_dim=True, auto_dim_alpha=alpha)
+
+    def apply(self, **settings):
+        self.app.apply_settings(dict(self.app.shortcuts, **settings))
+        self.assertTrue(self.app.wait_auto_dim(5))
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+
+    def alpha(self, hwnd):
+        return self.fake.windows[hwnd].layered[1]
+
+    def focus(self, hwnd):
+        self.fake.foreground = hwnd
+        self.app.on_window_event(transparency.EVENT_SYSTEM_FOREGROUND, hwnd)
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+
+
+class AutoDimTest(AutoDimTestCase):
+
+    def test_enable_dims_every_window_but_the_focused_one(self):
+        self.enable()
+        self.assertEqual(self.alpha(self.hwnds[0]), 255)
+        self.assertTrue(all(self.alpha(hwnd) == 100 for hwnd in self.hwnds[1:]))
+
+    def test_needs_window_events(self):
+        self.app.window_events = None
+        self.enable()
+        self.assertFalse(self.app.auto_dim.enabled)
+
+    def test_focus_change_touches_two_windows(self):
+        self.enable()
+        self.fake.calls.clear()
+        self.focus(self.hwnds[3])
+        self.assertEqual(self.alpha(self.hwnds[3]), 255)
+        self.assertEqual(self.alpha(self.hwnds[0]), 100)
+        self.assertEqual(self.fake.calls['EnumWindows'], 0)
+        self.assertLessEqual(self.fake.cross_process_calls(), 4)
+
+    def test_new_windows_are_dimmed_when_shown(self):
+        self.enable()
+        hwnd = self.fake.create_window()
+        self.fake.foreground = self.hwnds[0]
+        self.app.on_window_event(transparency.EVENT_OBJECT_SHOW, hwnd)
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        self.assertEqual(self.alpha(hwnd), 100)
+
+    def test_shell_windows_are_never_dimmed(self):
+        hwnd = self.fake.create_window(window_class='Shell_TrayWnd')
+        self.fake.foreground = self.hwnds[0]
+        self.enable()
+        self.assertEqual(self.alpha(hwnd), 255)
+
+    def test_popups_and_untitled_windows_are_never_dimmed(self):
+        owner = self.hwnds[1]
+        popups = [self.fake.create_window(window_class='#32768'),
+                  self.fake.create_window(ex_style=self.fake.WS_EX_TOOLWINDOW),
+                  self.fake.create_window(ex_style=self.fake.WS_EX_NOACTIVATE),
+                  self.fake.create_window(owner=owner),
+                  self.fake.create_window(title='')]
+        self.fake.foreground = self.hwnds[0]
+        self.enable()
+        for hwnd in popups:
+            self.assertFalse(self.fake.windows[hwnd].ex_style & self.fake.WS_EX_LAYERED)
+        self.assertEqual(self.alpha(owner), 100)
+
+    def test_settings_thread_does_not_wait_for_the_windows(self):
+        self.app.pipeline.max_pending = 1
+        for hwnd in self.hwnds:
+            self.fake.windows[hwnd].latency = None
+        self.app.apply_settings(dict(self.app.shortcuts, auto_dim=True))
+        self.assertFalse(self.app.wait_auto_dim(0.05))
+        self.fake.unhang.set()
+        self.assertTrue(self.app.wait_auto_dim(5))
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        self.assertTrue(all(self.alpha(hwnd) == 160 for hwnd in self.hwnds[1:]))
+
+    def test_other_settings_leave_auto_dim_alone(self):
+        self.apply(fade_duration=0)
+        self.assertIsNone(self.app.auto_dim_thread)
+        self.enable()
+        worker = self.app.auto_dim_thread
+        self.fake.calls.clear()
+        self.apply(opacity_curve='gamma')
+        self.enable()
+        self.assertEqual(self.fake.calls['EnumWindows'], 0)
+        self.assertEqual(self.fake.cross_process_calls(), 0)
+        self.enable(150)
+        self.apply(auto_dim=False)
+        self.assertIs(self.app.auto_dim_thread, worker)
+        self.assertTrue(worker.is_alive())
+
+    def test_changing_the_level_redims(self):
+        self.enable(100)
+        self.enable(150)
+        self.assertTrue(all(self.alpha(hwnd) == 150 for hwnd in self.hwnds[1:]))
+
+    def test_focus_returning_keeps_the_level(self):
+        self.enable()
+        self.app.on_hotkey(5)
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        level_alpha = self.app.opacity_for_level(5)
+        self.focus(self.hwnds[1])
+        self.assertEqual(self.alpha(self.hwnds[0]), 100)
+        self.assertEqual(self.app.window_targets[self.hwnds[0]], (level_alpha, 5))
+        self.focus(self.hwnds[0])
+        self.assertEqual(self.alpha(self.hwnds[0]), level_alpha)
+        self.assertEqual(self.app.window_targets[self.hwnds[0]], (level_alpha, 5))
+
+    def test_disable_undims(self):
+        self.app.set_window_opacity(self.hwnds[2], 200)
+        self.enable()
+        self.apply(auto_dim=False)
+        self.assertEqual(self.alpha(self.hwnds[2]), 200)
+        for hwnd in self.hwnds[:2] + self.hwnds[3:]:
+            # Windows we had not changed lose the layered style again
+            self.assertFalse(self.fake.windows[hwnd].ex_style & self.fake.WS_EX_LAYERED)
+            self.assertNotIn(hwnd, self.app.modified_windows)
+
+    def test_rule_alpha_survives_dimming(self):
+        with open(self.app.rules_file, 'w') as f:
+            json.dump({'rules': [{'class': 'Notepad', 'alpha': 200}]}, f)
+        self.app.reload_rules(self.app.rules_file)
+        self.enable()
+        hwnd = self.fake.create_window(window_class='Notepad')
+        self.fake.foreground = self.hwnds[0]
+        self.app.on_window_event(transparency.EVENT_OBJECT_SHOW, hwnd)
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        self.assertEqual(self.alpha(hwnd), 100)
+
+        self.focus(hwnd)
+        self.assertEqual(self.alpha(hwnd), 200)
+        self.focus(self.hwnds[0])
+        self.assertEqual(self.alpha(hwnd), 100)
+        self.apply(auto_dim=False)
+        self.assertEqual(self.alpha(hwnd), 200)
+        self.assertEqual(self.app.window_targets[hwnd], (200, None))
+
+
+class LargeDesktopAutoDimTest(AutoDimTestCase):
+
+    windows = 5000
+
+    def test_focus_change_cost_does_not_grow_with_the_desktop(self):
+        self.enable()
+        self.assertTrue(all(self.alpha(hwnd) == 100 for hwnd in self.hwnds[1:]))
+        for hwnd in self.hwnds[1::500] + self.hwnds[:2]:
+            self.fake.calls.clear()
+            self.focus(hwnd)
+            self.assertEqual(self.alpha(hwnd), 255)
+            # The new foreground window and the previous one, nothing else
+            self.assertEqual(self.fake.calls['SetLayeredWindowAttributes'], 2)
+            # Only a window never written before has its style read
+            self.assertLessEqual(self.fake.calls['GetWindowLong'], 1)
+            self.assertEqual(self.fake.calls['EnumWindows'], 0)
+        self.assertEqual(self.app.auto_dim.stats()['dimmed'], len(self.hwnds) - 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Tests for the X11 backend against a real X server
+
+Run them under Xvfb: xvfb-run python -m pytest test_backends.py. Without
+$DISPLAY they are skipped.
+"""
+import ctypes
+import os
+import unittest
+
+import backends
+
+
+@unittest.skipUnless(os.environ.get('DISPLAY'), "needs an X display, e.g. Xvfb")
+class X11BackendTest(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            self.backend = backends.X11Backend()
+        except backends.BackendUnavailable as e:
+            self.skipTest(str(e))
+        lib = self.backend.lib
+        lib.XCreateSimpleWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong] + [ctypes.c_int] * 4 + \
+            [ctypes.c_uint, ctypes.c_ulong, ctypes.c_ulong]
+        lib.XCreateSimpleWindow.restype = ctypes.c_ulong
+        lib.XDestroyWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        self.hwnds = []
+
+    def tearDown(self):
+        for hwnd in list(self.hwnds):
+            self.destroy_window(hwnd)
+        self.backend.close()
+
+    def create_window(self):
+        with self.backend.lock:
+            hwnd = self.backend.lib.XCreateSimpleWindow(self.backend.display, self.backend.root,
+                                                        10, 20, 300, 200, 0, 0, 0)
+            self.backend.lib.XSync(self.backend.display, False)
+        self.hwnds.append(hwnd)
+        return hwnd
+
+    def destroy_window(self, hwnd):
+        with self.backend.lock:
+            self.backend.lib.XDestroyWindow(self.backend.display, hwnd)
+            self.backend.lib.XSync(self.backend.display, False)
+        self.hwnds.remove(hwnd)
+
+    def test_created_window_exists(self):
+        hwnd = self.create_window()
+        self.assertTrue(self.backend.is_window(hwnd))
+        left, top, right, bottom = self.backend.window_rect(hwnd)
+        self.assertEqual((right - left, bottom - top), (300, 200))
+
+    def test_opacity_round_trip(self):
+        hwnd = self.create_window()
+        original, alpha = self.backend.read_state(hwnd)
+        self.assertEqual((original, alpha), (None, None))
+
+        self.backend.set_alpha(hwnd, 128, original)
+        self.assertEqual(self.backend.read_state(hwnd), (128 * self.backend.OPAQUE // 255, 128))
+        self.backend.restore(hwnd, original)
+        self.assertEqual(self.backend.read_state(hwnd), (None, None))
+
+    def test_bulk_round_trip(self):
+        hwnds = [self.create_window() for _ in range(20)]
+        self.assertEqual(self.backend.set_alpha_many((hwnd, 100 + i, None) for i, hwnd in enumerate(hwnds)), 20)
+        states = self.backend.read_state_many(hwnds)
+        self.assertEqual(states, {hwnd: self.backend.read_state(hwnd) for hwnd in hwnds})
+        self.assertEqual([states[hwnd][1] for hwnd in hwnds], list(range(100, 120)))
+        self.assertEqual(self.backend.restore_many((hwnd, None) for hwnd in hwnds), 20)
+        self.assertTrue(all(state == (None, None) for state in self.backend.read_state_many(hwnds).values()))
+
+    def test_destroyed_window_fails(self):
+        alive = self.create_window()
+        gone = self.create_window()
+        self.destroy_window(gone)
+
+        self.assertFalse(self.backend.is_window(gone))
+        with self.assertRaises(OSError):
+            self.backend.read_state(gone)
+        with self.assertRaises(OSError):
+            self.backend.set_alpha(gone, 100)
+        with self.assertRaises(OSError):
+            self.backend.restore(gone, None)
+        self.assertEqual(self.backend.set_alpha_many([(gone, 100, None), (alive, 100, None)]), 1)
+        self.assertEqual(list(self.backend.read_state_many([gone, alive])), [alive])
+        # A failure is not left behind for the next request
+        self.backend.set_alpha(alive, 50)
+        self.assertEqual(self.backend.read_state(alive)[1], 50)
+
+    def test_modifier_state(self):
+        self.assertIn(self.backend.key_down('ctrl'), (True, False))
+        self.assertIsNone(self.backend.key_down('q'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+"""Tests for the control socket and the control command line"""
+import os
+import random
+import tempfile
+import unittest
+
+import control
+import transparency
+from simulator import FakeWin32
+
+
+class ParseTargetTest(unittest.TestCase):
+
+    def target(self, *argv):
+        return control.parse_target(control.parse_args(['set', '--alpha', '5', *argv]))
+
+    def test_zero_is_a_target(self):
+        self.assertEqual(self.target('--hwnd', '0'), {'hwnd': 0})
+        self.assertEqual(self.target('--monitor', '0'), {'monitor': 0})
+        self.assertEqual(self.target('--pid', '0'), {'pid': 0})
+
+    def test_targets(self):
+        self.assertEqual(self.target('--hwnd', '0x10'), {'hwnd': 16})
+        self.assertEqual(self.target('--class', 'Notepad'), {'class': 'Notepad'})
+        self.assertEqual(self.target('--cursor'), {'cursor': True})
+        self.assertEqual(self.target(), {'foreground': True})
+
+
+class WindowLookupTest(unittest.TestCase):
+    """Lookups on the app's spatial index agree with scanning every window"""
+
+    monitors = [(0, 0, 1920, 1080), (1920, 0, 3840, 1080), (3840, 0, 5760, 1080)]
+
+    def setUp(self):
+        self.rng = random.Random(8)
+        self.fake = FakeWin32(monitors=self.monitors)
+        for _ in range(500):
+            self.fake.create_window(rect=self.random_rect())
+        self.app = self.fake.app()
+        self.app.build_window_index()
+
+    def tearDown(self):
+        self.app.pipeline.stop()
+
+    def random_rect(self):
+        width, height = self.rng.randrange(200, 1600), self.rng.randrange(150, 1000)
+        left, top = self.rng.randrange(-100, 5760 - width // 2), self.rng.randrange(-50, 1080 - height // 2)
+        return left, top, left + width, top + height
+
+    def assert_index_matches_scan(self):
+        indexed = control.WindowLookup(self.app.backend, self.app.window_index)
+        for _ in range(200):
+            x, y = self.rng.randrange(5760), self.rng.randrange(1080)
+            self.fake.calls.clear()
+            found = indexed.window_at(x, y)
+            self.assertFalse(self.fake.calls)
+            self.assertEqual(found, control.WindowLookup(self.app.backend).window_at(x, y), (x, y))
+        for number in range(1, len(self.monitors) + 1):
+            scanned = control.WindowLookup(self.app.backend).on_monitor(number)
+            self.assertEqual(set(indexed.on_monitor(number)), set(scanned))
+
+    def test_index_matches_the_scan(self):
+        self.assert_index_matches_scan()
+
+    def test_events_keep_the_index_current(self):
+        hwnds = list(self.fake.windows)
+        for _ in range(500):
+            hwnd = self.rng.choice(hwnds)
+            self.fake.windows[hwnd].rect = self.random_rect()
+            self.app.on_window_event(transparency.EVENT_OBJECT_LOCATIONCHANGE, hwnd)
+        for hwnd in self.rng.sample(hwnds, 50):
+            self.app.on_window_event(transparency.EVENT_SYSTEM_FOREGROUND, hwnd)
+        # Enumeration is topmost first, as the raises left the stacking order
+        raised = sorted(hwnds, key=self.app.window_index.stamps.__getitem__, reverse=True)
+        self.fake.windows = {hwnd: self.fake.windows[hwnd] for hwnd in raised}
+        self.assert_index_matches_scan()
+
+
+@unittest.skipIf(os.name == 'nt', "uses a Unix socket")
+class ControlServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeWin32()
+        for i in range(200):
+            self.fake.create_window(title=f"Document {i} - Editor", window_class=f"Class{i % 20}", pid=1000 + i % 10)
+        self.hwnds = list(self.fake.windows)
+        self.app = self.fake.app()
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = control.ControlServer(self.app, os.path.join(self.directory.name, "control.sock"))
+        self.server.start()
+        self.client = control.ControlClient(self.server.address)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        self.app.pipeline.stop()
+        self.directory.cleanup()
+
+    def request(self, command):
+        response = self.client.request(command)
+        self.app.pipeline.wait_idle(5)
+        return response
+
+    def alpha(self, hwnd):
+        return self.fake.windows[hwnd].layered[1]
+
+    def test_set_answers_each_request(self):
+        rng = random.Random(1)
+        for i in range(50):
+            hwnd, alpha = rng.choice(self.hwnds), rng.randrange(1, 256)
+            response = self.request({'cmd': 'set', 'alpha': alpha, 'hwnd': hwnd, 'id': i})
+            self.assertEqual((response['ok'], response['id'], response['matched']), (True, i, 1))
+            self.assertEqual(self.alpha(hwnd), alpha)
+
+    def test_batch(self):
+        ops = [{'alpha': 100 + i % 100, 'hwnd': hwnd} for i, hwnd in enumerate(self.hwnds)]
+        response = self.request({'cmd': 'batch', 'ops': ops})
+        self.assertEqual(response['matched'], len(self.hwnds))
+        self.assertEqual([self.alpha(op['hwnd']) for op in ops], [op['alpha'] for op in ops])
+
+    def test_pattern_targets(self):
+        response = self.request({'cmd': 'batch', 'ops': [
+            {'alpha': 50, 'class': 'class3'}, {'alpha': 60, 'pid': 1007}, {'alpha': 70, 'title': r'Document 1\d\b'}]})
+        expected = {}
+        for i, hwnd in enumerate(self.hwnds):
+            for alpha, matches in ((50, i % 20 == 3), (60, i % 10 == 7), (70, 10 <= i <= 19)):
+                if matches:
+                    expected[hwnd] = alpha
+        self.assertEqual(response['matched'], len(expected))
+        self.assertEqual({hwnd: self.alpha(hwnd) for hwnd in expected}, expected)
+
+    def test_state_and_reset(self):
+        self.request({'cmd': 'batch', 'ops': [{'alpha': 90, 'hwnd': hwnd} for hwnd in self.hwnds[:5]]})
+        state = self.request({'cmd': 'state'})
+        self.assertEqual(sorted(window['hwnd'] for window in state['windows']), sorted(self.hwnds[:5]))
+        self.assertTrue(all(window['alpha'] == 90 for window in state['windows']))
+
+        self.assertEqual(self.request({'cmd': 'reset'})['reset'], 5)
+        self.assertEqual(self.request({'cmd': 'state'})['windows'], [])
+
+    def test_errors(self):
+        self.assertFalse(self.request({'cmd': 'set', 'alpha': 0, 'hwnd': self.hwnds[0]})['ok'])
+        response = self.request({'cmd': 'set', 'alpha': 5, 'monitor': 0, 'id': 'x'})
+        self.assertEqual((response['ok'], response['id']), (False, 'x'))
+        self.assertIn('monitor', response['error'])
+        self.assertFalse(self.request({'cmd': 'nope'})['ok'])
+
+
+if __name__ == '__main__':
+    unittest.main()
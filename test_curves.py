@@ -0,0 +1,150 @@
+"""Tests for the opacity curves and the per-window levels built on them"""
+import os
+import tempfile
+import unittest
+
+import curves
+import settings as settings_schema
+from hotkeys import Binding
+from simulator import FakeWin32
+
+DEFAULTS = {'modifier1': 'ctrl', 'modifier2': 'shift', 'modifier3': 'alt'}
+
+
+def old_opacity_for_level(num):
+    """The formula the app used before curves were compiled"""
+    if num == 0:
+        return 1
+    if num == 9:
+        return 255
+    return round(10 + ((255 - 10) / 8) * (num - 1))
+
+
+class CurveTest(unittest.TestCase):
+
+    def test_linear_matches_the_old_formula(self):
+        self.assertEqual(curves.linear_levels(), tuple(old_opacity_for_level(level) for level in range(10)))
+
+    def test_gamma_one_is_linear(self):
+        self.assertEqual(curves.gamma_levels(1), curves.linear_levels())
+
+    def test_gamma_keeps_the_ends_and_order(self):
+        levels = curves.gamma_levels(2.2)
+        self.assertEqual(levels[0], curves.INVISIBLE_ALPHA)
+        self.assertEqual(levels[1], curves.LOW_ALPHA)
+        self.assertEqual(levels[9], curves.HIGH_ALPHA)
+        self.assertEqual(list(levels), sorted(levels))
+        # More levels near the transparent end than the linear curve gives
+        self.assertLess(levels[5], curves.linear_levels()[5])
+
+    def test_gamma_rejects_non_positive_numbers(self):
+        for gamma in (0, -1, True, "2"):
+            with self.assertRaises(curves.CurveError):
+                curves.gamma_levels(gamma)
+
+    def test_custom_interpolates_between_points(self):
+        self.assertEqual(curves.custom_levels([[0, 1], [9, 255]]),
+                         tuple(round(1 + 254 * level / 9) for level in range(10)))
+
+    def test_custom_extends_the_end_points(self):
+        self.assertEqual(curves.custom_levels([[4, 100]]), (100,) * 10)
+        levels = curves.custom_levels([[2, 50], [6, 90]])
+        self.assertEqual(levels[:3], (50, 50, 50))
+        self.assertEqual(levels[4], 70)
+        self.assertEqual(levels[6:], (90,) * 4)
+
+    def test_custom_rejects_bad_points(self):
+        for points in ([[0, 0]], [[10, 5]], [[1, 5], [1, 6]], [], [[1]], "ab", [[1.5, 20]]):
+            with self.subTest(points=points), self.assertRaises(curves.CurveError):
+                curves.custom_levels(points)
+
+    def test_build_levels_picks_the_curve(self):
+        self.assertEqual(curves.build_levels({}), curves.linear_levels())
+        self.assertEqual(curves.build_levels({'opacity_curve': 'gamma', 'opacity_gamma': 3}),
+                         curves.gamma_levels(3))
+        self.assertEqual(curves.build_levels({'opacity_curve': 'custom', 'opacity_points': [[0, 40]]}),
+                         (40,) * 10)
+        with self.assertRaises(curves.CurveError):
+            curves.build_levels({'opacity_curve': 'cubic'})
+
+    def test_nearest_level(self):
+        levels = curves.linear_levels()
+        self.assertEqual(curves.nearest_level(levels, 255), 9)
+        self.assertEqual(curves.nearest_level(levels, 2), 0)
+        self.assertEqual(curves.nearest_level(levels, levels[4] + 1), 4)
+
+    def test_describe_levels_follows_the_curve(self):
+        self.assertEqual(curves.describe_levels(curves.linear_levels()),
+                         ["0 = 1%, 1 = 4%, 2 = 16%, 3 = 28%, 4 = 40%",
+                          "5 = 52%, 6 = 64%, 7 = 76%, 8 = 88%, 9 = 100%"])
+        self.assertEqual(curves.describe_levels(curves.custom_levels([[0, 128]]), per_line=10),
+                         [", ".join(f"{level} = 50%" for level in range(10))])
+
+
+class CurveSettingsTest(unittest.TestCase):
+
+    def test_invalid_curves_are_rejected(self):
+        for bad in ({'opacity_curve': 'cubic'}, {'opacity_curve': 'gamma', 'opacity_gamma': 0},
+                    {'opacity_curve': 'custom', 'opacity_points': [[3, 300]]},
+                    {'opacity_curve': 'custom', 'opacity_points': []}, {'opacity_gamma': 'steep'}):
+            with self.subTest(settings=bad), self.assertRaises(settings_schema.SettingsError):
+                settings_schema.validate(bad, DEFAULTS)
+
+    def test_matcher_holds_the_compiled_levels(self):
+        settings = settings_schema.validate({'opacity_curve': 'gamma', 'opacity_gamma': 2.2}, DEFAULTS)
+        matcher = settings_schema.ShortcutMatcher.from_settings(settings)
+        self.assertEqual(matcher.levels, curves.gamma_levels(2.2))
+
+
+class WindowLevelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fake = FakeWin32(2)
+        self.first, self.second = list(self.fake.windows)
+        self.app = self.fake.app(settings_file=os.path.join(self.directory.name, "settings.json"))
+        self.app.apply_settings(dict(self.app.shortcuts, opacity_curve='gamma', opacity_gamma=2.2))
+
+    def tearDown(self):
+        self.app.pipeline.stop()
+        self.directory.cleanup()
+
+    def press(self, hwnd, binding):
+        self.fake.foreground = hwnd
+        self.app.on_binding(binding)
+
+    def test_levels_come_from_the_curve(self):
+        self.fake.foreground = self.first
+        self.app.on_hotkey(3)
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        self.assertEqual(self.fake.windows[self.first].layered[1], curves.gamma_levels(2.2)[3])
+        self.assertEqual(self.app.window_targets[self.first], (curves.gamma_levels(2.2)[3], 3))
+
+    def test_level_steps_are_per_window_and_never_read_the_window(self):
+        gamma = curves.gamma_levels(2.2)
+        down = Binding('ctrl+alt+down', 'level_step', -1, 'window')
+        self.press(self.first, Binding('7', 'level', 7, 'window'))
+        self.press(self.second, Binding('3', 'level', 3, 'window'))
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        self.fake.calls.clear()
+        for _ in range(30):
+            self.press(self.first, down)
+        self.app.held_steps.flush()
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        self.assertEqual(self.app.window_level(self.first), 0)
+        self.assertEqual(self.app.window_level(self.second), 3)
+        self.assertEqual(self.fake.windows[self.first].layered[1], gamma[0])
+        self.assertEqual(self.fake.windows[self.second].layered[1], gamma[3])
+        self.assertEqual(self.fake.calls['GetLayeredWindowAttributes'] + self.fake.calls['GetWindowLong'], 0)
+
+    def test_alpha_steps_leave_the_curve(self):
+        self.press(self.first, Binding('5', 'level', 5, 'window'))
+        self.press(self.first, Binding('ctrl+alt+up', 'step', 7, 'window'))
+        alpha, level = self.app.window_targets[self.first]
+        self.assertEqual(alpha, curves.gamma_levels(2.2)[5] + 7)
+        self.assertIsNone(level)
+        self.assertEqual(self.app.window_level(self.first), curves.nearest_level(self.app.matcher.levels, alpha))
+
+
+if __name__ == '__main__':
+    unittest.main()
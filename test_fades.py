@@ -0,0 +1,83 @@
+"""Tests for the fade scheduler and faded opacity changes"""
+import threading
+import time
+import unittest
+
+from fades import Fade, FadeScheduler
+from hotkeys import Binding
+from test_pipeline import wait_for
+from test_transparency import AppTestCase
+
+
+class FadeTest(unittest.TestCase):
+
+    def test_alpha_follows_the_clock(self):
+        fade = Fade(255, 55, started=10.0, duration=2.0)
+        self.assertEqual(fade.alpha_at(10.0), (255, False))
+        self.assertEqual(fade.alpha_at(11.0), (155, False))
+        self.assertEqual(fade.alpha_at(12.0), (55, True))
+        self.assertEqual(fade.alpha_at(50.0), (55, True))
+        self.assertEqual(Fade(255, 55, 10.0, 0).alpha_at(10.0), (55, True))
+
+
+class FadeSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.frames = []
+        self.threads = set()
+        self.scheduler = FadeScheduler(self.apply, fps=200)
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def apply(self, hwnd, alpha, final):
+        self.threads.add(threading.current_thread())
+        self.frames.append((hwnd, alpha, final))
+
+    def test_every_fade_ends_on_its_target(self):
+        for hwnd in range(50):
+            self.scheduler.fade(hwnd, 255, hwnd + 100, 0.05)
+        self.assertTrue(wait_for(lambda: not self.scheduler.active()))
+        finals = {hwnd: alpha for hwnd, alpha, final in self.frames if final}
+        self.assertEqual(finals, {hwnd: hwnd + 100 for hwnd in range(50)})
+        self.assertEqual(self.threads, {self.scheduler.thread})
+
+    def test_new_fade_starts_where_the_running_one_is(self):
+        self.scheduler.fade(1, 255, 0, 60)
+        self.assertTrue(wait_for(lambda: (self.scheduler.current_alpha(1) or 255) < 255))
+        with self.scheduler.cond:
+            current = self.scheduler.current_alpha(1)
+            self.scheduler.fade(1, 255, 100, 0.02)
+            self.assertEqual(self.scheduler.fades[1].start_alpha, current)
+        self.assertTrue(wait_for(lambda: not self.scheduler.active()))
+        self.assertEqual(self.frames[-1], (1, 100, True))
+
+    def test_cancel_stops_where_it_is(self):
+        self.scheduler.fade(1, 255, 0, 60)
+        self.assertTrue(self.scheduler.cancel(1))
+        self.assertFalse(self.scheduler.cancel(1))
+        self.assertIsNone(self.scheduler.current_alpha(1))
+        time.sleep(0.02)
+        self.assertFalse(any(final for _, _, final in self.frames))
+
+
+class FadedOpacityTest(AppTestCase):
+
+    windows = 20
+
+    def test_faded_levels_end_on_the_level(self):
+        self.app.apply_settings(dict(self.app.shortcuts, fade_duration=50))
+        for level in (2, 9):
+            binding = Binding('', 'level', level, 'window')
+            for hwnd in self.hwnds:
+                self.fake.foreground = hwnd
+                self.app.change_window_opacity(binding)
+            self.assertTrue(wait_for(lambda: not self.app.fades.active()))
+            self.assertTrue(self.app.pipeline.wait_idle(5))
+            self.assertEqual({window.layered[1] for window in self.fake.windows.values()},
+                             {self.app.opacity_for_level(level)})
+        self.app.fades.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
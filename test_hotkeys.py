@@ -0,0 +1,271 @@
+"""Tests for the hotkey engine and key bindings"""
+import random
+import threading
+import time
+import unittest
+from unittest import mock
+
+import backends
+import transparency
+from hotkeys import Binding, HotkeyEngine, Keymap, KeymapError, RepeatThrottle, parse_chord
+from settings import ShortcutMatcher
+from simulator import FakeKeyboard, FakeWin32
+from test_transparency import AppTestCase
+
+DIGITS = {'modifier1': 'ctrl', 'modifier2': 'shift', 'modifier3': 'alt'}
+
+
+class EngineTestCase(unittest.TestCase):
+
+    def make_engine(self, settings=DIGITS, **kwargs):
+        self.fired = []
+        self.fake = FakeWin32().install()
+        self.keys = FakeKeyboard(self.fake)
+        matcher = ShortcutMatcher.from_settings(settings)
+        # As the app does: bound keys by scan code, so Shift+5 is still "5",
+        # and the physical modifier state from the backend
+        scan_codes = {self.keys.key_to_scan_codes(key)[0]: key for key in matcher.keymap.keys}
+        self.engine = HotkeyEngine(matcher, self.fired.append, scan_codes=scan_codes,
+                                   is_pressed=backends.Win32Backend().key_down, **kwargs)
+        self.keys.hook(self.engine.on_key, suppress=True)
+        return self.engine
+
+
+class HotkeyEngineTest(EngineTestCase):
+
+    def test_digit_shortcut_fires_and_is_swallowed(self):
+        self.make_engine()
+        self.keys.tap('ctrl+shift+alt+5')
+        self.assertEqual([(binding.action, binding.value) for binding in self.fired], [('level', 5)])
+        self.assertEqual(self.keys.suppressed, {'%': 2})
+
+    def test_other_keys_pass_through(self):
+        self.make_engine()
+        self.keys.tap('shift+5')
+        self.keys.tap('ctrl+alt+5')
+        self.keys.tap('5')
+        self.assertEqual(self.fired, [])
+        self.assertFalse(self.keys.suppressed)
+
+    def test_block_input_off_lets_the_digit_through(self):
+        self.make_engine(dict(DIGITS, block_input=False))
+        self.keys.tap('ctrl+shift+alt+5')
+        self.assertEqual(len(self.fired), 1)
+        self.assertFalse(self.keys.suppressed)
+
+    def test_auto_repeat_only_fires_steps(self):
+        self.make_engine(dict(DIGITS, bindings=[{'keys': 'ctrl+alt+down', 'action': 'step', 'value': -5}]))
+        for chord in ('ctrl+shift+alt+5', 'ctrl+alt+down'):
+            names = chord.split('+')
+            for name in names:
+                self.keys.press(name)
+            self.keys.press(names[-1])
+            self.keys.press(names[-1])
+            for name in reversed(names):
+                self.keys.release(name)
+        self.assertEqual([binding.action for binding in self.fired], ['level', 'step', 'step', 'step'])
+
+    def test_sequences(self):
+        self.make_engine(dict(DIGITS, bindings=[{'keys': 'ctrl+alt+t, 5', 'action': 'alpha', 'value': 77}]))
+        self.keys.tap('ctrl+alt+t, 5')
+        self.assertEqual([binding.value for binding in self.fired], [77])
+        self.keys.tap('5')
+        self.assertEqual(len(self.fired), 1)
+
+    def test_missed_key_up_does_not_leave_a_modifier_stuck(self):
+        self.make_engine()
+        for name in ('ctrl', 'alt'):
+            self.keys.press(name)
+            # Win+L or a secure desktop swallowed the key-up
+            self.keys.release_unseen(name)
+        # The keyboard module builds is_pressed from the same events, so it is stale too
+        self.assertTrue(self.keys.is_pressed('ctrl'))
+        self.keys.tap('shift+5')
+        self.assertEqual(self.fired, [])
+        self.assertFalse(self.keys.suppressed)
+        self.keys.tap('ctrl+shift+alt+5')
+        self.assertEqual(len(self.fired), 1)
+
+    def test_reset_forgets_held_keys(self):
+        engine = self.make_engine()
+        for name in ('ctrl', 'shift', 'alt'):
+            engine.handle_event(name, 'down')
+        engine.reset()
+        engine.handle_event('5', 'down')
+        self.assertEqual(self.fired, [])
+
+
+class RepeatThrottleTest(unittest.TestCase):
+
+    def test_first_action_runs_and_the_rest_merge(self):
+        throttle = RepeatThrottle(interval=60)
+        ran = []
+        for i in range(10):
+            throttle.submit(1, lambda i=i: ran.append(i))
+        throttle.submit(2, lambda: ran.append('other'))
+        self.assertEqual(ran, [0, 'other'])
+        throttle.flush()
+        self.assertEqual(ran, [0, 'other', 9])
+        self.assertEqual(throttle.stats()['merged'], 8)
+
+    def test_pending_action_runs_when_the_interval_ends(self):
+        throttle = RepeatThrottle(interval=0.01)
+        ran = []
+        throttle.submit(1, lambda: ran.append(1))
+        throttle.submit(1, lambda: ran.append(2))
+        deadline = time.monotonic() + 5
+        while len(ran) < 2 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.assertEqual(ran, [1, 2])
+
+    def test_one_thread_ends_every_interval(self):
+        throttle = RepeatThrottle(interval=0.01)
+        threads = {}
+        for hwnd in range(20):
+            throttle.submit(hwnd, lambda: None)
+            throttle.submit(hwnd, lambda hwnd=hwnd: threads.setdefault(hwnd, threading.current_thread()))
+        deadline = time.monotonic() + 5
+        while (len(threads) < 20 or throttle.stats()['throttled_windows']) and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.assertEqual(set(threads.values()), {throttle.thread})
+        self.assertEqual(throttle.stats()['throttled_windows'], 0)
+        # Idle, the thread waits for the next window instead of exiting
+        self.assertTrue(throttle.thread.is_alive())
+        throttle.stop()
+        throttle.thread.join(5)
+        self.assertFalse(throttle.thread.is_alive())
+
+    def test_cancel_drops_the_pending_action(self):
+        throttle = RepeatThrottle(interval=60)
+        ran = []
+        throttle.submit(1, lambda: ran.append(1))
+        throttle.submit(1, lambda: ran.append(2))
+        throttle.cancel(1)
+        throttle.flush()
+        self.assertEqual(ran, [1])
+
+
+class HeldStepTest(AppTestCase):
+
+    windows = 1
+
+    def setUp(self):
+        super().setUp()
+        self.app.held_steps.interval = 60
+        self.app.apply_settings(dict(self.app.shortcuts, bindings=[
+            {'keys': 'ctrl+alt+down', 'action': 'step', 'value': -5}]))
+        self.engine = self.app.create_hotkey_engine()
+        self.hwnd = self.fake.foreground = self.hwnds[0]
+
+    def hold(self, key, repeats):
+        for name in ('ctrl', 'alt'):
+            self.fake.keys_down.add(self.fake.key_code(name))
+            self.engine.handle_event(name, 'down')
+        for _ in range(repeats):
+            self.engine.handle_event(key, 'down')
+        for name in (key, 'alt', 'ctrl'):
+            self.fake.keys_down.discard(self.fake.key_code(name))
+            self.engine.handle_event(name, 'up')
+
+    def test_held_step_writes_once_per_interval(self):
+        self.hold('down', 40)
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        self.assertEqual(self.fake.windows[self.hwnd].layered[1], 250)
+        self.app.held_steps.flush()
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        self.assertEqual(self.fake.windows[self.hwnd].layered[1], 55)
+        self.assertEqual(self.fake.calls['SetLayeredWindowAttributes'], 2)
+        self.assertEqual(self.app.window_targets[self.hwnd], (55, None))
+
+    def test_level_replaces_a_pending_step(self):
+        self.hold('down', 3)
+        self.app.on_hotkey(7)
+        self.app.held_steps.flush()
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        self.assertEqual(self.fake.windows[self.hwnd].layered[1], self.app.opacity_for_level(7))
+
+
+class ListenerTest(AppTestCase):
+
+    windows = 1
+
+    def test_digits_are_swallowed_and_modifiers_pass(self):
+        hwnd = self.hwnds[0]
+        keys = FakeKeyboard(self.fake)
+        with mock.patch.object(transparency, 'keyboard', keys, create=True), \
+                mock.patch.object(transparency, 'KEYBOARD_AVAILABLE', True):
+            listener = threading.Thread(target=self.app.keyboard_listener, daemon=True)
+            listener.start()
+            self.assertTrue(keys.hooked.wait(5))
+            for level in (3, 7):
+                keys.tap(f'ctrl+shift+alt+{level}')
+                self.assertTrue(self.app.pipeline.wait_idle(5))
+                self.assertEqual(self.fake.windows[hwnd].layered[1], self.app.opacity_for_level(level))
+            self.app.stopped.set()
+            listener.join(5)
+        # Down and up of each digit, reported by its shifted symbol
+        self.assertEqual(sum(keys.suppressed.values()), 4)
+        self.assertEqual(set(keys.delivered), {'ctrl', 'shift', 'alt'})
+        self.assertFalse(keys.hooked.is_set())
+
+
+class KeymapTest(unittest.TestCase):
+
+    def test_conflicting_bindings_are_rejected(self):
+        for bindings in ([Binding('ctrl+t', 'level', 1, 'window'), Binding('ctrl+t, 5', 'level', 2, 'window')],
+                         [Binding('ctrl+alt', 'level', 1, 'window')],
+                         [Binding('ctrl+q', 'level', 12, 'window')],
+                         [Binding('ctrl+q', 'alpha', 0, 'window')],
+                         [Binding('ctrl+q', 'step', 5, 'desktop')],
+                         [Binding('ctrl++', 'level', 1, 'window')]):
+            with self.subTest(bindings=bindings), self.assertRaises(KeymapError):
+                Keymap(bindings)
+
+    def test_random_bindings_fire_when_pressed(self):
+        rng = random.Random(3)
+        modifiers = ['ctrl', 'shift', 'alt', 'win']
+        keys = list('abcdefghijklmnopqrstuvwxyz0123456789') + [f"f{i}" for i in range(1, 13)]
+        keymap = Keymap()
+        bindings = []
+        while len(bindings) < 300:
+            strokes = []
+            for _ in range(2 if rng.random() < 0.2 else 1):
+                held = rng.sample(modifiers, rng.randint(1 if not strokes else 0, 3))
+                strokes.append('+'.join(held + [rng.choice(keys)]))
+            binding = Binding(', '.join(strokes), 'alpha', rng.randint(1, 255), 'window')
+            try:
+                keymap.add(binding)
+            except KeymapError:
+                continue
+            bindings.append(binding)
+        def strokes(binding):
+            return tuple((frozenset(held), key) for held, key in parse_chord(binding.keys))
+
+        # A later binding for the same keys, in any modifier order, replaces an earlier one
+        live = {strokes(binding): binding for binding in bindings}
+        fired = []
+        engine = HotkeyEngine(ShortcutMatcher.from_settings({'bindings': [b._asdict() for b in bindings]}),
+                              fired.append)
+        for _ in range(2000):
+            binding = rng.choice(bindings)
+            for held, key in parse_chord(binding.keys):
+                for name in held:
+                    engine.handle_event(name, 'down')
+                engine.handle_event(key, 'down')
+                engine.handle_event(key, 'up')
+                for name in reversed(held):
+                    engine.handle_event(name, 'up')
+            # An unbound key between presses
+            engine.handle_event('space', 'down')
+            engine.handle_event('space', 'up')
+            self.assertEqual(fired[-1:], [live[strokes(binding)]])
+        self.assertEqual(len(fired), 2000)
+
+    def test_later_binding_replaces_an_earlier_one(self):
+        keymap = Keymap([Binding('ctrl+q', 'level', 1, 'window'), Binding('ctrl+q', 'level', 2, 'window')])
+        self.assertEqual(len(keymap), 1)
+        self.assertEqual(keymap.root[(keymap.mask(('ctrl',)), 'q')].value, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
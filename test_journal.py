@@ -0,0 +1,176 @@
+"""Tests for the opacity journal and crash recovery"""
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from journal import OpacityJournal, load_journal
+from simulator import FakeWin32
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "journal.jsonl")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_records_survive_a_reload(self):
+        journal = OpacityJournal(self.path)
+        journal.open()
+        journal.remember(1, [0, None], 100, 'Notepad')
+        journal.remember(2, [0, None], 200, 'Edit')
+        journal.set(1, 50)
+        journal.set(2, 60)
+        journal.forget(2)
+        journal.set(3, 70)
+        self.assertTrue(journal.flush(5))
+        journal.close()
+
+        entries, last_seq, skipped = load_journal(self.path)
+        self.assertEqual(entries, {1: {'original': [0, None], 'pid': 100, 'class': 'Notepad', 'alpha': 50}})
+        # The set for the unknown window 3 was never written
+        self.assertEqual(last_seq, 5)
+        self.assertEqual(skipped, 0)
+
+    def test_group_commit_and_compaction(self):
+        journal = OpacityJournal(self.path, compact_every=100)
+        journal.open()
+        for hwnd in range(10):
+            journal.remember(hwnd, [0, None])
+        for i in range(1000):
+            journal.set(i % 10, i % 255 + 1)
+        self.assertTrue(journal.flush(10))
+        stats = journal.stats()
+        journal.close()
+
+        self.assertLess(stats['commits'], 1010)
+        self.assertGreater(stats['compactions'], 0)
+        entries, last_seq, _ = load_journal(self.path)
+        self.assertEqual(last_seq, 1010)
+        self.assertEqual({hwnd: entry['alpha'] for hwnd, entry in entries.items()},
+                         {hwnd: (990 + hwnd) % 255 + 1 for hwnd in range(10)})
+
+    def test_sequence_survives_an_empty_compaction(self):
+        journal = OpacityJournal(self.path, compact_every=3)
+        journal.open()
+        journal.remember(1, [0, None])
+        journal.set(1, 5)
+        journal.clear()
+        self.assertTrue(journal.flush(5))
+        journal.close()
+        entries, last_seq, _ = load_journal(self.path)
+        self.assertEqual((entries, last_seq), ({}, 3))
+
+    def test_torn_last_line_is_skipped(self):
+        journal = OpacityJournal(self.path)
+        journal.open()
+        journal.remember(1, [0, None])
+        journal.set(1, 40)
+        self.assertTrue(journal.flush(5))
+        journal.close()
+        with open(self.path, 'a') as f:
+            f.write('{"op": "set", "hwnd": 1, "alp')
+        entries, last_seq, skipped = load_journal(self.path)
+        self.assertEqual(entries[1]['alpha'], 40)
+        self.assertEqual((last_seq, skipped), (2, 1))
+
+    def test_missing_file_is_empty(self):
+        self.assertEqual(load_journal(self.path), ({}, 0, 0))
+
+
+class RecoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_file = os.path.join(self.directory.name, "transparent_windows_settings.json")
+        self.journal_file = os.path.join(self.directory.name, "transparent_windows_journal.jsonl")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_restart_recovers_changed_windows(self):
+        fake = FakeWin32(5)
+        hwnds = list(fake.windows)
+        app = fake.app(settings_file=self.settings_file)
+        app.start_journal('keep')
+        for hwnd in hwnds[:3]:
+            app.apply_opacity(hwnd, 90)
+        self.assertTrue(app.journal.flush(5))
+        app.journal.close()
+        app.pipeline.stop()
+
+        # Same windows after a crash, except one whose handle another process reused
+        fake.windows[hwnds[2]].pid = 4242
+        app = fake.app(settings_file=self.settings_file)
+        app.start_journal('reset')
+        self.assertFalse(fake.windows[hwnds[0]].ex_style & fake.WS_EX_LAYERED)
+        self.assertFalse(fake.windows[hwnds[1]].ex_style & fake.WS_EX_LAYERED)
+        self.assertEqual(fake.windows[hwnds[2]].layered[1], 90)
+        self.assertEqual(len(app.modified_windows), 0)
+        app.journal.close()
+        app.pipeline.stop()
+        self.assertEqual(load_journal(self.journal_file)[0], {})
+
+    def test_keep_leaves_windows_for_reset_all(self):
+        fake = FakeWin32(2)
+        hwnd = next(iter(fake.windows))
+        app = fake.app(settings_file=self.settings_file)
+        app.start_journal('keep')
+        app.apply_opacity(hwnd, 90)
+        self.assertTrue(app.journal.flush(5))
+        app.journal.close()
+        app.pipeline.stop()
+
+        app = fake.app(settings_file=self.settings_file)
+        app.start_journal('keep')
+        self.assertEqual(fake.windows[hwnd].layered[1], 90)
+        self.assertIn(hwnd, app.modified_windows)
+        self.assertEqual(app.restore_modified_windows(), 1)
+        self.assertFalse(fake.windows[hwnd].ex_style & fake.WS_EX_LAYERED)
+        app.journal.close()
+        app.pipeline.stop()
+
+    def test_unwritable_journal_does_not_stop_the_app(self):
+        fake = FakeWin32(1)
+        app = fake.app(settings_file=os.path.join(self.directory.name, "missing", "settings.json"))
+        with self.assertLogs('transparent_windows', 'WARNING'):
+            app.start_journal('ask')
+        self.assertIsNone(app.journal)
+        app.apply_opacity(next(iter(fake.windows)), 90)
+        self.assertEqual(app.restore_modified_windows(), 1)
+        app.pipeline.stop()
+
+    @unittest.skipUnless(hasattr(signal, 'SIGKILL'), "needs SIGKILL")
+    def test_killed_writer_loses_no_committed_record(self):
+        child = subprocess.Popen(
+            [sys.executable, '-c', 'import sys, simulator; simulator.journal_writer(sys.argv[1])',
+             self.directory.name],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.PIPE, text=True)
+        committed = 0
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            line = child.stdout.readline()
+            if not line:
+                break
+            committed = int(line)
+        os.kill(child.pid, signal.SIGKILL)
+        child.wait()
+        # Lines the child printed before it died are also on disk
+        for line in child.stdout.read().splitlines():
+            committed = int(line) if line.strip().isdigit() else committed
+        child.stdout.close()
+        self.assertGreater(committed, 0)
+
+        entries, last_seq, skipped = load_journal(self.journal_file)
+        self.assertGreaterEqual(last_seq, committed)
+        self.assertLessEqual(skipped, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
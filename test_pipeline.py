@@ -0,0 +1,112 @@
+"""Tests for the apply pipeline with slow and hung windows"""
+import time
+import unittest
+
+from pipeline import ApplyPipeline
+from simulator import FakeWin32
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class PipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeWin32(6)
+        self.hwnds = list(self.fake.windows)
+        self.app = self.fake.app()
+
+    def tearDown(self):
+        self.fake.unhang.set()
+        self.app.pipeline.stop()
+
+    def use_pipeline(self, **kwargs):
+        self.app.pipeline.stop()
+        self.app.pipeline = ApplyPipeline(**kwargs)
+        self.app.pipeline.start()
+        return self.app.pipeline
+
+    def alpha(self, hwnd):
+        return self.fake.windows[hwnd].layered[1]
+
+    def hang(self, hwnd):
+        """Start a write that blocks until fake.unhang is set"""
+        self.fake.windows[hwnd].latency = None
+        self.app.set_window_opacity(hwnd, 100)
+        self.assertTrue(wait_for(lambda: self.app.pipeline.stats()['in_flight'] == 1))
+
+    def test_hung_window_is_marked_and_its_writes_dropped(self):
+        pipeline = self.use_pipeline(workers=2, timeout=0.05)
+        self.app.metrics.enabled = True
+        hung = self.hwnds[0]
+        self.hang(hung)
+        self.assertTrue(wait_for(lambda: pipeline.stats()['hung'] == 1))
+
+        self.app.set_window_opacity(hung, 120)
+        self.app.set_window_opacity(hung, 140)
+        stats = pipeline.stats()
+        self.assertEqual((stats['timeouts'], stats['dropped'], stats['queue_depth']), (1, 2, 0))
+        self.assertEqual(self.app.metrics.counters['applies_dropped'], 2)
+
+    def test_replacement_worker_keeps_other_windows_applied(self):
+        pipeline = self.use_pipeline(workers=1, timeout=0.05)
+        self.hang(self.hwnds[0])
+        for hwnd in self.hwnds[1:]:
+            self.app.set_window_opacity(hwnd, 90)
+        self.assertTrue(pipeline.wait_idle(5))
+        self.assertTrue(all(self.alpha(hwnd) == 90 for hwnd in self.hwnds[1:]))
+        stats = pipeline.stats()
+        self.assertEqual((stats['hung'], stats['workers'], stats['completed']), (1, 2, len(self.hwnds) - 1))
+
+    def test_writes_to_one_window_are_coalesced(self):
+        pipeline = self.use_pipeline(workers=2, timeout=5)
+        hwnd = self.hwnds[0]
+        self.fake.windows[hwnd].latency = 0.05
+        self.app.set_window_opacity(hwnd, 50)
+        self.assertTrue(wait_for(lambda: pipeline.stats()['in_flight'] == 1))
+        for alpha in (60, 70, 80):
+            self.app.set_window_opacity(hwnd, alpha)
+        self.assertTrue(pipeline.wait_idle(5))
+        self.assertEqual(self.alpha(hwnd), 80)
+        stats = pipeline.stats()
+        self.assertEqual((stats['submitted'], stats['coalesced'], stats['completed']), (4, 2, 2))
+
+    def test_full_queue_drops_and_reports_its_depth(self):
+        pipeline = self.use_pipeline(workers=1, max_pending=3, timeout=60)
+        self.hang(self.hwnds[0])
+        for hwnd in self.hwnds[1:]:
+            self.app.set_window_opacity(hwnd, 90)
+        stats = pipeline.stats()
+        self.assertEqual((stats['queue_depth'], stats['in_flight'], stats['dropped']), (3, 1, 2))
+
+        self.fake.unhang.set()
+        self.assertTrue(pipeline.wait_idle(5))
+        stats = pipeline.stats()
+        self.assertEqual((stats['queue_depth'], stats['completed'], stats['dropped']), (0, 4, 2))
+        self.assertEqual([self.alpha(hwnd) for hwnd in self.hwnds[1:]], [90, 90, 90, 255, 255])
+
+    def test_unhang_releases_the_window_and_retires_the_replacement(self):
+        pipeline = self.use_pipeline(workers=2, timeout=0.05)
+        hung = self.hwnds[0]
+        self.hang(hung)
+        self.assertTrue(wait_for(lambda: pipeline.stats()['workers'] == 3))
+
+        self.fake.windows[hung].latency = 0
+        self.fake.unhang.set()
+        self.assertTrue(wait_for(lambda: pipeline.stats()['hung'] == 0))
+        self.assertTrue(pipeline.wait_idle(5))
+        self.app.set_window_opacity(hung, 70)
+        self.assertTrue(pipeline.wait_idle(5))
+        self.assertEqual(self.alpha(hung), 70)
+        stats = pipeline.stats()
+        self.assertEqual((stats['workers'], stats['in_flight'], stats['failed']), (2, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""Tests for per-application opacity rules"""
+import json
+import os
+import random
+import unittest
+
+import transparency
+from rules import OpacityRule, RuleMatcher, load_rules, required_literal
+from test_transparency import AppTestCase
+
+
+def linear_match(rules, exe, window_class, title):
+    """The first rule in file order that matches, by checking them all"""
+    return next((rule for rule in rules if rule.matches(exe.lower(), window_class.lower(), title)), None)
+
+
+class RequiredLiteralTest(unittest.TestCase):
+
+    def test_literals(self):
+        self.assertEqual(required_literal("YouTube - .*"), "youtube - ")
+        self.assertEqual(required_literal("ab?cdef"), "cdef")
+        self.assertEqual(required_literal("foo|barbaz"), "")
+        self.assertEqual(required_literal("(group)x[abc]yz"), "yz")
+
+
+class RuleMatcherTest(unittest.TestCase):
+
+    def test_earliest_rule_wins(self):
+        rules = [OpacityRule(0, 100, title="a.c"), OpacityRule(1, 110, exe="code.exe"),
+                 OpacityRule(2, 120, title="Visual Studio Code"), OpacityRule(3, 130, window_class="Notepad"),
+                 OpacityRule(4, 140, title="x")]
+        matcher = RuleMatcher(rules)
+        for sample in (("code.exe", "Chrome", "abc - Visual Studio Code"), ("code.exe", "Chrome", "Visual Studio Code"),
+                       ("other.exe", "Notepad", "Untitled"), ("other.exe", "Other", "x"),
+                       ("other.exe", "Other", "nothing")):
+            with self.subTest(sample=sample):
+                self.assertIs(matcher.match(*sample), linear_match(rules, *sample))
+
+    def test_patterns_that_cannot_be_combined(self):
+        rules = [OpacityRule(0, 100, title="(?i)a.b"), OpacityRule(1, 110, title="(?P<n>x.)"),
+                 OpacityRule(2, 120, title="(?P<n>y.)"), OpacityRule(3, 130, title=r"(q)\1"),
+                 OpacityRule(4, 140, title="z.z")]
+        matcher = RuleMatcher(rules)
+        self.assertEqual(list(matcher.title_rules), ["_rule4"])
+        for title, index in (("A-B", 0), ("x1", 1), ("y1", 2), ("qq", 3), ("q", None), ("zoz", 4), ("", None)):
+            with self.subTest(title=title):
+                rule = matcher.match(None, None, title)
+                self.assertEqual(rule and rule.index, index)
+
+    def test_random_rules_match_a_linear_scan(self):
+        rng = random.Random(3)
+        specs = []
+        for i in range(200):
+            specs.append((200, {'exe': f"app{i}.exe", 'title': f"project{i}" if i % 10 == 0 else None}))
+            specs.append((180, {'window_class': f"WindowClass{i}"}))
+            specs.append((128, {'title': f"document{i}\\b"}))
+        rng.shuffle(specs)
+        rules = [OpacityRule(index, alpha, **criteria) for index, (alpha, criteria) in enumerate(specs)]
+        matcher = RuleMatcher(rules)
+        for _ in range(2000):
+            sample = (f"App{rng.randrange(400)}.exe", f"WindowClass{rng.randrange(400)}",
+                      f"document{rng.randrange(400)} - project{rng.randrange(200)} - Editor")
+            self.assertIs(matcher.match(*sample), linear_match(rules, *sample), sample)
+
+
+class LoadRulesTest(AppTestCase):
+
+    def write_rules(self, rules):
+        with open(self.app.rules_file, 'w') as f:
+            json.dump({'rules': rules}, f)
+
+    def test_invalid_rules_are_skipped(self):
+        self.write_rules([{'title': '(unclosed', 'alpha': 100}, {'exe': 'a.exe'}, {'alpha': 100},
+                          {'exe': 'a.exe', 'alpha': 300}, {'class': 'Notepad', 'alpha': 200}])
+        matcher = load_rules(self.app.rules_file)
+        self.assertEqual(len(matcher), 1)
+        self.assertEqual(matcher.match(None, 'notepad', '').alpha, 200)
+
+    def test_inline_flags_do_not_stop_the_app(self):
+        self.write_rules([{'title': '(?i)a.b', 'alpha': 100}, {'title': '(?P<n>x.)', 'alpha': 110},
+                          {'title': '(?P<n>y.)', 'alpha': 120}])
+        app = self.fake.app(settings_file=self.app.settings_file)
+        app.pipeline.stop()
+        self.assertEqual(len(app.rules), 3)
+        self.assertEqual(app.rules.match(None, None, 'A_B').alpha, 100)
+
+    def test_exe_name_is_looked_up_again_after_pid_reuse(self):
+        self.write_rules([{'exe': 'a.exe', 'alpha': 100}])
+        self.app.reload_rules(self.app.rules_file)
+        names = {1000: 'a.exe'}
+        self.app.backend.process_name = names.get
+        self.app.build_window_index()
+        for hwnd in self.hwnds:
+            self.app.on_window_event(transparency.EVENT_OBJECT_SHOW, hwnd)
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        self.assertEqual(self.fake.windows[self.hwnds[0]].layered[1], 100)
+
+        for hwnd in self.hwnds:
+            self.fake.destroy_window(hwnd)
+            self.app.on_window_event(transparency.EVENT_OBJECT_DESTROY, hwnd)
+        self.assertEqual(self.app.process_names, {})
+        names[1000] = 'b.exe'
+        hwnd = self.fake.create_window(pid=1000)
+        self.app.on_window_event(transparency.EVENT_OBJECT_SHOW, hwnd)
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        self.assertEqual(self.fake.windows[hwnd].layered[1], 255)
+
+    def test_missing_file_has_no_rules(self):
+        self.assertFalse(os.path.exists(self.app.rules_file))
+        self.assertEqual(len(load_rules(self.app.rules_file)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
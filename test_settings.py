@@ -0,0 +1,109 @@
+"""Tests for settings validation, atomic writes and live reload"""
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import settings as settings_schema
+from settings import FileWatcher, SettingsError, atomic_write_json
+from simulator import FakeWin32
+
+DEFAULTS = {'modifier1': 'ctrl', 'modifier2': 'shift', 'modifier3': 'alt', 'fade_duration': 0}
+
+
+class ValidateTest(unittest.TestCase):
+
+    def test_merges_over_defaults_and_stamps_the_version(self):
+        settings = settings_schema.validate({'modifier3': 'win'}, DEFAULTS)
+        self.assertEqual(settings['modifier1'], 'ctrl')
+        self.assertEqual(settings['modifier3'], 'win')
+        self.assertEqual(settings['version'], settings_schema.SCHEMA_VERSION)
+
+    def test_rejects_wrong_types_and_ranges(self):
+        for bad in ([], {'modifier1': 42}, {'block_input': 'yes'}, {'fade_duration': True},
+                    {'fade_duration': -1}, {'auto_dim_alpha': 0}, {'hotkey_target': 'mouse'},
+                    {'hotkey_scope': 'desktop'}, {'version': 99},
+                    {'bindings': [{'keys': 'ctrl+q', 'action': 'explode', 'value': 1}]}):
+            with self.subTest(settings=bad), self.assertRaises(SettingsError):
+                settings_schema.validate(bad, DEFAULTS)
+
+
+class AtomicWriteTest(unittest.TestCase):
+
+    def test_replaces_the_file_and_leaves_no_temp_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "settings.json")
+            atomic_write_json(path, {'a': 1})
+            atomic_write_json(path, {'a': 2})
+            with open(path) as f:
+                self.assertEqual(json.load(f), {'a': 2})
+            self.assertEqual(os.listdir(directory), ["settings.json"])
+
+
+class FileWatcherTest(unittest.TestCase):
+
+    def test_reports_a_change_once_it_settles(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "settings.json")
+            atomic_write_json(path, {})
+            changed = []
+            watcher = FileWatcher(interval=0.01, debounce=0.05)
+            watcher.watch(path, changed.append)
+            atomic_write_json(path, {'a': 1, 'padding': 'x'})
+            self.assertEqual(watcher.poll(), [])
+            time.sleep(0.06)
+            self.assertEqual(watcher.poll(), [path])
+            self.assertEqual(watcher.poll(), [])
+            self.assertEqual(changed, [path])
+
+    def test_ignores_our_own_writes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "settings.json")
+            watcher = FileWatcher(interval=0.01, debounce=0)
+            watcher.watch(path, lambda path: None)
+            atomic_write_json(path, {})
+            watcher.ignore_current(path)
+            watcher.poll()
+            self.assertEqual(watcher.poll(), [])
+
+
+class LiveReloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_file = os.path.join(self.directory.name, "transparent_windows_settings.json")
+        self.app = FakeWin32(1).app(settings_file=self.settings_file)
+
+    def tearDown(self):
+        self.app.pipeline.stop()
+        self.directory.cleanup()
+
+    def test_reload_swaps_in_the_new_matcher(self):
+        atomic_write_json(self.settings_file, dict(self.app.shortcuts, modifier3='win'))
+        self.app.reload_settings(self.settings_file)
+        self.assertEqual(self.app.shortcuts['modifier3'], 'win')
+        keymap = self.app.matcher.keymap
+        self.assertIn((keymap.mask(('ctrl', 'shift', 'win')), '5'), keymap.root)
+        self.assertNotIn((keymap.mask(('ctrl', 'shift', 'alt')), '5'), keymap.root)
+
+    def test_invalid_file_keeps_the_current_settings(self):
+        current = self.app.matcher
+        for text in ('{"modifier1": 42', '{"modifier1": 42}', '{"fade_duration": -5}'):
+            with open(self.settings_file, 'w') as f:
+                f.write(text)
+            self.app.reload_settings(self.settings_file)
+            self.assertIs(self.app.matcher, current)
+
+    def test_save_settings_writes_and_applies(self):
+        self.assertTrue(self.app.save_settings(dict(self.app.shortcuts, fade_duration=150)))
+        self.assertEqual(self.app.matcher.fade_duration, 0.15)
+        with open(self.settings_file) as f:
+            self.assertEqual(json.load(f)['fade_duration'], 150)
+        self.assertEqual(self.app.load_settings(), self.app.shortcuts)
+        self.assertFalse(self.app.save_settings(dict(self.app.shortcuts, fade_duration=-1)))
+        self.assertEqual(self.app.matcher.fade_duration, 0.15)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+"""Tests for the spatial window index against a scan of every window"""
+import random
+import unittest
+
+from spatial import WindowIndex, rect_centre
+
+
+class BruteForceIndex:
+    """The same queries answered by checking every window, stacking order in a list"""
+
+    def __init__(self):
+        self.rects = {}
+        self.order = []  # bottom to top
+
+    def update(self, hwnd, rect):
+        left, top, right, bottom = rect
+        if right <= left or bottom <= top:
+            self.remove(hwnd)
+        elif hwnd in self.rects:
+            self.rects[hwnd] = rect
+        else:
+            self.rects[hwnd] = rect
+            self.order.append(hwnd)
+
+    def remove(self, hwnd):
+        if self.rects.pop(hwnd, None) is not None:
+            self.order.remove(hwnd)
+
+    def raise_window(self, hwnd):
+        if hwnd in self.rects:
+            self.order.remove(hwnd)
+            self.order.append(hwnd)
+
+    def topmost_first(self, hwnds):
+        return [hwnd for hwnd in reversed(self.order) if hwnd in hwnds]
+
+    def window_at(self, x, y):
+        for hwnd in reversed(self.order):
+            left, top, right, bottom = self.rects[hwnd]
+            if left <= x < right and top <= y < bottom:
+                return hwnd
+        return None
+
+    def intersecting(self, rect):
+        left, top, right, bottom = rect
+        if right <= left or bottom <= top:
+            return []
+        return self.topmost_first({hwnd for hwnd, (l, t, r, b) in self.rects.items()
+                                   if l < right and left < r and t < bottom and top < b})
+
+    def centred_in(self, rect):
+        left, top, right, bottom = rect
+        centres = {hwnd: rect_centre(window) for hwnd, window in self.rects.items()}
+        return self.topmost_first({hwnd for hwnd, (x, y) in centres.items()
+                                   if left <= x < right and top <= y < bottom})
+
+
+class WindowIndexTest(unittest.TestCase):
+
+    # Small cells so most windows span several, and a low oversized limit
+    cell_size = 64
+    max_cells = 40
+
+    def setUp(self):
+        self.rng = random.Random(14)
+        self.index = WindowIndex(cell_size=self.cell_size, max_cells=self.max_cells)
+        self.model = BruteForceIndex()
+
+    def random_rect(self):
+        rng = self.rng
+        left, top = rng.randrange(-300, 1500), rng.randrange(-300, 1000)
+        shape = rng.random()
+        if shape < 0.05:
+            # Empty or inverted, removes the window
+            return left, top, left - rng.randrange(0, 20), top + rng.randrange(0, 20)
+        if shape < 0.15:
+            # Covers more than max_cells cells
+            return left, top, left + rng.randrange(600, 2000), top + rng.randrange(600, 2000)
+        if shape < 0.3:
+            # Exactly on cell boundaries
+            size = self.cell_size
+            return (left // size * size, top // size * size,
+                    (left // size + rng.randrange(1, 4)) * size, (top // size + rng.randrange(1, 4)) * size)
+        return left, top, left + rng.randrange(1, 400), top + rng.randrange(1, 300)
+
+    def random_point(self):
+        if self.rng.random() < 0.3:
+            # On or next to a cell edge
+            size = self.cell_size
+            return (self.rng.randrange(-5, 25) * size + self.rng.choice((-1, 0, 1)),
+                    self.rng.randrange(-5, 17) * size + self.rng.choice((-1, 0, 1)))
+        return self.rng.randrange(-400, 1800), self.rng.randrange(-400, 1200)
+
+    def both(self, method, *args):
+        getattr(self.index, method)(*args)
+        getattr(self.model, method)(*args)
+
+    def check_queries(self):
+        self.assertEqual(len(self.index), len(self.model.rects))
+        for _ in range(20):
+            x, y = self.random_point()
+            self.assertEqual(self.index.window_at(x, y), self.model.window_at(x, y), (x, y))
+        for _ in range(5):
+            rect = self.random_rect()
+            self.assertEqual(self.index.intersecting(rect), self.model.intersecting(rect), rect)
+            self.assertEqual(self.index.centred_in(rect), self.model.centred_in(rect), rect)
+
+    def test_random_operations_match_a_scan(self):
+        hwnds = list(range(4, 4 * 200, 4))
+        for step in range(3000):
+            hwnd = self.rng.choice(hwnds)
+            action = self.rng.random()
+            if action < 0.5:
+                self.both('update', hwnd, self.random_rect())
+            elif action < 0.6:
+                self.both('remove', hwnd)
+            else:
+                self.both('raise_window', hwnd)
+            if step % 25 == 0:
+                self.check_queries()
+        self.check_queries()
+        for hwnd, rect in self.model.rects.items():
+            self.assertEqual(self.index.rect(hwnd), rect)
+
+    def test_load_is_topmost_first(self):
+        windows = [(hwnd, self.random_rect()) for hwnd in range(4, 4 * 300, 4)]
+        self.index.load(windows)
+        for hwnd, rect in reversed(windows):
+            self.model.update(hwnd, rect)
+        self.check_queries()
+
+        self.index.clear()
+        self.assertEqual(len(self.index), 0)
+        self.assertIsNone(self.index.window_at(10, 10))
+        self.assertEqual(self.index.intersecting((-10000, -10000, 10000, 10000)), [])
+
+    def test_moving_across_cells_leaves_nothing_behind(self):
+        self.index.update(4, (0, 0, 200, 200))
+        self.index.update(4, (1000, 1000, 1010, 1010))
+        self.assertIsNone(self.index.window_at(100, 100))
+        self.assertEqual(self.index.window_at(1005, 1005), 4)
+        self.index.update(4, (0, 0, 5000, 5000))
+        self.index.update(4, (10, 10, 20, 20))
+        self.assertEqual(self.index.oversized, set())
+        self.assertEqual(self.index.intersecting((100, 100, 4000, 4000)), [])
+        self.index.remove(4)
+        self.assertEqual(self.index.cells, {})
+
+    def test_right_and_bottom_edges_are_exclusive(self):
+        self.index.update(4, (0, 0, 64, 64))
+        self.assertEqual(self.index.window_at(63, 63), 4)
+        self.assertIsNone(self.index.window_at(64, 0))
+        self.assertIsNone(self.index.window_at(0, 64))
+        self.assertEqual(self.index.intersecting((64, 0, 128, 64)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+"""Tests for TransparentWindowsApp running on the simulated window manager"""
+import io
+import json
+import logging
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+import transparency
+from hotkeys import Binding
+from instrumentation import Histogram, Metrics, setup_logging, stop_logging
+from simulator import FakeKeyboard, FakeWin32
+
+
+class AppTestCase(unittest.TestCase):
+    """Runs an app over a FakeWin32 with its settings in a temporary directory"""
+
+    windows = 10
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fake = FakeWin32(self.windows)
+        self.hwnds = list(self.fake.windows)
+        self.app = self.fake.app(settings_file=os.path.join(self.directory.name, "transparent_windows_settings.json"))
+
+    def tearDown(self):
+        self.app.pipeline.stop()
+        self.directory.cleanup()
+
+    def press(self, hwnd, num):
+        self.fake.foreground = hwnd
+        self.app.on_hotkey(num)
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+
+
+class ResetTest(AppTestCase):
+
+    def test_reset_restores_only_the_windows_we_changed(self):
+        touched = self.hwnds[:4]
+        for hwnd in touched:
+            self.press(hwnd, 5)
+        self.fake.destroy_window(touched[0])
+        self.fake.calls.clear()
+
+        self.assertEqual(self.app.restore_modified_windows(), 3)
+        self.assertEqual(self.fake.calls['EnumWindows'], 0)
+        self.assertFalse(any(window.ex_style & self.fake.WS_EX_LAYERED for window in self.fake.windows.values()))
+        self.assertEqual(len(self.app.modified_windows), 0)
+        self.assertEqual(self.app.window_targets, {})
+
+    def test_reset_keeps_windows_that_were_layered_before(self):
+        hwnd = self.hwnds[0]
+        self.fake.windows[hwnd].ex_style = self.fake.WS_EX_LAYERED
+        self.fake.windows[hwnd].layered = (0, 200, self.fake.LWA_ALPHA)
+        self.press(hwnd, 1)
+        self.app.restore_modified_windows()
+        self.assertTrue(self.fake.windows[hwnd].ex_style & self.fake.WS_EX_LAYERED)
+        self.assertEqual(self.fake.windows[hwnd].layered[1], 200)
+
+    def test_unchanged_alpha_is_not_written_again(self):
+        hwnd = self.hwnds[0]
+        self.press(hwnd, 5)
+        writes = self.fake.calls['SetLayeredWindowAttributes']
+        self.press(hwnd, 5)
+        self.assertEqual(self.fake.calls['SetLayeredWindowAttributes'], writes)
+
+
+class LargeDesktopResetTest(AppTestCase):
+
+    windows = 10000
+
+    def test_reset_restores_the_modified_windows_without_enumerating(self):
+        touched = self.hwnds[::200]
+        for hwnd in touched:
+            self.app.set_window_opacity(hwnd, 128)
+        self.assertTrue(self.app.pipeline.wait_idle(5))
+        modified = len(self.app.modified_windows)
+        self.assertEqual(modified, len(touched))
+        self.fake.calls.clear()
+
+        self.assertEqual(self.app.restore_modified_windows(), modified)
+        self.assertEqual(self.fake.calls['EnumWindows'], 0)
+        self.assertEqual(self.fake.calls['SetWindowLong'], modified)
+        self.assertFalse(any(window.ex_style & self.fake.WS_EX_LAYERED for window in self.fake.windows.values()))
+
+
+class ChangeOpacityTest(AppTestCase):
+
+    def test_each_window_ends_on_its_last_change(self):
+        calls = 1000
+        for i in range(calls):
+            self.fake.foreground = self.hwnds[i % self.windows]
+            self.app.change_window_opacity(Binding('', 'alpha', i % 254 + 1, 'window'))
+        self.assertTrue(self.app.pipeline.wait_idle(10))
+        self.assertEqual([self.fake.windows[hwnd].layered[1] for hwnd in self.hwnds],
+                         [(calls - self.windows + i) % 254 + 1 for i in range(self.windows)])
+
+
+class BulkApplyTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # The batched path backends whose writes cannot hang take
+        self.app.backend.blocking_writes = False
+        self.batches = []
+        read_state_many = self.app.backend.read_state_many
+
+        def record(hwnds):
+            self.batches.append(list(hwnds))
+            return read_state_many(self.batches[-1])
+
+        self.app.backend.read_state_many = record
+
+    def test_windows_are_read_in_one_batch(self):
+        self.fake.destroy_window(self.hwnds[0])
+        self.assertEqual(self.app.apply_many((hwnd, 90) for hwnd in self.hwnds), 9)
+        self.assertEqual(self.batches, [self.hwnds])
+        self.assertTrue(all(self.fake.windows[hwnd].layered[1] == 90 for hwnd in self.hwnds[1:]))
+
+        # Cached windows are not read again
+        self.assertEqual(self.app.apply_many((hwnd, 100) for hwnd in self.hwnds[1:]), 9)
+        self.assertEqual(len(self.batches), 1)
+        self.assertEqual(self.app.window_targets[self.hwnds[1]], (100, None))
+
+
+class StartupBenchmarkTest(AppTestCase):
+
+    def test_console_mode_reports_and_exits(self):
+        FakeKeyboard(self.fake).install()
+        quits = []
+
+        def quit_app():
+            quits.append(True)
+            self.app.running = False
+            self.app.stopped.set()
+
+        self.app.quit_app = quit_app
+        # The Win32 event watcher needs a real desktop
+        self.app.start_window_events = lambda: None
+        output = io.StringIO()
+        with mock.patch.object(transparency, 'TRAY_AVAILABLE', False), redirect_stdout(output):
+            self.app.run_system_tray(startup_benchmark=True)
+        self.assertEqual(quits, [True])
+        self.assertIn("time to console ready", output.getvalue())
+
+
+class MetricsTest(AppTestCase):
+
+    def test_disabled_metrics_record_nothing(self):
+        self.press(self.hwnds[0], 5)
+        snapshot = self.app.metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {})
+        self.assertEqual(snapshot['histograms'], {})
+
+    def test_hotkeys_are_counted_and_timed(self):
+        self.app.metrics.enabled = True
+        self.fake.windows[self.hwnds[1]].latency = 0.004
+        for i, hwnd in enumerate(self.hwnds[:3]):
+            self.press(hwnd, i + 2)
+        self.press(self.hwnds[0], 2)
+        snapshot = self.app.metrics.snapshot()
+        counters = snapshot['counters']
+        self.assertEqual(counters['hotkeys'], 4)
+        self.assertEqual(counters['applies'], 3)
+        self.assertEqual(counters['applies_skipped'], 1)
+        self.assertEqual(snapshot['histograms']['hotkey_to_apply_seconds']['count'], 4)
+        win32 = snapshot['histograms']['win32_call_seconds']
+        self.assertEqual(win32['count'], 3)
+        self.assertGreaterEqual(win32['max_ms'], 4)
+
+    def test_gauges_are_sampled_into_snapshots(self):
+        metrics = Metrics(enabled=True)
+        metrics.gauge('fine', lambda: 3)
+        metrics.gauge('broken', lambda: 1 / 0)
+        gauges = metrics.snapshot()['gauges']
+        self.assertEqual(gauges['fine'], 3)
+        self.assertTrue(gauges['broken'].startswith("error:"))
+
+    def test_histogram_percentiles(self):
+        histogram = Histogram()
+        for _ in range(99):
+            histogram.observe(0.001)
+        histogram.observe(1.0)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 100)
+        self.assertLessEqual(snapshot['p50_ms'], 1.28)
+        self.assertEqual(snapshot['max_ms'], 1000)
+
+
+class LoggingTest(unittest.TestCase):
+
+    def setUp(self):
+        root = logging.getLogger()
+        self.saved = root.handlers[:], root.level
+
+    def tearDown(self):
+        stop_logging()
+        root = logging.getLogger()
+        root.handlers[:], level = self.saved
+        root.setLevel(level)
+
+    def test_json_lines_are_written_by_the_listener(self):
+        stream = io.StringIO()
+        setup_logging(logging.INFO, json_lines=True, stream=stream)
+        logging.getLogger("transparent_windows").info("Applied %d%% opacity", 50)
+        logging.getLogger("transparent_windows").debug("not written")
+        stop_logging()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        entry = json.loads(lines[0])
+        self.assertEqual((entry['level'], entry['message']), ('INFO', "Applied 50% opacity"))
+
+
+if __name__ == '__main__':
+    unittest.main()
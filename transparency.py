@@ -1,67 +1,296 @@
-import threading
-import sys
-import os
 import time
+MODULE_START = time.perf_counter()
+
+import argparse
 import json
-from win32 import win32gui, winxpgui, win32api
-import win32.lib.win32con as win32con
-import keyboard
-import tkinter as tk
-from tkinter import messagebox, ttk
+import logging
+import os
+import sys
+import threading
+
+# Import cost per group, reported by --startup-benchmark. Tkinter and the
+# dialogs are not imported here at all: they load the first time one opens.
+IMPORT_TIMES = {}
+ICON_CACHE_VERSION = 1
+
+_import_start = time.perf_counter()
+from autodim import AutoDimmer
+from curves import describe_levels, nearest_level
+from backends import BackendUnavailable, create_backend
+from hotkeys import Binding, HotkeyEngine, RepeatThrottle
+from journal import OpacityJournal, load_journal
+from instrumentation import Metrics, MetricsExporter, setup_logging, stop_logging
+from fades import FadeScheduler
+from pipeline import ApplyPipeline
+from rules import load_rules
+import settings as settings_schema
+from settings import FileWatcher, ShortcutMatcher
+from spatial import WindowIndex
+from window_state import ModifiedWindowRegistry, ProcessWindowMap, WindowAttributeCache
+from winevents import (EVENT_OBJECT_DESTROY, EVENT_OBJECT_HIDE, EVENT_OBJECT_LOCATIONCHANGE,
+                       EVENT_OBJECT_SHOW, EVENT_SYSTEM_FOREGROUND)
+IMPORT_TIMES['app modules'] = time.perf_counter() - _import_start
+
+log = logging.getLogger("transparent_windows")
+
+_import_start = time.perf_counter()
+try:
+    import keyboard
+    KEYBOARD_AVAILABLE = True
+except ImportError:
+    KEYBOARD_AVAILABLE = False
+IMPORT_TIMES['keyboard'] = time.perf_counter() - _import_start
 
+_import_start = time.perf_counter()
 try:
     import pystray
     from pystray import MenuItem as item
-    from PIL import Image, ImageDraw
+    from PIL import Image
     TRAY_AVAILABLE = True
 except ImportError:
     TRAY_AVAILABLE = False
+IMPORT_TIMES['pystray + PIL'] = time.perf_counter() - _import_start
 
 class TransparentWindowsApp:
-    def __init__(self):
+    def __init__(self, settings_file="transparent_windows_settings.json", backend=None):
+        self.backend = backend if backend is not None else create_backend()
         self.running = True
-        self.opacity_step_1 = 10
-        self.opacity_step_10 = 255
-        self.opacity = 30
+        self.stopped = threading.Event()
+        self.hotkeys = None
+        # hwnd -> (alpha, level) last asked for, level None for alphas set directly;
+        # relative steps and state queries build on it instead of reading the window
+        self.window_targets = {}
         self.icon = None
-        self.settings_file = "transparent_windows_settings.json"
+        self.metrics = Metrics()
+        self.metrics_exporter = None
+        self.ui = None
+        self.ui_lock = threading.Lock()
+        self.modified_windows = ModifiedWindowRegistry(self.backend.is_window)
+        self.attribute_cache = WindowAttributeCache()
+        self.pipeline = ApplyPipeline()
+        self.pipeline.start()
+        self.fades = FadeScheduler(self.apply_fade_frame)
+        self.held_steps = RepeatThrottle()
+        self.settings_file = settings_file
+        self.rules_file = os.path.join(os.path.dirname(self.settings_file), "transparent_windows_rules.json")
+        self.icon_file = os.path.join(os.path.dirname(self.settings_file),
+                                      f"transparent_windows_icon_v{ICON_CACHE_VERSION}.png")
+        self.journal_file = os.path.join(os.path.dirname(self.settings_file), "transparent_windows_journal.jsonl")
+        self.startup_times = {}
+        self.window_events = None
+        self.control_server = None
+        self.journal = None
+        # Only kept up to date while window events are being received
+        self.window_index = WindowIndex()
+        self.process_windows = ProcessWindowMap()
+        self.index_live = False
+        self.rule_applied = set()
+        self.process_names = {}
         
         # Default shortcuts
         self.default_shortcuts = {
             'modifier1': 'ctrl',
             'modifier2': 'shift', 
             'modifier3': 'alt',
-            'block_input': True
+            'block_input': True,
+            'fade_duration': 0,
+            'auto_dim': False,
+            'auto_dim_alpha': 160,
+            'hotkey_target': 'foreground',
+            'hotkey_scope': 'window',
+            'opacity_curve': 'linear',
+            'opacity_gamma': 2.2,
+            'opacity_points': [],
+            'bindings': []
         }
         
         # Load settings
+        self.settings_watcher = FileWatcher()
         self.shortcuts = self.load_settings()
+        self.matcher = ShortcutMatcher.from_settings(self.shortcuts)
+        self.rules = load_rules(self.rules_file)
+        # (enabled, alpha) asked for by the settings and last brought about,
+        # alpha None while off; one worker thread closes the gap
+        self.auto_dim_cond = threading.Condition()
+        self.auto_dim_wanted = self.auto_dim_synced = (False, None)
+        self.auto_dim_thread = None
+        self.auto_dim = AutoDimmer(self.backend, self.queue_opacity, self.undim_window,
+                                   self.shortcuts['auto_dim_alpha'])
         
     def load_settings(self):
         """Load shortcuts from settings file"""
         try:
             if os.path.exists(self.settings_file):
                 with open(self.settings_file, 'r') as f:
-                    settings = json.load(f)
-                    # Validate settings
-                    if all(key in settings for key in self.default_shortcuts.keys()):
-                        return settings
+                    return settings_schema.validate(json.load(f), self.default_shortcuts)
         except Exception as e:
-            print(f"Error loading settings: {e}")
+            log.error("Error loading settings: %s", e)
         
         # Return defaults if loading fails
-        return self.default_shortcuts.copy()
+        return settings_schema.validate({}, self.default_shortcuts)
     
-    def save_settings(self):
-        """Save shortcuts to settings file"""
+    def save_settings(self, shortcuts=None):
+        """Save shortcuts to settings file and apply them"""
         try:
-            with open(self.settings_file, 'w') as f:
-                json.dump(self.shortcuts, f, indent=2)
+            settings = settings_schema.validate(shortcuts if shortcuts is not None else self.shortcuts,
+                                                self.default_shortcuts)
+            settings_schema.atomic_write_json(self.settings_file, settings)
+            # Our own write is already applied, don't reload it
+            self.settings_watcher.ignore_current(self.settings_file)
+            self.apply_settings(settings)
             return True
         except Exception as e:
-            print(f"Error saving settings: {e}")
+            log.error("Error saving settings: %s", e)
             return False
     
+    def apply_settings(self, settings):
+        """Swap in new settings; the hotkey path picks them up on its next event"""
+        self.shortcuts = settings
+        self.matcher = ShortcutMatcher.from_settings(settings)
+        if self.hotkeys:
+            self.hotkeys.scan_codes = self.hotkey_scan_codes()
+            self.hotkeys.matcher = self.matcher
+        if self.icon:
+            self.icon.title = f"Transparent Windows - {self.get_shortcut_display()}"
+        self.update_auto_dim()
+    
+    def update_auto_dim(self):
+        """Turn auto-dim on or off, or change its level, to match the settings
+        
+        Nothing happens unless auto_dim or auto_dim_alpha changed. Enumerating
+        and writing every window is left to the auto-dim worker thread, never
+        done on the tray or settings window thread that changed the settings.
+        """
+        # Auto-dim is driven by window events, without them it stays off
+        enabled = bool(self.shortcuts.get('auto_dim')) and self.window_events is not None
+        wanted = (True, self.shortcuts.get('auto_dim_alpha', 160)) if enabled else (False, None)
+        with self.auto_dim_cond:
+            if wanted == self.auto_dim_wanted:
+                return
+            self.auto_dim_wanted = wanted
+            self.auto_dim_cond.notify_all()
+            if self.auto_dim_thread is None:
+                self.auto_dim_thread = threading.Thread(target=self.auto_dim_worker, daemon=True)
+                self.auto_dim_thread.start()
+    
+    def auto_dim_worker(self):
+        """Apply auto-dim setting changes one at a time; later ones replace any still waiting"""
+        while True:
+            with self.auto_dim_cond:
+                while self.auto_dim_wanted == self.auto_dim_synced:
+                    self.auto_dim_cond.wait()
+                wanted = self.auto_dim_wanted
+            try:
+                self.sync_auto_dim(*wanted)
+            except Exception as e:
+                log.error("Error updating auto-dim: %s", e)
+            with self.auto_dim_cond:
+                self.auto_dim_synced = wanted
+                self.auto_dim_cond.notify_all()
+    
+    def wait_auto_dim(self, timeout=None):
+        """Wait until auto-dim matches the settings last applied"""
+        with self.auto_dim_cond:
+            return self.auto_dim_cond.wait_for(lambda: self.auto_dim_synced == self.auto_dim_wanted, timeout)
+    
+    def sync_auto_dim(self, enabled, alpha):
+        """Bring auto-dim to the given state, from the auto-dim worker"""
+        if enabled and not self.auto_dim.enabled:
+            dim = self.auto_dim.enable(alpha)
+        elif not enabled and self.auto_dim.enabled:
+            self.undim_many(self.auto_dim.disable())
+            return
+        elif enabled:
+            dim = self.auto_dim.set_dim_alpha(alpha)
+        else:
+            return
+        if dim:
+            self.apply_many(((hwnd, alpha) for hwnd in dim), targets=False)
+    
+    def undim_many(self, hwnds):
+        """Undim windows in one pass: targets are written again, the other windows restored"""
+        writes = []
+        restores = []
+        for hwnd in hwnds:
+            target = self.window_targets.get(hwnd)
+            if target is not None:
+                writes.append((hwnd, target[0]))
+            else:
+                restores.append(hwnd)
+        if writes:
+            self.apply_many(writes, targets=False)
+        if not restores:
+            return
+        if self.backend.blocking_writes:
+            for hwnd in restores:
+                self.restore_window(hwnd, block=True)
+            return
+        
+        windows = []
+        for hwnd in restores:
+            self.fades.cancel(hwnd)
+            self.attribute_cache.invalidate(hwnd)
+            original = self.modified_windows.forget(hwnd)
+            if original is not None:
+                windows.append((hwnd, original))
+        self.backend.restore_many(windows)
+        if self.journal is not None:
+            for hwnd, _ in windows:
+                self.journal.forget(hwnd)
+    
+    def toggle_auto_dim(self):
+        """Tray menu action: switch auto-dim on or off and save the choice"""
+        self.save_settings(dict(self.shortcuts, auto_dim=not self.shortcuts.get('auto_dim')))
+    
+    def reload_settings(self, path):
+        """Called by the file watcher when the settings file changed on disk"""
+        try:
+            with open(self.settings_file, 'r') as f:
+                settings = settings_schema.validate(json.load(f), self.default_shortcuts)
+        except Exception as e:
+            # Keep running with the current settings until the file is fixed
+            log.warning("Ignoring invalid settings file: %s", e)
+            return
+        self.apply_settings(settings)
+        log.info("Settings reloaded. Use %s to change transparency.", self.get_shortcut_display())
+    
+    def reload_rules(self, path):
+        """Called by the file watcher when the rules file changed on disk"""
+        self.rules = load_rules(self.rules_file)
+        self.rule_applied.clear()
+        log.info("Loaded %d opacity rules", len(self.rules))
+    
+    def start_metrics(self, target, interval=10.0):
+        """Collect metrics and publish them to a file or localhost port"""
+        self.metrics.enabled = True
+        self.metrics.gauge('pipeline', self.pipeline.stats)
+        self.metrics.gauge('attribute_cache', self.attribute_cache.stats)
+        self.metrics.gauge('fades', self.fades.stats)
+        self.metrics.gauge('held_steps', self.held_steps.stats)
+        self.metrics.gauge('modified_windows', lambda: len(self.modified_windows))
+        self.metrics.gauge('auto_dim', self.auto_dim.stats)
+        self.metrics.gauge('process_windows', self.process_windows.stats)
+        if self.journal is not None:
+            self.metrics.gauge('journal', self.journal.stats)
+        self.metrics_exporter = MetricsExporter(self.metrics, target, interval)
+        self.metrics_exporter.start()
+    
+    def start_control_server(self, address=None):
+        """Accept scripted commands on a local socket or named pipe"""
+        from control import ControlServer
+        try:
+            self.control_server = ControlServer(self, address)
+            self.control_server.start()
+        except OSError as e:
+            self.control_server = None
+            log.warning("Control server unavailable: %s", e)
+    
+    def start_settings_watcher(self):
+        """Reload settings and rules when they are edited on disk"""
+        self.settings_watcher.watch(self.settings_file, self.reload_settings)
+        self.settings_watcher.watch(self.rules_file, self.reload_rules)
+        self.settings_watcher.start()
+    
     def get_shortcut_display(self):
         """Get human-readable shortcut combination"""
         modifiers = []
@@ -69,109 +298,570 @@ class TransparentWindowsApp:
             if self.shortcuts.get(mod_key):
                 modifiers.append(self.shortcuts[mod_key].title())
         
-        if modifiers:
-            return " + ".join(modifiers) + " + 0-9"
-        return "0-9"
+        display = " + ".join(modifiers + ["0-9"])
+        extra = len(self.matcher.keymap) - 10
+        if extra > 0:
+            display += f" (+{extra} bindings)"
+        return display
     
-    def change_window_opacity(self):
-        """Apply transparency to the currently active window"""
+    def change_window_opacity(self, binding):
+        """Apply a key binding to the currently active window, or its whole app for app bindings"""
         try:
             # time.sleep(0.1)  # Small delay to ensure we get the right window
-            hwnd = win32gui.GetForegroundWindow()
+            hwnd = self.target_window()
             if hwnd:
-                window_title = win32gui.GetWindowText(hwnd)
-                
-                # # Skip our own windows to prevent crashes
-                # if any(skip_word in window_title.lower() for skip_word in 
-                #       ['transparent windows', 'about', 'error', 'message', 'options', 'settings']):
-                #     print(f"Skipping window: {window_title}")
-                #     return
-                
-                win32gui.SetWindowLong(hwnd, win32con.GWL_EXSTYLE, 
-                                     win32gui.GetWindowLong(hwnd, win32con.GWL_EXSTYLE) | win32con.WS_EX_LAYERED)
-                winxpgui.SetLayeredWindowAttributes(hwnd, win32api.RGB(0,0,0), self.opacity, win32con.LWA_ALPHA)
+                requested_at = time.perf_counter() if self.metrics.enabled else None
+                alpha, level = self.binding_target(binding, hwnd)
+                if binding.target == 'app':
+                    if self.index_live:
+                        action = lambda: self.set_app_opacity(hwnd, alpha, requested_at, level)
+                    else:
+                        # Without window events finding the app's windows means enumerating them,
+                        # keep that off the hook
+                        action = lambda: self.pipeline.submit(
+                            ('app', hwnd), lambda: self.set_app_opacity(hwnd, alpha, requested_at, level))
+                else:
+                    action = lambda: self.set_window_opacity(hwnd, alpha, requested_at, level)
                 
-                transparency_percent = round((self.opacity / 255) * 100)
-                print(f"Applied {transparency_percent}% opacity to: {window_title}")
+                if binding.repeats:
+                    # The next auto-repeat steps from here even if this write is held back
+                    self.window_targets[hwnd] = (alpha, level)
+                    self.held_steps.submit(hwnd, action)
+                else:
+                    self.held_steps.cancel(hwnd)
+                    action()
                 
         except Exception as e:
-            print(f"Error changing opacity: {e}")
+            self.metrics.inc('errors')
+            log.error("Error changing opacity: %s", e)
+    
+    def binding_target(self, binding, hwnd):
+        """Return the (alpha, level) a key binding gives a window, level None if it is off the curve"""
+        if binding.action == 'level':
+            return self.opacity_for_level(binding.value), binding.value
+        if binding.action == 'alpha':
+            return binding.value, None
+        if binding.action == 'level_step':
+            level = max(0, min(9, self.window_level(hwnd) + binding.value))
+            return self.opacity_for_level(level), level
+        # Step from the alpha last asked for, so held steps add up before they are applied
+        alpha = max(1, min(255, self.window_alpha(hwnd) + binding.value))
+        return alpha, None
+    
+    def window_alpha(self, hwnd):
+        """The alpha last asked for or seen on a window, 255 if unknown; never reads the window"""
+        target = self.window_targets.get(hwnd)
+        if target is not None:
+            return target[0]
+        return self.attribute_cache.peek(hwnd, 255)
     
-    def is_shortcut_active(self):
-        """Check if the current shortcut combination is pressed"""
+    def window_level(self, hwnd):
+        """A window's current level, or the level closest to its alpha"""
+        target = self.window_targets.get(hwnd)
+        if target is not None and target[1] is not None:
+            return target[1]
+        return nearest_level(self.matcher.levels, self.window_alpha(hwnd))
+    
+    def app_windows(self, hwnd):
+        """Return every window of hwnd's process, hwnd first
+        
+        A lookup in the process map while window events keep it current,
+        otherwise an enumeration with a process query per window.
+        """
+        if self.index_live:
+            pid = self.process_windows.pid_of(hwnd)
+            if pid is None:
+                pid = self.backend.window_pid(hwnd)
+                self.process_windows.add(hwnd, pid)
+            others = self.process_windows.windows_of(pid)
+        else:
+            pid = self.backend.window_pid(hwnd)
+            others = []
+            for other in self.backend.enumerate_windows():
+                try:
+                    if self.backend.window_pid(other) == pid:
+                        others.append(other)
+                except Exception:
+                    pass
+        return [hwnd] + [other for other in others if other != hwnd]
+    
+    def set_app_opacity(self, hwnd, alpha, requested_at=None, level=None):
+        """Give every window of hwnd's process an alpha"""
+        for other in self.app_windows(hwnd):
+            self.set_window_opacity(other, alpha, requested_at if other == hwnd else None, level)
+    
+    def target_window(self):
+        """Return the window the hotkeys act on: foreground or under the cursor"""
+        if self.matcher.under_cursor:
+            hwnd = self.window_under_cursor()
+            if hwnd:
+                return hwnd
+        return self.backend.foreground_window()
+    
+    def window_under_cursor(self):
+        """Return the topmost window under the mouse, None if the index is not kept"""
+        if not self.index_live:
+            return None
+        x, y = self.backend.cursor_pos()
+        return self.window_index.window_at(x, y)
+    
+    def set_window_opacity(self, hwnd, alpha, requested_at=None, level=None):
+        """Fade or queue a window's new alpha without blocking the caller"""
+        self.window_targets[hwnd] = (alpha, level)
+        self.queue_opacity(hwnd, alpha, requested_at)
+    
+    def queue_opacity(self, hwnd, alpha, requested_at=None):
+        """Fade or queue an alpha for a window without recording it as its target"""
+        fade_duration = self.matcher.fade_duration
+        if fade_duration > 0:
+            start_alpha = self.fades.current_alpha(hwnd)
+            if start_alpha is None:
+                start_alpha = self.attribute_cache.peek(hwnd, 255)
+            self.fades.fade(hwnd, start_alpha, alpha, fade_duration)
+            return
+        
+        self.fades.cancel(hwnd)
+        # The window calls run on the apply pipeline so a hung target
+        # application can never stall the hotkey hook
+        if not self.pipeline.submit(hwnd, lambda: self.apply_and_report(hwnd, alpha, requested_at)):
+            self.metrics.inc('applies_dropped')
+    
+    def undim_window(self, hwnd):
+        """Give a window auto-dim dimmed back its target, full opacity if it has none
+        
+        The layered style stays until auto-dim is turned off: the window is
+        likely to be dimmed again at the next focus change.
+        """
+        target = self.window_targets.get(hwnd)
+        self.queue_opacity(hwnd, target[0] if target is not None else 255)
+    
+    def restore_window(self, hwnd, block=False):
+        """Queue giving one window back the state it had before we first changed it"""
+        def restore():
+            original = self.modified_windows.forget(hwnd)
+            self.attribute_cache.invalidate(hwnd)
+            if original is None:
+                return
+            self.backend.restore(hwnd, original)
+            if self.journal is not None:
+                self.journal.forget(hwnd)
+        
+        self.fades.cancel(hwnd)
+        return self.pipeline.submit(hwnd, restore, block=block)
+    
+    def apply_fade_frame(self, hwnd, alpha, final):
+        """Queue one frame of a fade, reporting only the final one"""
+        if final:
+            self.pipeline.submit(hwnd, lambda: self.apply_and_report(hwnd, alpha))
+        else:
+            self.pipeline.submit(hwnd, lambda: self.apply_opacity(hwnd, alpha))
+    
+    def apply_and_report(self, hwnd, alpha, requested_at=None):
+        """Apply an alpha to a window from a pipeline worker and log the result"""
         try:
-            modifiers_pressed = True
+            # # Skip our own windows to prevent crashes
+            # if any(skip_word in window_title.lower() for skip_word in 
+            #       ['transparent windows', 'about', 'error', 'message', 'options', 'settings']):
+            #     print(f"Skipping window: {window_title}")
+            #     return
+            
+            changed = self.apply_opacity(hwnd, alpha)
             
-            # Check each modifier
-            for mod_key in ['modifier1', 'modifier2', 'modifier3']:
-                modifier = self.shortcuts.get(mod_key)
-                if modifier and modifier.strip():
-                    if not keyboard.is_pressed(modifier):
-                        modifiers_pressed = False
-                        break
+            if requested_at is not None:
+                self.metrics.observe('hotkey_to_apply_seconds', time.perf_counter() - requested_at)
+            self.metrics.inc('applies' if changed else 'applies_skipped')
             
-            return modifiers_pressed
-        except:
+            if log.isEnabledFor(logging.INFO):
+                transparency_percent = round((alpha / 255) * 100)
+                log.info("Applied %d%% opacity to: %s", transparency_percent, self.backend.window_title(hwnd))
+            
+        except Exception as e:
+            self.metrics.inc('errors')
+            log.error("Error changing opacity: %s", e)
+            raise
+    
+    def plan_opacity(self, hwnd, alpha, state=None):
+        """Return (needed, original) for giving a window an alpha
+        
+        Reads the window state on a cache miss, unless the caller already read
+        it into state, and remembers the original. needed is False if the
+        window already has that alpha.
+        """
+        original = None
+        cached = self.attribute_cache.get(hwnd) if state is None else None
+        if cached is not None:
+            _, current_alpha = cached
+        else:
+            original, current_alpha = state if state is not None else self.backend.read_state(hwnd)
+            if self.modified_windows.remember(hwnd, original) and self.journal is not None:
+                self.journal_window(hwnd, original)
+        
+        if current_alpha == alpha:
+            self.attribute_cache.put(hwnd, True, alpha)
+            self.attribute_cache.record_skip()
+            return False, original
+        return True, original
+    
+    def apply_opacity(self, hwnd, alpha):
+        """Set a window's alpha through the backend, remembering its original state
+        
+        Returns False if the window already had that alpha and nothing was written.
+        """
+        needed, original = self.plan_opacity(hwnd, alpha)
+        if not needed:
             return False
+        
+        started = time.perf_counter() if self.metrics.enabled else None
+        try:
+            self.backend.set_alpha(hwnd, alpha, original)
+        except Exception:
+            self.attribute_cache.invalidate(hwnd)
+            raise
+        finally:
+            if started is not None:
+                self.metrics.observe('win32_call_seconds', time.perf_counter() - started)
+        
+        self.attribute_cache.put(hwnd, True, alpha)
+        if self.journal is not None:
+            self.journal.set(hwnd, alpha)
+        return True
+    
+    def apply_many(self, windows, targets=True):
+        """Give many windows an alpha in one pass, returns how many were queued or set
+        
+        windows is an iterable of (hwnd, alpha). Backends whose writes can hang
+        get one pipeline operation per window; the others one batched read of
+        the windows not in the cache and one batched write.
+        With targets=False the alphas are not recorded as the windows' targets,
+        as for auto-dim's temporary writes.
+        """
+        if self.backend.blocking_writes:
+            queued = 0
+            for hwnd, alpha in windows:
+                self.fades.cancel(hwnd)
+                if targets:
+                    self.window_targets[hwnd] = (alpha, None)
+                if self.pipeline.submit(hwnd, lambda hwnd=hwnd, alpha=alpha: self.apply_and_report(hwnd, alpha),
+                                        block=True):
+                    queued += 1
+            return queued
+        
+        windows = list(windows)
+        # One batched read for every window the cache cannot answer
+        stale = self.attribute_cache.stale(hwnd for hwnd, _ in windows)
+        states = self.backend.read_state_many(stale) if stale else {}
+        unreadable = set(stale).difference(states)
+        writes = []
+        skipped = 0
+        for hwnd, alpha in windows:
+            self.fades.cancel(hwnd)
+            if hwnd in unreadable:
+                continue
+            try:
+                needed, original = self.plan_opacity(hwnd, alpha, states.get(hwnd))
+            except Exception as e:
+                log.debug("Skipping window %x: %s", hwnd, e)
+                continue
+            if needed:
+                writes.append((hwnd, alpha, original))
+            else:
+                skipped += 1
+        
+        applied = self.backend.set_alpha_many(writes)
+        for hwnd, alpha, _ in writes:
+            self.attribute_cache.put(hwnd, True, alpha)
+            if targets:
+                self.window_targets[hwnd] = (alpha, None)
+            if self.journal is not None:
+                self.journal.set(hwnd, alpha)
+        self.metrics.inc('applies', applied)
+        self.metrics.inc('applies_skipped', skipped)
+        return applied + skipped
+    
+    def journal_window(self, hwnd, original):
+        """Journal a window's original state with enough identity to recognise it later"""
+        try:
+            pid, window_class = self.backend.window_pid(hwnd), self.backend.window_class(hwnd)
+        except Exception:
+            pid = window_class = None
+        self.journal.remember(hwnd, original, pid, window_class)
+    
+    def recover_windows(self):
+        """Take back windows a previous run left changed, returns their journal entries
+        
+        Windows that are gone, or whose handle now belongs to another process
+        or class, are dropped.
+        """
+        entries, _, skipped = load_journal(self.journal_file)
+        if skipped:
+            log.warning("Skipped %d unreadable journal lines", skipped)
+        recovered = {}
+        for hwnd, entry in entries.items():
+            try:
+                if not self.backend.is_window(hwnd):
+                    continue
+                if entry.get('pid') is not None and self.backend.window_pid(hwnd) != entry['pid']:
+                    continue
+                if entry.get('class') is not None and self.backend.window_class(hwnd) != entry['class']:
+                    continue
+            except Exception:
+                continue
+            self.modified_windows.remember(hwnd, entry['original'])
+            if entry.get('alpha') is not None:
+                self.window_targets[hwnd] = (entry['alpha'], None)
+            recovered[hwnd] = entry
+        return recovered
+    
+    def start_journal(self, recover='ask'):
+        """Recover what a previous run left behind, then journal every change
+        
+        recover is 'ask', 'reset' (restore the recovered windows now) or
+        'keep' (leave them as they are; Reset All Windows still undoes them).
+        If the journal file cannot be written the app runs without one.
+        """
+        try:
+            recovered = self.recover_windows()
+        except OSError as e:
+            log.warning("Could not read the journal of the previous run: %s", e)
+            recovered = {}
+        journal = OpacityJournal(self.journal_file)
+        try:
+            journal.open(recovered)
+            self.journal = journal
+        except OSError as e:
+            # A read-only or missing directory must not stop the app
+            log.warning("Running without a journal: %s", e)
+        if not recovered:
+            return
+        
+        invisible = sum(1 for entry in recovered.values() if (entry.get('alpha') or 255) <= 25)
+        log.info("Recovered %d windows changed by a previous run (%d nearly invisible)", len(recovered), invisible)
+        if recover == 'reset':
+            self.restore_modified_windows()
+        elif recover == 'ask':
+            import dialogs
+            self.get_ui().post(dialogs.ask_recovery, self, len(recovered), invisible)
+    
+    def restore_modified_windows(self, timeout=5.0):
+        """Restore every window we changed, returns how many were reset"""
+        windows = self.modified_windows.pop_all()
+        self.auto_dim.clear()
+        self.window_targets.clear()
+        for hwnd, original in windows:
+            self.held_steps.cancel(hwnd)
+            self.fades.cancel(hwnd)
+            self.attribute_cache.invalidate(hwnd)
+        
+        if not self.backend.blocking_writes:
+            # Nothing can hang: send every restore in one batch
+            restored = self.backend.restore_many(windows)
+            if self.journal is not None:
+                self.journal.clear()
+            return restored
+        
+        restored = []
+        
+        def restore(hwnd, original):
+            self.backend.restore(hwnd, original)
+            restored.append(hwnd)
+            if self.journal is not None:
+                self.journal.forget(hwnd)
+        
+        for hwnd, original in windows:
+            if not self.backend.is_window(hwnd):
+                if self.journal is not None:
+                    self.journal.forget(hwnd)
+                continue
+            # Replaces any opacity change still queued for the window
+            self.pipeline.submit(hwnd, lambda hwnd=hwnd, original=original: restore(hwnd, original),
+                                 block=True)
+        
+        self.pipeline.wait_idle(timeout)
+        return len(restored)
+    
+    def window_exe(self, hwnd):
+        """Return the executable name of the process owning a window"""
+        pid = self.backend.window_pid(hwnd)
+        name = self.process_names.get(pid)
+        if name is None:
+            if len(self.process_names) > 1024:
+                self.process_names.clear()
+            name = self.process_names[pid] = self.backend.process_name(pid)
+        return name
+    
+    def apply_rules(self, hwnd):
+        """Apply the first matching opacity rule to a window, once per window"""
+        if not len(self.rules) or hwnd in self.rule_applied:
+            return
+        
+        exe = self.window_exe(hwnd) if self.rules.needs_exe else None
+        rule = self.rules.match(exe, self.backend.window_class(hwnd), self.backend.window_title(hwnd))
+        if rule is None:
+            # Titles are often set after the window is shown, so a later
+            # foreground event gets another chance to match
+            return
+        
+        self.rule_applied.add(hwnd)
+        # Recorded as the window's target, so auto-dim gives it back the rule's alpha
+        self.set_window_opacity(hwnd, rule.alpha)
+    
+    def forget_window(self, hwnd):
+        """Drop everything we know about a destroyed window"""
+        self.held_steps.cancel(hwnd)
+        self.fades.cancel(hwnd)
+        self.attribute_cache.invalidate(hwnd)
+        self.modified_windows.forget(hwnd)
+        self.rule_applied.discard(hwnd)
+        self.auto_dim.forget(hwnd)
+        self.window_index.remove(hwnd)
+        self.unindex_process(hwnd)
+        self.window_targets.pop(hwnd, None)
+        if self.journal is not None:
+            self.journal.forget(hwnd)
+    
+    def index_window(self, hwnd):
+        """Record a window's current rectangle in the spatial index"""
+        try:
+            self.window_index.update(hwnd, self.backend.window_rect(hwnd))
+        except Exception:
+            self.window_index.remove(hwnd)
+    
+    def index_process(self, hwnd):
+        """Record which process a window belongs to"""
+        try:
+            self.process_windows.add(hwnd, self.backend.window_pid(hwnd))
+        except Exception:
+            self.unindex_process(hwnd)
+    
+    def unindex_process(self, hwnd):
+        """Drop a window from the process map, and its exe name with the process's last window"""
+        ended = self.process_windows.remove(hwnd)
+        if ended is not None:
+            # The pid can be reused by another program from now on
+            self.process_names.pop(ended, None)
+    
+    def build_window_index(self):
+        """Fill the spatial index and process map once; window events keep them current afterwards"""
+        windows = []
+        pids = []
+        for hwnd in self.backend.enumerate_windows():
+            try:
+                windows.append((hwnd, self.backend.window_rect(hwnd)))
+                pids.append((hwnd, self.backend.window_pid(hwnd)))
+            except Exception:
+                pass
+        self.window_index.clear()
+        self.window_index.load(windows)
+        self.process_windows.load(pids)
+        self.index_live = True
+    
+    def on_window_event(self, event, hwnd):
+        """Called on the window event thread for top-level window events"""
+        if event == EVENT_OBJECT_DESTROY:
+            self.forget_window(hwnd)
+        elif event == EVENT_OBJECT_LOCATIONCHANGE:
+            self.index_window(hwnd)
+        elif event == EVENT_SYSTEM_FOREGROUND:
+            self.window_index.raise_window(hwnd)
+            self.auto_dim.on_foreground(hwnd)
+            self.apply_rules(hwnd)
+        elif event == EVENT_OBJECT_SHOW:
+            self.index_window(hwnd)
+            # Like the enumeration fallback, the process map only holds visible windows
+            if hwnd not in self.process_windows:
+                self.index_process(hwnd)
+            self.window_index.raise_window(hwnd)
+            self.apply_rules(hwnd)
+            self.auto_dim.on_show(hwnd)
+        elif event == EVENT_OBJECT_HIDE:
+            self.window_index.remove(hwnd)
+            self.unindex_process(hwnd)
+    
+    def start_window_events(self):
+        """Start watching window creation, destruction and focus changes"""
+        try:
+            self.window_events = self.backend.watch_events(self.on_window_event)
+            if self.window_events is None:
+                log.info("Window events are not supported by the %s backend", self.backend.name)
+                return
+            self.window_events.start()
+            self.build_window_index()
+        except Exception as e:
+            self.window_events = None
+            log.warning("Window events unavailable: %s", e)
+            return
+        self.update_auto_dim()
+    
+    def opacity_for_level(self, num):
+        """Return the alpha value (1-255) for a number key, from the curve compiled with the settings"""
+        return self.matcher.levels[num]
+    
+    def on_hotkey(self, num):
+        """Called when shortcut + number is pressed"""
+        self.on_binding(Binding(str(num), 'level', num, 'window'))
+    
+    def on_binding(self, binding):
+        """Called by the hotkey engine when a key binding fires"""
+        self.metrics.inc('hotkeys')
+        if self.matcher.block_input:
+            self.metrics.inc('keys_blocked')
+        self.change_window_opacity(binding)
+    
+    def hotkey_scan_codes(self):
+        """Map the scan codes of every bound key to its name"""
+        scan_codes = {}
+        if not KEYBOARD_AVAILABLE:
+            return scan_codes
+        for key in self.matcher.keymap.keys:
+            try:
+                for code in keyboard.key_to_scan_codes(key):
+                    scan_codes[code] = key
+            except ValueError:
+                pass
+        return scan_codes
+    
+    def create_hotkey_engine(self):
+        """Build a hotkey engine for the current shortcut settings"""
+        return HotkeyEngine(self.matcher, self.on_binding, scan_codes=self.hotkey_scan_codes(),
+                            is_pressed=self.backend.key_down)
     
     def keyboard_listener(self):
         """Listen for keyboard shortcuts"""
         shortcut_display = self.get_shortcut_display()
-        print(f"Keyboard listener started. Use {shortcut_display} to change transparency.")
+        log.info("Keyboard listener started. Use %s to change transparency.", shortcut_display)
         
-        # Valid number keys
-        valid_keys = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9']
-        last_trigger_time = 0
+        self.hotkeys = self.create_hotkey_engine()
+        # With suppress=True the callback's return value decides whether the
+        # key reaches the focused application, so digits are blocked in place.
+        # Always hook that way so block_input can be toggled without a restart.
+        hook = keyboard.hook(self.hotkeys.on_key, suppress=True)
         
-        while self.running:
-            try:
-                if self.is_shortcut_active():
-                    current_time = time.time()
-                    
-                    for key in valid_keys:
-                        if keyboard.is_pressed(key):
-                            # Prevent rapid triggering
-                            if current_time - last_trigger_time < 0.3:
-                                continue
-                            
-                            num = int(key)
-                            
-                            if num == 0:
-                                self.opacity = 1  # Nearly invisible
-                            elif num == 1:
-                                self.opacity = self.opacity_step_1
-                            elif num == 9:
-                                self.opacity = self.opacity_step_10
-                            else:
-                                # Calculate opacity for levels 2-8
-                                self.opacity = round(self.opacity_step_1 + ((self.opacity_step_10 - self.opacity_step_1) / 8) * (num - 1))
-                            
-                            self.change_window_opacity()
-                            last_trigger_time = current_time
-                            
-                            # Block the input if enabled
-                            if self.shortcuts.get('block_input', True):
-                                try:
-                                    # Suppress the key event
-                                    keyboard.block_key(key)
-                                    time.sleep(0.1)
-                                    keyboard.unblock_key(key)()
-                                    print("Succesfully blocked input")
-                                except:
-                                    print("Failed to blocked input")
-                                    pass  # If blocking fails, continue anyway
-                            
-                            break
-                
-                time.sleep(0.05)  # Prevent excessive CPU usage
-                        
-            except Exception as e:
-                if self.running:
-                    print(f"Keyboard listener error: {e}")
-                    time.sleep(1)
+        try:
+            self.stopped.wait()
+        finally:
+            keyboard.unhook(hook)
     
     def create_tray_icon(self):
+        """Load the tray icon, drawing it only if there is no cached copy"""
+        try:
+            if os.path.exists(self.icon_file):
+                image = Image.open(self.icon_file)
+                image.load()
+                return image
+        except Exception as e:
+            log.warning("Error loading cached tray icon: %s", e)
+        
+        image = self.draw_tray_icon()
+        try:
+            image.save(self.icon_file, 'PNG')
+        except Exception as e:
+            log.warning("Could not cache tray icon: %s", e)
+        return image
+    
+    def draw_tray_icon(self):
         """Create a simple icon for the system tray"""
+        from PIL import ImageDraw
+        
         image = Image.new('RGBA', (64, 64), (0, 0, 0, 0))
         draw = ImageDraw.Draw(image)
         
@@ -184,230 +874,98 @@ class TransparentWindowsApp:
         
         return image
     
+    def get_ui(self):
+        """Return the UI thread, starting it on first use"""
+        with self.ui_lock:
+            if self.ui is None:
+                from dialogs import UIThread
+                self.ui = UIThread()
+                self.ui.start()
+            return self.ui
+    
     def show_about(self):
         """Show information about the application"""
-        def show_dialog():
-            root = tk.Tk()
-            root.withdraw()
-            
-            shortcut_display = self.get_shortcut_display()
-            about_text = f"""Transparent Windows by Sophia
-
-Current Shortcuts: {shortcut_display}
-• 0: Nearly invisible (1%)
-• 1: Most transparent (10%)
-• 2-8: Gradual transparency levels
-• 9: Fully opaque (100%)
-
-Usage:
-1. Focus on any window
-2. Press your shortcut combination + number key
-3. Window becomes transparent
-
-Right-click the tray icon for options.
-You can customize shortcuts in Options."""
-            
-            messagebox.showinfo("About Transparent Windows", about_text)
-            root.destroy()
-        
-        threading.Thread(target=show_dialog, daemon=True).start()
+        import dialogs
+        self.get_ui().post(dialogs.show_about, self)
     
     def show_options(self):
         """Show options dialog for customizing shortcuts"""
-        def show_options_dialog():
-            root = tk.Tk()
-            root.title("Transparent Windows - Options")
-            # root.geometry("450x350")
-            root.resizable(True, True)
-            
-            # Center the window
-            root.update_idletasks()
-            x = (root.winfo_screenwidth() // 2) - (450 // 2)
-            y = (root.winfo_screenheight() // 2) - (600 // 2)
-            root.geometry(f"450x600+{x}+{y}")
-            
-            main_frame = tk.Frame(root, padx=20, pady=20)
-            main_frame.pack(fill='both', expand=True)
-            
-            # Title
-            title_label = tk.Label(main_frame, text="Shortcut Options", 
-                                  font=('Arial', 14, 'bold'))
-            title_label.pack(pady=(0, 20))
-            
-            # Current shortcuts display
-            current_frame = tk.LabelFrame(main_frame, text="Current Shortcuts", padx=10, pady=10)
-            current_frame.pack(fill='x', pady=(0, 20))
-            
-            current_label = tk.Label(current_frame, text=f"Current: {self.get_shortcut_display()}", 
-                                   font=('Arial', 10))
-            current_label.pack()
-            
-            # Modifier selection
-            modifier_frame = tk.LabelFrame(main_frame, text="Customize Modifiers", padx=10, pady=10)
-            modifier_frame.pack(fill='x', pady=(0, 20))
-            
-            modifier_options = ['', 'ctrl', 'shift', 'alt', 'win']
-            
-            # Modifier 1
-            tk.Label(modifier_frame, text="Modifier 1:").grid(row=0, column=0, sticky='w', pady=2)
-            mod1_var = tk.StringVar(value=self.shortcuts.get('modifier1', ''))
-            mod1_combo = ttk.Combobox(modifier_frame, textvariable=mod1_var, values=modifier_options, width=10)
-            mod1_combo.grid(row=0, column=1, padx=(10, 0), pady=2)
-            
-            # Modifier 2
-            tk.Label(modifier_frame, text="Modifier 2:").grid(row=1, column=0, sticky='w', pady=2)
-            mod2_var = tk.StringVar(value=self.shortcuts.get('modifier2', ''))
-            mod2_combo = ttk.Combobox(modifier_frame, textvariable=mod2_var, values=modifier_options, width=10)
-            mod2_combo.grid(row=1, column=1, padx=(10, 0), pady=2)
-            
-            # Modifier 3
-            tk.Label(modifier_frame, text="Modifier 3:").grid(row=2, column=0, sticky='w', pady=2)
-            mod3_var = tk.StringVar(value=self.shortcuts.get('modifier3', ''))
-            mod3_combo = ttk.Combobox(modifier_frame, textvariable=mod3_var, values=modifier_options, width=10)
-            mod3_combo.grid(row=2, column=1, padx=(10, 0), pady=2)
-            
-            # Block input option
-            block_frame = tk.LabelFrame(main_frame, text="Input Blocking", padx=10, pady=10)
-            block_frame.pack(fill='x', pady=(0, 20))
-            
-            block_var = tk.BooleanVar(value=self.shortcuts.get('block_input', True))
-            block_check = tk.Checkbutton(block_frame, 
-                                       text="Block default key behavior when using shortcuts\n(Prevents typing numbers when shortcuts are pressed)",
-                                       variable=block_var, wraplength=350)
-            block_check.pack(anchor='w')
-            
-            # Preset buttons
-            preset_frame = tk.LabelFrame(main_frame, text="Quick Presets", padx=10, pady=10)
-            preset_frame.pack(fill='x', pady=(0, 20))
-            
-            def apply_preset(preset):
-                if preset == "safe":
-                    mod1_var.set('ctrl')
-                    mod2_var.set('shift')
-                    mod3_var.set('alt')
-                elif preset == "simple":
-                    mod1_var.set('ctrl')
-                    mod2_var.set('alt')
-                    mod3_var.set('')
-                elif preset == "minimal":
-                    mod1_var.set('shift')
-                    mod2_var.set('')
-                    mod3_var.set('')
-            
-            preset_btn_frame = tk.Frame(preset_frame)
-            preset_btn_frame.pack()
-            
-            tk.Button(preset_btn_frame, text="Safe (Ctrl+Shift+Alt)", 
-                     command=lambda: apply_preset("safe")).pack(side='left', padx=5)
-            tk.Button(preset_btn_frame, text="Simple (Ctrl+Alt)", 
-                     command=lambda: apply_preset("simple")).pack(side='left', padx=5)
-            tk.Button(preset_btn_frame, text="Minimal (Shift)", 
-                     command=lambda: apply_preset("minimal")).pack(side='left', padx=5)
-            
-            # Buttons
-            button_frame = tk.Frame(main_frame)
-            button_frame.pack(pady=10)
-            
-            def save_and_close():
-                # Save new settings
-                new_shortcuts = {
-                    'modifier1': mod1_var.get(),
-                    'modifier2': mod2_var.get(),
-                    'modifier3': mod3_var.get(),
-                    'block_input': block_var.get()
-                }
-                
-                self.shortcuts = new_shortcuts
-                if self.save_settings():
-                    messagebox.showinfo("Settings Saved", 
-                                      f"New shortcuts: {self.get_shortcut_display()}\n\nRestart may be required for full effect.")
-                else:
-                    messagebox.showerror("Error", "Failed to save settings.")
-                
-                root.destroy()
-            
-            def reset_defaults():
-                result = messagebox.askyesno("Reset to Defaults", 
-                                           "Reset to default shortcuts (Ctrl+Shift+Alt+0-9)?")
-                if result:
-                    self.shortcuts = self.default_shortcuts.copy()
-                    if self.save_settings():
-                        messagebox.showinfo("Reset Complete", "Settings reset to defaults.")
-                        root.destroy()
-            
-            tk.Button(button_frame, text="Save", command=save_and_close, width=10).pack(side='left', padx=5)
-            tk.Button(button_frame, text="Reset Defaults", command=reset_defaults, width=12).pack(side='left', padx=5)
-            tk.Button(button_frame, text="Cancel", command=root.destroy, width=10).pack(side='left', padx=5)
-            
-            # Instructions
-            instructions = tk.Label(main_frame, 
-                                  text="Leave modifier fields empty to disable them.\nExample: Only 'Modifier 1' = Ctrl+0-9",
-                                  font=('Arial', 8), fg='gray')
-            instructions.pack(pady=(10, 0))
-            
-            root.mainloop()
-        
-        threading.Thread(target=show_options_dialog, daemon=True).start()
+        import dialogs
+        ui = self.get_ui()
+        ui.post(dialogs.show_options, self, ui)
     
     def reset_all_windows(self):
         """Reset all windows to full opacity"""
         def reset_windows():
+            import dialogs
             try:
-                def enum_window_callback(hwnd, windows):
-                    if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd):
-                        windows.append(hwnd)
-                    return True
+                reset_count = self.restore_modified_windows()
                 
-                windows = []
-                win32gui.EnumWindows(enum_window_callback, windows)
-                
-                reset_count = 0
-                for hwnd in windows:
-                    try:
-                        win32gui.SetWindowLong(hwnd, win32con.GWL_EXSTYLE, 
-                                             win32gui.GetWindowLong(hwnd, win32con.GWL_EXSTYLE) | win32con.WS_EX_LAYERED)
-                        winxpgui.SetLayeredWindowAttributes(hwnd, win32api.RGB(0,0,0), 255, win32con.LWA_ALPHA)
-                        reset_count += 1
-                    except:
-                        continue
-                
-                print(f"Reset {reset_count} windows to full opacity")
-                
-                root = tk.Tk()
-                root.withdraw()
-                messagebox.showinfo("Reset Complete", f"Reset {reset_count} windows to full opacity")
-                root.destroy()
+                log.info("Reset %d windows to full opacity", reset_count)
+                self.get_ui().post(dialogs.show_message, "Reset Complete", f"Reset {reset_count} windows to full opacity")
                 
             except Exception as e:
-                print(f"Reset failed: {e}")
-                root = tk.Tk()
-                root.withdraw()
-                messagebox.showerror("Reset Failed", f"Error: {e}")
-                root.destroy()
+                log.error("Reset failed: %s", e)
+                self.get_ui().post(dialogs.show_message, "Reset Failed", f"Error: {e}", True)
         
+        # Waiting for the pipeline must not block the tray menu
         threading.Thread(target=reset_windows, daemon=True).start()
     
     def quit_app(self):
         """Quit the application"""
         self.running = False
+        self.stopped.set()
+        self.settings_watcher.stop()
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        if self.control_server:
+            self.control_server.stop()
+        self.held_steps.stop()
+        self.fades.stop()
+        self.pipeline.stop()
+        if self.window_events:
+            self.window_events.stop()
+        if self.ui:
+            self.ui.stop()
         if self.icon:
             self.icon.stop()
-        print("Transparent Windows shutting down...")
+        self.backend.close()
+        if self.journal:
+            self.journal.close()
+        log.info("Transparent Windows shutting down...")
+        # os._exit skips atexit handlers, so flush queued log records first
+        stop_logging()
         os._exit(0)
     
-    def run_system_tray(self):
+    def report_startup(self, ready="tray ready"):
+        """Print the --startup-benchmark report"""
+        print("\nStartup benchmark")
+        print("-" * 40)
+        for name, seconds in IMPORT_TIMES.items():
+            print(f"import {name:<27} {seconds * 1000:8.1f} ms")
+        for name, seconds in self.startup_times.items():
+            print(f"{name:<34} {seconds * 1000:8.1f} ms")
+        print("-" * 40)
+        print(f"{'time to ' + ready:<34} {(time.perf_counter() - MODULE_START) * 1000:8.1f} ms")
+        print("(measured from the start of module import)")
+    
+    def run_system_tray(self, startup_benchmark=False):
         """Run the system tray application"""
         if not TRAY_AVAILABLE:
             print("System tray not available. Please install: pip install pillow pystray")
-            self.run_console_mode()
+            self.run_console_mode(startup_benchmark)
             return
         
         try:
+            start = time.perf_counter()
             image = self.create_tray_icon()
+            self.startup_times['tray icon'] = time.perf_counter() - start
             
             menu = pystray.Menu(
                 item('About', self.show_about),
                 item('Options', self.show_options),
+                item('Auto-Dim Inactive Windows', self.toggle_auto_dim,
+                     checked=lambda menu_item: bool(self.shortcuts.get('auto_dim'))),
                 item('Reset All Windows', self.reset_all_windows),
                 pystray.Menu.SEPARATOR,
                 item('Quit', self.quit_app)
@@ -419,34 +977,45 @@ You can customize shortcuts in Options."""
             # Start keyboard listener in background
             keyboard_thread = threading.Thread(target=self.keyboard_listener, daemon=True)
             keyboard_thread.start()
+            self.start_window_events()
+            self.start_settings_watcher()
             
             print("Transparent Windows is running in the system tray.")
             print("Look for the icon in the bottom-right corner of your screen.")
             print(f"Use {shortcut_display} to change window transparency.")
             
-            self.icon.run()
+            def on_ready(icon):
+                icon.visible = True
+                if startup_benchmark:
+                    self.report_startup()
+                    self.quit_app()
+            
+            self.icon.run(setup=on_ready)
             
         except Exception as e:
-            print(f"System tray error: {e}")
-            print("Falling back to console mode...")
-            self.run_console_mode()
+            log.error("System tray error: %s", e)
+            log.warning("Falling back to console mode...")
+            self.run_console_mode(startup_benchmark)
     
-    def run_console_mode(self):
+    def run_console_mode(self, startup_benchmark=False):
         """Fallback console mode if system tray fails"""
         print("\n" + "="*50)
         print("TRANSPARENT WINDOWS - CONSOLE MODE")
         print("="*50)
         shortcut_display = self.get_shortcut_display()
         print(f"Use {shortcut_display} to change window transparency:")
-        print("• 0 = Nearly invisible (1%)")
-        print("• 1 = Most transparent (10%)")
-        print("• 9 = Fully opaque (100%)")
-        print("• 2-8 = Gradual transparency levels")
+        for line in describe_levels(self.matcher.levels):
+            print(f"• {line}")
         print("\nPress Ctrl+C to quit")
         print("="*50)
         
         keyboard_thread = threading.Thread(target=self.keyboard_listener, daemon=True)
         keyboard_thread.start()
+        self.start_window_events()
+        self.start_settings_watcher()
+        if startup_benchmark:
+            self.report_startup("console ready")
+            self.quit_app()
         
         try:
             while self.running:
@@ -454,25 +1023,62 @@ You can customize shortcuts in Options."""
         except KeyboardInterrupt:
             print("\nShutting down...")
             self.running = False
+            self.stopped.set()
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Make windows transparent with keyboard shortcuts")
+    parser.add_argument('--backend', choices=['win32', 'x11'],
+                        help="window system backend (default: win32 on Windows, x11 elsewhere)")
+    parser.add_argument('--startup-benchmark', action='store_true',
+                        help="report time-to-tray-ready and import times, then exit")
+    parser.add_argument('--metrics', metavar='FILE|PORT',
+                        help="write JSON metrics snapshots to FILE, or serve them on 127.0.0.1:PORT")
+    parser.add_argument('--metrics-interval', type=float, default=10.0, metavar='SECONDS',
+                        help="how often to write the metrics file (default: 10)")
+    parser.add_argument('--control', nargs='?', const='', metavar='ADDRESS',
+                        help="accept commands from control.py on a local socket (or named pipe on Windows)")
+    parser.add_argument('--recover', choices=['ask', 'reset', 'keep'], default='ask',
+                        help="what to do with windows a previous run left transparent (default: ask)")
+    parser.add_argument('--no-journal', action='store_true',
+                        help="do not keep a journal of changed windows for crash recovery")
+    parser.add_argument('--log-level', default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    parser.add_argument('--log-json', action='store_true', help="log one JSON object per line")
+    return parser.parse_args(argv)
 
 def main():
     """Main function to run the application"""
-    if os.name != 'nt':
-        print("Error: This application only works on Windows.")
-        input("Press Enter to exit...")
-        return
+    args = parse_args()
+    setup_logging(getattr(logging, args.log_level), json_lines=args.log_json)
     
     print("Starting Transparent Windows...")
     
     try:
-        app = TransparentWindowsApp()
-        app.run_system_tray()
+        if not KEYBOARD_AVAILABLE:
+            raise ImportError("keyboard")
+        
+        start = time.perf_counter()
+        backend = create_backend(args.backend)
+        app = TransparentWindowsApp(backend=backend)
+        app.startup_times['app init'] = time.perf_counter() - start
+        if not args.no_journal:
+            app.start_journal(args.recover)
+        if args.metrics:
+            app.start_metrics(args.metrics, args.metrics_interval)
+        if args.control is not None:
+            app.start_control_server(args.control or None)
+        app.run_system_tray(startup_benchmark=args.startup_benchmark)
         
     except ImportError as e:
         error_msg = f"Missing required library: {e}\n\nRequired packages:\npip install pywin32 keyboard pillow pystray"
         print(error_msg)
         input("Press Enter to exit...")
         
+    except BackendUnavailable as e:
+        print(f"Error: no usable window system backend: {e}")
+        input("Press Enter to exit...")
+        
     except Exception as e:
         error_msg = f"An error occurred: {e}"
         print(error_msg)
@@ -0,0 +1,216 @@
+"""Bookkeeping for windows whose opacity we changed"""
+import threading
+import time
+
+
+class ModifiedWindowRegistry:
+    """Remembers the original state of every window we touched
+
+    Keyed by hwnd; the state is whatever the backend's read_state()
+    returned. Only the first change to a window is recorded, so a reset
+    always goes back to the state the window had before we got to it.
+    """
+
+    def __init__(self, is_alive, prune_threshold=64):
+        self.is_alive = is_alive
+        self.windows = {}
+        self.prune_threshold = prune_threshold
+        self.lock = threading.Lock()
+
+    def __contains__(self, hwnd):
+        return hwnd in self.windows
+
+    def __len__(self):
+        return len(self.windows)
+
+    def remember(self, hwnd, original):
+        """Record a window's original state unless it is already known"""
+        with self.lock:
+            if hwnd in self.windows:
+                return False
+            self.windows[hwnd] = original
+            grown = len(self.windows) >= self.prune_threshold
+        if grown:
+            # Amortized cleanup: only runs when the registry doubles in size
+            self.prune()
+            with self.lock:
+                self.prune_threshold = max(self.prune_threshold, len(self.windows) * 2)
+        return True
+
+    def hwnds(self):
+        """Return the windows currently recorded"""
+        with self.lock:
+            return list(self.windows)
+
+    def forget(self, hwnd):
+        """Drop a window, e.g. once it was destroyed or restored"""
+        with self.lock:
+            return self.windows.pop(hwnd, None)
+
+    def prune(self):
+        """Drop entries for windows that no longer exist, returns how many"""
+        with self.lock:
+            hwnds = list(self.windows)
+        dead = [hwnd for hwnd in hwnds if not self.is_alive(hwnd)]
+        with self.lock:
+            for hwnd in dead:
+                self.windows.pop(hwnd, None)
+        return len(dead)
+
+    def pop_all(self):
+        """Remove and return every (hwnd, original) entry"""
+        with self.lock:
+            items = list(self.windows.items())
+            self.windows.clear()
+        return items
+
+
+class WindowAttributeCache:
+    """Write-through cache of each window's layered flag and current alpha
+
+    Lets apply_opacity skip reading the window state and any write that would
+    not change anything. Entries expire after max_age seconds so a style change
+    made by the application itself is picked up again, and can be dropped
+    explicitly when a window is destroyed.
+    """
+
+    def __init__(self, max_age=5.0, clock=time.monotonic):
+        self.max_age = max_age
+        self.clock = clock
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.skips = 0
+        self.lock = threading.Lock()
+
+    def get(self, hwnd):
+        """Return (layered, alpha) for a window, or None on a miss"""
+        with self.lock:
+            entry = self.entries.get(hwnd)
+            if entry is None or self.clock() - entry[2] > self.max_age:
+                self.entries.pop(hwnd, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def peek(self, hwnd, default=None):
+        """Return the last known alpha of a window without touching the counters"""
+        with self.lock:
+            entry = self.entries.get(hwnd)
+            return entry[1] if entry is not None else default
+
+    def stale(self, hwnds):
+        """Return the windows with no fresh entry, counted as misses for the caller to read"""
+        with self.lock:
+            now = self.clock()
+            missing = []
+            for hwnd in hwnds:
+                entry = self.entries.get(hwnd)
+                if entry is None or now - entry[2] > self.max_age:
+                    missing.append(hwnd)
+            self.misses += len(missing)
+            return missing
+
+    def put(self, hwnd, layered, alpha):
+        """Record what we just wrote to (or read from) a window"""
+        with self.lock:
+            self.entries[hwnd] = (layered, alpha, self.clock())
+
+    def record_skip(self):
+        """Count a write that was skipped because it would not change anything"""
+        with self.lock:
+            self.skips += 1
+
+    def invalidate(self, hwnd):
+        """Forget a window, e.g. when it was destroyed or restyled"""
+        with self.lock:
+            self.entries.pop(hwnd, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Return hit, miss and skip counters"""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'skips': self.skips,
+            }
+
+
+class ProcessWindowMap:
+    """Which windows belong to which process, kept current from window events
+
+    Lets "every window of this app" be a dict lookup instead of an
+    enumeration with a process query per window. Like that enumeration it
+    only holds visible windows: they join on show and leave on hide.
+    """
+
+    def __init__(self):
+        self.pids = {}
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.pids)
+
+    def __contains__(self, hwnd):
+        return hwnd in self.pids
+
+    def add(self, hwnd, pid):
+        """Record a window's process; a reused handle moves to its new process"""
+        with self.lock:
+            old = self.pids.get(hwnd)
+            if old == pid:
+                return
+            if old is not None:
+                self._discard(hwnd, old)
+            self.pids[hwnd] = pid
+            self.windows.setdefault(pid, set()).add(hwnd)
+
+    def _discard(self, hwnd, pid):
+        """Drop a window from its process's set, returns whether it was the last (lock held)"""
+        members = self.windows.get(pid)
+        if members is not None:
+            members.discard(hwnd)
+            if not members:
+                del self.windows[pid]
+                return True
+        return False
+
+    def remove(self, hwnd):
+        """Forget a window, returns its pid if that process has no windows left, else None"""
+        with self.lock:
+            pid = self.pids.pop(hwnd, None)
+            if pid is not None and self._discard(hwnd, pid):
+                return pid
+            return None
+
+    def load(self, windows):
+        """Replace the map with (hwnd, pid) pairs, e.g. from one enumeration"""
+        with self.lock:
+            self.pids.clear()
+            self.windows.clear()
+        for hwnd, pid in windows:
+            self.add(hwnd, pid)
+
+    def clear(self):
+        with self.lock:
+            self.pids.clear()
+            self.windows.clear()
+
+    def pid_of(self, hwnd):
+        with self.lock:
+            return self.pids.get(hwnd)
+
+    def windows_of(self, pid):
+        with self.lock:
+            return list(self.windows.get(pid, ()))
+
+    def stats(self):
+        with self.lock:
+            return {'windows': len(self.pids), 'processes': len(self.windows)}
@@ -0,0 +1,112 @@
+"""WinEvent hooks for window creation, destruction and focus changes"""
+import ctypes
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+EVENT_SYSTEM_FOREGROUND = 0x0003
+EVENT_OBJECT_CREATE = 0x8000
+EVENT_OBJECT_DESTROY = 0x8001
+EVENT_OBJECT_SHOW = 0x8002
+EVENT_OBJECT_HIDE = 0x8003
+EVENT_OBJECT_LOCATIONCHANGE = 0x800B
+
+WINEVENT_OUTOFCONTEXT = 0x0000
+WINEVENT_SKIPOWNPROCESS = 0x0002
+OBJID_WINDOW = 0
+CHILDID_SELF = 0
+GA_ROOT = 2
+WM_QUIT = 0x0012
+
+
+class WinEventWatcher:
+    """Calls handler(event, hwnd) for top-level window events
+
+    The hooks are out-of-context, so Windows delivers them through the message
+    loop of the thread that installed them; this class runs that thread. The
+    handler runs on it too and must not block.
+    """
+
+    # (first, last) event ranges to hook; one hook per range
+    EVENT_RANGES = [
+        (EVENT_SYSTEM_FOREGROUND, EVENT_SYSTEM_FOREGROUND),
+        (EVENT_OBJECT_CREATE, EVENT_OBJECT_HIDE),
+        (EVENT_OBJECT_LOCATIONCHANGE, EVENT_OBJECT_LOCATIONCHANGE),
+    ]
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.thread = None
+        self.thread_id = None
+        self.ready = threading.Event()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.ready.wait(5)
+
+    def stop(self):
+        if self.thread_id:
+            ctypes.windll.user32.PostThreadMessageW(self.thread_id, WM_QUIT, 0, 0)
+
+    def _run(self):
+        from ctypes import wintypes
+
+        user32 = ctypes.windll.user32
+        user32.SetWinEventHook.restype = wintypes.HANDLE
+        user32.GetAncestor.restype = wintypes.HWND
+        user32.GetAncestor.argtypes = [wintypes.HWND, wintypes.UINT]
+
+        WinEventProc = ctypes.WINFUNCTYPE(
+            None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+            wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+
+        def callback(hook, event, hwnd, id_object, id_child, event_thread, event_time):
+            if not hwnd or id_object != OBJID_WINDOW or id_child != CHILDID_SELF:
+                return
+            # Destroyed windows can no longer be asked for their ancestor
+            if event != EVENT_OBJECT_DESTROY and user32.GetAncestor(hwnd, GA_ROOT) != hwnd:
+                return
+            try:
+                self.handler(event, hwnd)
+            except Exception as e:
+                log.exception("Window event handler error: %s", e)
+
+        # Keep a reference so the callback is not garbage collected
+        self._callback = WinEventProc(callback)
+        hooks = [user32.SetWinEventHook(first, last, 0, self._callback, 0, 0,
+                                        WINEVENT_OUTOFCONTEXT | WINEVENT_SKIPOWNPROCESS)
+                 for first, last in self.EVENT_RANGES]
+
+        self.thread_id = ctypes.windll.kernel32.GetCurrentThreadId()
+        self.ready.set()
+
+        msg = wintypes.MSG()
+        try:
+            while user32.GetMessageW(ctypes.byref(msg), 0, 0, 0) > 0:
+                user32.TranslateMessage(ctypes.byref(msg))
+                user32.DispatchMessageW(ctypes.byref(msg))
+        finally:
+            for hook in hooks:
+                if hook:
+                    user32.UnhookWinEvent(hook)
+
+
+def process_image_name(pid):
+    """Return the executable file name (e.g. "code.exe") of a process, or ''"""
+    from ctypes import wintypes
+
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return ''
+    try:
+        size = wintypes.DWORD(1024)
+        buffer = ctypes.create_unicode_buffer(size.value)
+        if not kernel32.QueryFullProcessImageNameW(handle, 0, buffer, ctypes.byref(size)):
+            return ''
+        return buffer.value.rsplit('\\', 1)[-1]
+    finally:
+        kernel32.CloseHandle(handle)